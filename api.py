@@ -1,33 +1,100 @@
-import requests
+import asyncio
+import functools
+import json
 import logging
+import re
+import time
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse, StreamingResponse
-from pydantic import BaseModel
-from auditor import get_contract_source_code, analyze_with_gemini_raw, get_deployer_stats, get_market_data, calculate_risk_score, basic_security_check
-from pdf_generator import create_audit_pdf
-from supabase import create_client, Client
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse, Response, StreamingResponse
+from contextlib import asynccontextmanager
+from typing import Annotated, Literal, Union
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+from pipeline import run_free_scan, stream_pro_scan, run_batch_scan, run_chain_sweep, ContractNotFound, SingleFlight
+from pdf_service import PDF_SERVICE
+from upstream import close_clients
+from model_dispatch import MODEL_DISPATCH
+from scheduler import PRIORITY, PRIORITY_PRO, UpstreamBusy, UpstreamError, scheduler_stats
+from cache import SCAN_CACHE
+from chains import CHAINS, DEFAULT_CHAIN, UnknownChain, resolve_chain
+from report_store import REPORT_STORE, get_prompt_template
+from similarity import SIMILARITY_INDEX
+from deployer_index import DEPLOYER_INDEX, DEPLOYER_REFRESH_INTERVAL
+from billing import get_supabase, reserve_credit, refund_credit, settle_credit
+from jobs import JOB_QUEUE_URL, QUEUED, RUNNING, DONE, FAILED, job_id_for, is_reusable, open_queue
+from worker import run_worker
+from warmer import CacheWarmer, DeployerRefresher, WARMER_FEEDS, feeds_from_spec
+from metrics import REGISTRY, MetricsMiddleware
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 # --- CONFIGURATION ---
 GUMROAD_PRODUCT_ID = "H_AsF2THGP9PKLDNtazH6w==" 
-SCAN_CACHE = {}
+MAX_BATCH_ADDRESSES = 2000
+ADDRESS_RE = re.compile(r"^0x[0-9a-fA-F]{40}$")
 
-# SUPABASE (Must be Service Role Key to Edit Data)
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+# Simultaneous scans of the same (address, chain, tier) share one upstream run
+INFLIGHT_SCANS = SingleFlight()
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("Missing Supabase credentials. Check your .env file.")
+# Pro scans run as jobs (jobs.py). Production runs worker.py next to the API;
+# JOB_INLINE_WORKERS > 0 also runs that many scans inside this process.
+@functools.cache
+def get_job_queue():
+    """
+    The queue at JOB_QUEUE_URL, opened by the lifespan hook: importing the
+    API (tests, benchmarks, tooling) never creates a jobs database.
+    """
+    return open_queue(JOB_QUEUE_URL)
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+JOB_INLINE_WORKERS = int(os.getenv("JOB_INLINE_WORKERS", "0"))
+JOB_MAX_WAIT = 30
+JOB_WAIT_POLL = 0.25
+
+# Pre-scans trending/new tokens on spare quota (warmer.py) when feeds are configured
+WARMER = CacheWarmer(feeds_from_spec(WARMER_FEEDS)) if WARMER_FEEDS else None
+# Keeps recently seen deployers' wallet stats fresh in the deployer index, on spare quota
+DEPLOYER_REFRESHER = DeployerRefresher() if DEPLOYER_REFRESH_INTERVAL > 0 else None
+
+# Imports are kept light so a worker boots in well under a second (see
+# benchmarks/bench_startup.py); the Supabase client and reportlab are then
+# loaded in the background at startup instead of on the first Pro scan / PDF.
+# Set API_PREWARM=0 on free-tier-only deployments.
+API_PREWARM = os.getenv("API_PREWARM", "1") == "1"
+
+def _prewarm():
+    try:
+        get_supabase()
+    except ValueError as e:
+        logging.warning(f"Billing unavailable: {e}")
+    PDF_SERVICE.prewarm()
 
 # Logging
 logging.basicConfig(filename='usage.log', level=logging.INFO, format='%(asctime)s - %(message)s')
 
-app = FastAPI(title="Web3 Shield API", version="1.0")
+@asynccontextmanager
+async def lifespan(app):
+    # Reports from an older SYSTEM_PROMPT can never be served again, so reclaim them
+    removed = REPORT_STORE.purge_stale(get_prompt_template())
+    if removed: logging.info(f"Purged {removed} stale report(s) after SYSTEM_PROMPT change")
+    removed = SIMILARITY_INDEX.purge_stale(get_prompt_template())
+    if removed: logging.info(f"Purged {removed} stale near-duplicate audit(s) after SYSTEM_PROMPT change")
+    job_queue = await run_in_threadpool(get_job_queue)
+    stop_workers = asyncio.Event()
+    workers = asyncio.ensure_future(run_worker(job_queue, JOB_INLINE_WORKERS, stop=stop_workers)) if JOB_INLINE_WORKERS > 0 else None
+    warmer = asyncio.ensure_future(WARMER.run(stop_workers)) if WARMER else None
+    refresher = asyncio.ensure_future(DEPLOYER_REFRESHER.run(stop_workers)) if DEPLOYER_REFRESHER else None
+    prewarm = asyncio.ensure_future(run_in_threadpool(_prewarm)) if API_PREWARM else None
+    yield
+    stop_workers.set()
+    for task in (workers, warmer, refresher, prewarm):
+        if task: await task
+    # Drain the pooled upstream connections on shutdown
+    await close_clients()
+    PDF_SERVICE.shutdown()
+
+app = FastAPI(title="Web3 Shield API", version="1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -35,17 +102,59 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+# Added last = outermost, so request latency includes CORS handling
+app.add_middleware(MetricsMiddleware)
+
+# Upstream trouble is a 503, never a misleading 404 or a half-empty report
+@app.exception_handler(UpstreamBusy)
+async def upstream_busy(request: Request, exc: UpstreamBusy):
+    return JSONResponse(status_code=503, content={"detail": "Scanner is busy, please retry shortly."}, headers={"Retry-After": "5"})
+
+@app.exception_handler(UpstreamError)
+async def upstream_error(request: Request, exc: UpstreamError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "30"})
+
+@app.exception_handler(UnknownChain)
+async def unknown_chain(request: Request, exc: UnknownChain):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
 
 class AuditRequest(BaseModel):
     address: str
+    chain: str = DEFAULT_CHAIN  # name or chain id, see chains.py
     user_id: str = None
     license_key: str = None
 
+class BatchRequest(BaseModel):
+    addresses: list[str]
+    chain: str = DEFAULT_CHAIN
+
+# The report IR (report_parser.parse_report), checked before it reaches the renderer
+class IRText(BaseModel):
+    type: Literal["heading", "bullet"]
+    text: str
+
+class IRTable(BaseModel):
+    type: Literal["table"]
+    rows: list[tuple[str, str]]
+
+class IRSection(BaseModel):
+    id: str
+    heading: str = ""
+    blocks: list[Annotated[Union[IRText, IRTable], Field(discriminator="type")]]
+
+class ReportIR(BaseModel):
+    version: int
+    verdict: str = None
+    sections: list[IRSection]
+    signals: dict[str, bool] = {}
+
 class PDFRequest(BaseModel):
     name: str
     address: str
     report: str
+    report_ir: ReportIR = None  # from the scan result; parsed from `report` when missing
     verdict: str
     market: dict = None 
     score: int = 0
@@ -54,97 +163,176 @@ class PDFRequest(BaseModel):
 @app.get("/")
 async def root(): return RedirectResponse(url="/docs")
 
+@app.get("/chains")
+async def chains(): return {"default": DEFAULT_CHAIN, "chains": CHAINS}
+
+@app.get("/cache/stats")
+async def cache_stats(): return {**SCAN_CACHE.stats(), "reports": REPORT_STORE.stats(), "similarity": SIMILARITY_INDEX.stats(), "deployers": {**DEPLOYER_INDEX.stats(), "refresher": DEPLOYER_REFRESHER.snapshot() if DEPLOYER_REFRESHER else None}, "coalescing": INFLIGHT_SCANS.stats(), "pdf": PDF_SERVICE.stats(), "jobs": get_job_queue().stats(), "warmer": WARMER.snapshot() if WARMER else None}
+
+@REGISTRY.collector
+def api_metrics():
+    coalescing = INFLIGHT_SCANS.stats()
+    metrics = [
+        ("scans_in_flight", "gauge", "Distinct scans running in this process (coalesced requests count once).", [({}, coalescing["in_flight"])]),
+        ("scans_coalesced_total", "counter", "Scan requests that started a scan (leader) or joined one (follower).",
+         [({"role": "leader"}, coalescing["leaders"]), ({"role": "follower"}, coalescing["followers"])]),
+        ("jobs", "gauge", "Pro scan jobs by status.", [({"status": status}, count) for status, count in get_job_queue().stats().items()]),
+    ]
+    if WARMER:
+        warmer = WARMER.snapshot()
+        metrics.append(("warmer_backlog", "gauge", "Candidates waiting to be warmed.", [({}, warmer.pop("backlog"))]))
+        metrics.append(("warmer_candidates_total", "counter", "Warmer candidates by outcome.", [({"outcome": k}, v) for k, v in warmer.items()]))
+    return metrics
+
+@app.get("/metrics")
+async def metrics(): return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/upstream/stats")
+async def upstream_stats(): return {**scheduler_stats(), "models": MODEL_DISPATCH.stats()}
+
 @app.post("/generate-pdf")
 async def generate_pdf(req: PDFRequest):
-    pdf_buffer = create_audit_pdf(req.dict())
-    return StreamingResponse(pdf_buffer, media_type="application/pdf", headers={"Content-Disposition": f"attachment; filename=Web3Shield.pdf"})
+    # Rendered in the PDF worker pool, so the event loop keeps serving scans
+    pdf = await PDF_SERVICE.render(req.dict())
+    return Response(content=pdf, media_type="application/pdf", headers={"Content-Disposition": f"attachment; filename=Web3Shield.pdf"})
 
 @app.post("/scan/free")
 async def scan_free(req: AuditRequest):
-    logging.info(f"Free Scan: {req.address}")
-    name, code = get_contract_source_code(req.address)
-    if not code: raise HTTPException(status_code=404, detail="Contract not found")
-    
-    market_raw = get_market_data(req.address)
-    flags = basic_security_check(code)
-
-    return {
-        "name": name,
-        "size": len(code),
-        "verified": True,
-        "market": market_raw,
-        "basic_flags": flags,
-        "status": "Active"
-    }
+    chain = resolve_chain(req.chain)
+    logging.info(f"Free Scan: {req.address} ({chain})")
+    try:
+        return await INFLIGHT_SCANS.do((req.address.lower(), chain, "free"), lambda: run_free_scan(req.address, chain))
+    except ContractNotFound:
+        raise HTTPException(status_code=404, detail="Contract not found")
+
+@app.post("/scan/sweep")
+async def scan_sweep(req: AuditRequest):
+    # Free scan of one address on every supported chain, concurrently
+    logging.info(f"Chain Sweep: {req.address}")
+    results = await INFLIGHT_SCANS.do((req.address.lower(), "*", "sweep"), lambda: run_chain_sweep(req.address))
+    return {"address": req.address, "found": [r["chain"] for r in results if "error" not in r], "results": results}
+
+@app.post("/scan/batch")
+async def scan_batch(req: BatchRequest):
+    # Dedupe case-insensitively, keep the caller's order and spelling
+    unique = {}
+    for address in req.addresses:
+        unique.setdefault(address.strip().lower(), address.strip())
+    addresses = list(unique.values())
+    chain = resolve_chain(req.chain)
+    if len(addresses) > MAX_BATCH_ADDRESSES:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_BATCH_ADDRESSES} addresses).")
+    logging.info(f"Batch Scan: {len(addresses)} addresses ({chain})")
+
+    valid = [a for a in addresses if ADDRESS_RE.match(a)]
+    invalid = [a for a in addresses if not ADDRESS_RE.match(a)]
+
+    async def ndjson():
+        for address in invalid:
+            yield json.dumps({"address": address, "error": "Invalid address"}) + "\n"
+        async for result in run_batch_scan(valid, chain):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+async def _reserve_credit(req):
+    return await reserve_credit(req.user_id, req.address, resolve_chain(req.chain), bool(req.license_key))
+
+async def _refund_credit(req, reservation):
+    await refund_credit(req.user_id, req.address, resolve_chain(req.chain), reservation)
+
+def _settle_credit(req, reservation):
+    return settle_credit(req.user_id, req.address, resolve_chain(req.chain), reservation)
+
+def _job_view(job):
+    view = {"job_id": job["id"], "status": job["status"], "attempts": job["attempts"], "poll": f"/scan/jobs/{job['id']}"}
+    if job["status"] == DONE: view["result"] = job["result"]
+    if job["error"]: view["error"] = job["error"]
+    return view
 
 @app.post("/scan/pro")
 async def scan_pro(req: AuditRequest):
-    # 1. AUTH CHECK
+    """
+    Queues a Pro scan and returns 202 with a job id to poll (GET /scan/jobs/{id}).
+    The scan itself runs in a worker (worker.py, or JOB_INLINE_WORKERS in here).
+    Submitting the same (user, address, chain) again returns the same job.
+    """
+    chain = resolve_chain(req.chain)
     if not req.user_id:
         raise HTTPException(status_code=401, detail="Please sign in first.")
+    job_id = job_id_for(req.user_id, req.address, chain)
+    job = get_job_queue().get(job_id)
+
+    if not is_reusable(job):
+        # Only queue the expensive AI if we passed the credit check
+        reservation = await _reserve_credit(req)
+        payload = {"user_id": req.user_id, "address": req.address, "chain": chain, "reservation": reservation}
+        job, created = get_job_queue().submit(job_id, payload)
+        if not created:
+            await _refund_credit(req, reservation)  # a concurrent submission won
+        else:
+            logging.info(f"Pro Scan queued: {req.address} ({chain}) job {job_id}")
+
+    return JSONResponse(status_code=202 if job["status"] in (QUEUED, RUNNING) else 200, content=_job_view(job))
+
+@app.get("/scan/jobs/{job_id}")
+async def scan_job(job_id: str, wait: float = 0):
+    """
+    Job status, and the scan result once it's done. With `wait` (seconds, up
+    to JOB_MAX_WAIT) the call holds until the job finishes or the wait runs out.
+    """
+    deadline = time.monotonic() + min(max(wait, 0), JOB_MAX_WAIT)
+    while True:
+        job = get_job_queue().get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job["status"] in (DONE, FAILED) or time.monotonic() >= deadline:
+            return _job_view(job)
+        await asyncio.sleep(JOB_WAIT_POLL)
+
+@app.post("/scan/pro/stream")
+async def scan_pro_stream(req: AuditRequest):
+    """
+    Pro scan run inside the request and streamed as NDJSON events (source,
+    flags, market, deployer, report deltas, result) as each one is ready.
+    Billed like /scan/pro; for clients that want to watch the report being written.
+    """
+    chain = resolve_chain(req.chain)
+    reservation = await _reserve_credit(req)
+    PRIORITY.set(PRIORITY_PRO)
+    events = stream_pro_scan(req.address, chain)
+
+    # Hold the response until the source event (one Etherscan round trip) so
+    # "not found" and upstream outages still get a proper status code
+    head = []
+    try:
+        async for event in events:
+            head.append(event)
+            if event["event"] == "source":
+                break
+    except ContractNotFound:
+        await _refund_credit(req, reservation)
+        raise HTTPException(status_code=404, detail="Contract not found")
+    except Exception:
+        await _refund_credit(req, reservation)
+        raise
+
+    async def ndjson():
+        settled = False
+        try:
+            for event in head:
+                yield json.dumps(event) + "\n"
+            async for event in events:
+                if event["event"] == "result":
+                    event.update(_settle_credit(req, reservation))
+                    settled = True
+                yield json.dumps(event) + "\n"
+        except (UpstreamError, UpstreamBusy) as e:
+            # Headers are gone by now, so failures become the last event
+            yield json.dumps({"event": "error", "status": 503, "detail": str(e)}) + "\n"
+        finally:
+            await events.aclose()
+            if not settled:
+                await _refund_credit(req, reservation)
 
-    # 2. CHECK HISTORY (Don't charge for re-scans)
-    prev_scan = supabase.table('user_scans').select("*").eq('user_id', req.user_id).eq('contract_address', req.address).execute()
-    already_scanned = prev_scan.data and len(prev_scan.data) > 0
-
-    credits_to_deduct = 0
-
-    # 3. IF NEW SCAN, CHECK CREDITS STRICTLY
-    if not already_scanned:
-        # Fetch fresh profile data
-        profile = supabase.table('profiles').select("*").eq('id', req.user_id).execute()
-        
-        if not profile.data:
-            raise HTTPException(status_code=401, detail="User profile not found")
-        
-        current_credits = profile.data[0]['credits_remaining']
-        
-        # 🚨 THE FIX: HARD STOP IF CREDITS ARE 0 OR LESS
-        if current_credits <= 0:
-            # If they have a valid license key, let them pass (Future Feature)
-            # For now, block them immediately.
-            if not req.license_key:
-                raise HTTPException(status_code=402, detail="Out of credits.")
-        
-        # Mark for deduction (but don't deduct yet until we know scan works)
-        credits_to_deduct = 1
-
-    # --- 4. EXECUTE SCAN ---
-    # Only run the expensive AI if we passed the credit check
-    name, code = get_contract_source_code(req.address)
-    if not code: raise HTTPException(status_code=404, detail="Contract not found")
-
-    deployer_data = get_deployer_stats(req.address)
-    market_raw = get_market_data(req.address)
-    
-    market_context = ""
-    if market_raw:
-        market_context = f"[MARKET DATA]\n- Price: ${market_raw['price_usd']}\n- Liquidity: ${market_raw['liquidity_usd']}"
-
-    full_context = f"{deployer_data}\n\n{market_context}"
-    audit_report = analyze_with_gemini_raw(name, code, deployer_report=full_context)
-    
-    risk_data = calculate_risk_score(market_raw, deployer_data, audit_report)
-
-    # --- 5. DEDUCT CREDITS (COMMIT) ---
-    # Now that scan is successful, actually take the credit
-    if credits_to_deduct > 0:
-        # Re-fetch just to be safe against race conditions
-        profile_now = supabase.table('profiles').select("credits_remaining").eq('id', req.user_id).execute()
-        new_credits = profile_now.data[0]['credits_remaining'] - 1
-        
-        supabase.table('profiles').update({'credits_remaining': new_credits}).eq('id', req.user_id).execute()
-        supabase.table('user_scans').insert({'user_id': req.user_id, 'contract_address': req.address}).execute()
-
-    return {
-        "name": name,
-        "size": len(code),
-        "verified": True,
-        "status": "Active",
-        "risk_level": risk_data["verdict"],
-        "score": risk_data["score"],
-        "score_reasons": risk_data["breakdown"],
-        "report": audit_report,
-        "credits_used": credits_to_deduct,
-        "market": market_raw
-    }
\ No newline at end of file
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
@@ -1,235 +1,560 @@
-import requests
+import asyncio
 import json
+import logging
 import time
 import os
+import httpx
 from dotenv import load_dotenv
-import google.generativeai as genai
+from starlette.concurrency import run_in_threadpool
+from cache import cached, SCAN_CACHE
+from metrics import traced
+from report_store import REPORT_STORE, get_prompt_template
+from report_parser import parse_report, drop_section, SectionFilter
+from similarity import SIMILARITY_INDEX
+from scoring import extract_features, score_features
+from source_ingest import ingest_source, chunk_units
+from rules import RULESET_VERSION, run_rules, flags_from_findings
+from scheduler import PROVIDERS, upstream_request, upstream_stream, UpstreamError, UpstreamBusy
+from model_dispatch import MODEL_DISPATCH, ModelFailed
+from upstream import ETHERSCAN_API_URL, DEXSCREENER_API_URL, GEMINI_API_URL
+from chains import CHAINS, DEFAULT_CHAIN, chain_id
+from deployer_index import DEPLOYER_INDEX
 
 load_dotenv()
 
 # --- CONFIGURATION ---
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("Missing Gemini API Key. Check your .env file.")
-genai.configure(api_key=GEMINI_API_KEY)
+# Gemini is called over plain HTTP (see _generate), so no SDK to import or
+# configure. A missing key is reported when a report is first written, not at
+# import: free-tier workers never need one. The scheduler rotates the whole
+# GEMINI_API_KEYS pool; this is its first key, a single key, never the list.
+GEMINI_API_KEY = PROVIDERS["gemini"]["keys"][0]
 
-ETHERSCAN_API_KEY = os.getenv("ETHERSCAN_API_KEY")
+def cache_key(address, chain=DEFAULT_CHAIN):
+    return f"{chain_id(chain)}:{address.lower()}"
+
+async def _etherscan(params, chain=DEFAULT_CHAIN):
+    # Browser headers live on the pooled client (upstream.py); the API key,
+    # rate limit and retries are applied by the chain's scheduler.
+    params = {"chainid": str(chain_id(chain)), **params}
+    response = await upstream_request("etherscan", "GET", ETHERSCAN_API_URL, chain=chain, params=params)
+    if response.status_code == 403:
+        logging.warning("Etherscan blocked the request (403 Forbidden).")
+        raise UpstreamError("etherscan blocked the request (403)")
+    try:
+        return response.json()
+    except ValueError:
+        raise UpstreamError("etherscan returned invalid JSON")
 
-def get_contract_source_code(address):
-    if not ETHERSCAN_API_KEY:
-        raise ValueError("Missing ETHERSCAN_API_KEY")
-        
-    url = f"https://api.etherscan.io/api?module=contract&action=getsourcecode&address={address}&apikey={ETHERSCAN_API_KEY}"
-    
 # --- 1. FETCH CODE (With Anti-Block Headers) ---
-def get_contract_source_code(address):
-    url = "https://api.etherscan.io/v2/api"
+@traced()
+@cached("source", key=cache_key)
+async def get_contract_source_code(address, chain=DEFAULT_CHAIN):
+    """
+    Returns (name, source), or (None, None) if Etherscan has no verified source.
+    Raises UpstreamError if Etherscan can't be reached, so an outage is never
+    reported as "Contract not found".
+    """
     params = {
-        "chainid": "1",
         "module": "contract",
         "action": "getsourcecode",
         "address": address,
-        # MAKE SURE THIS IS YOUR OWN KEY
-        "apikey": ETHERSCAN_API_KEY 
-    }
-    
-    # 🚨 CRITICAL: This tricks Etherscan into thinking you are a browser
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
     }
-    
-    try:
-        response = requests.get(url, params=params, headers=headers) # <--- Pass headers here
+    data = await _etherscan(params, chain)
+    if data.get('status') == '1' and data['result'][0]['SourceCode']:
+        return data['result'][0]['ContractName'], data['result'][0]['SourceCode']
         
-        if response.status_code == 403:
-            print("❌ Etherscan blocked the request (403 Forbidden).")
-            return None, None
-
-        data = response.json()
-        if data['status'] == '1' and data['result'][0]['SourceCode']:
-            return data['result'][0]['ContractName'], data['result'][0]['SourceCode']
-            
-        print(f"⚠️ Etherscan API Error: {data.get('result')}")
-        return None, None
-    except Exception as e:
-        print(f"Connection Error: {e}")
-        return None, None
+    logging.warning(f"Etherscan API Error: {data.get('result')}")
+    return None, None
+
+@traced()
+@cached("bytecode", key=cache_key)
+async def get_contract_bytecode(address, chain=DEFAULT_CHAIN):
+    """
+    Returns the deployed runtime code as hex, for contracts without verified
+    source (see bytecode.py), or None if there is no code at the address.
+    """
+    params = {"module": "proxy", "action": "eth_getCode", "address": address, "tag": "latest"}
+    res = await _etherscan(params, chain)
+    code = res.get("result")
+    if not isinstance(code, str) or not code.startswith("0x"):
+        raise UpstreamError(f"etherscan code lookup failed: {code}")
+    return code if len(code) > 2 else None
 
 # --- 2. DEPLOYER DETECTIVE ---
-def get_deployer_stats(contract_address):
-    base_url = "https://api.etherscan.io/v2/api"
-    headers = {"User-Agent": "Mozilla/5.0"}
-    params_create = {"chainid": "1", "module": "contract", "action": "getcontractcreation", "contractaddresses": contract_address, "apikey": ETHERSCAN_API_KEY}
-    
+# Split into one call per Etherscan lookup so the scan pipeline can run the
+# balance and tx-count lookups side by side once the creator is known.
+@traced()
+@cached("creator", key=cache_key)
+async def get_contract_creator(contract_address, chain=DEFAULT_CHAIN):
+    params = {"module": "contract", "action": "getcontractcreation", "contractaddresses": contract_address}
+    res = await _etherscan(params, chain)
+    if res.get('status') == '1' and res['result']:
+        return res['result'][0]['contractCreator']
+    return None
+
+@traced()
+@cached("deployer", key=lambda address, chain=DEFAULT_CHAIN: f"balance:{cache_key(address, chain)}")
+async def get_wallet_balance(address, chain=DEFAULT_CHAIN):
+    # In the chain's native token (ETH, BNB, POL)
+    params = {"module": "account", "action": "balance", "address": address, "tag": "latest"}
+    res = await _etherscan(params, chain)
+    if res.get('status') != '1':
+        raise UpstreamError(f"etherscan balance lookup failed: {res.get('result')}")
+    return float(res['result']) / 10**18
+
+@traced()
+@cached("deployer", key=lambda address, chain=DEFAULT_CHAIN: f"txcount:{cache_key(address, chain)}")
+async def get_transaction_count(address, chain=DEFAULT_CHAIN):
+    params = {"module": "proxy", "action": "eth_getTransactionCount", "address": address, "tag": "latest"}
+    res = await _etherscan(params, chain)
+    try:
+        return int(res['result'], 16)
+    except (KeyError, TypeError, ValueError):
+        raise UpstreamError(f"etherscan tx count lookup failed: {res.get('result')}")
+
+@traced()
+async def get_deployer_wallet(creator, chain=DEFAULT_CHAIN):
+    """
+    (balance_eth, tx_count) of a deployer: from the deployer index while it's
+    fresh, else from Etherscan, filed in the index for the next scan.
+    """
+    wallet = DEPLOYER_INDEX.wallet(creator, chain)
+    if wallet is None:
+        wallet = await asyncio.gather(get_wallet_balance(creator, chain), get_transaction_count(creator, chain))
+        DEPLOYER_INDEX.record_wallet(creator, chain, *wallet)
+    return tuple(wallet)
+
+def format_deployer_report(creator, balance_eth, tx_count, chain=DEFAULT_CHAIN, history=None):
+    # `history` is DEPLOYER_INDEX.history(): the deployer's other tokens we've seen
+    native = CHAINS[chain]["native"]
+    deployer_info = f"[DEPLOYER REPORT]\n- Address: {creator}\n- Current Balance: {balance_eth:.4f} {native}\n- Total Transactions: {tx_count}"
+    if history and history["tokens"]:
+        deployer_info += f"\n- Earlier Tokens: {history['tokens']} ({history['critical']} rated CRITICAL)"
+    if tx_count < 5: deployer_info += "\n🚨 WARNING: Deployer is a brand new wallet."
+    if balance_eth < 0.01: deployer_info += "\n🚨 WARNING: Deployer wallet is empty."
+    if history and history["critical"]: deployer_info += "\n🚨 WARNING: Deployer has shipped tokens rated CRITICAL before."
+    return deployer_info
+
+@traced()
+async def get_deployer_stats(contract_address, chain=DEFAULT_CHAIN):
     try:
-        res = requests.get(base_url, params=params_create, headers=headers).json()
-        if res['status'] == '1' and res['result']:
-            creator = res['result'][0]['contractCreator']
-            params_bal = {"chainid": "1", "module": "account", "action": "balance", "address": creator, "tag": "latest", "apikey": ETHERSCAN_API_KEY}
-            bal_res = requests.get(base_url, params=params_bal, headers=headers).json()
-            balance_eth = float(bal_res.get('result', 0)) / 10**18
-            
-            params_tx = {"chainid": "1", "module": "proxy", "action": "eth_getTransactionCount", "address": creator, "tag": "latest", "apikey": ETHERSCAN_API_KEY}
-            tx_res = requests.get(base_url, params=params_tx, headers=headers).json()
-            tx_count = int(tx_res.get('result', 0), 16)
-
-            deployer_info = f"[DEPLOYER REPORT]\n- Address: {creator}\n- Current Balance: {balance_eth:.4f} ETH\n- Total Transactions: {tx_count}"
-            if tx_count < 5: deployer_info += "\n🚨 WARNING: Deployer is a brand new wallet."
-            if balance_eth < 0.01: deployer_info += "\n🚨 WARNING: Deployer wallet is empty."
-            return deployer_info
+        creator = await get_contract_creator(contract_address, chain)
+        if creator:
+            balance_eth, tx_count = await get_deployer_wallet(creator, chain)
+            history = DEPLOYER_INDEX.history(creator, contract_address, chain)
+            return format_deployer_report(creator, balance_eth, tx_count, chain, history)
         return "Deployer info unavailable."
-    except: return "Deployer info unavailable."
+    except (UpstreamError, UpstreamBusy): return "Deployer info unavailable."
 
 # --- 3. MARKET INTEL ---
-def get_market_data(address):
+def market_from_pair(pair):
+    return {
+        "price_usd": pair.get('priceUsd', '0'),
+        "liquidity_usd": pair.get('liquidity', {}).get('usd', 0),
+        "fdv": pair.get('fdv', 0),
+        "dex_id": pair.get('dexId', 'Unknown'),
+        "chain": pair.get('chainId'),
+        "url": pair.get('url', '#')
+    }
+
+def _pair_liquidity(pair):
+    return float((pair.get('liquidity') or {}).get('usd') or 0)
+
+def pick_pair(pairs, address, chain=DEFAULT_CHAIN):
+    """
+    The deepest pool on `chain`. Pools where the token is the base token come
+    first, since DexScreener's priceUsd is the base token's price.
+    """
+    address = address.lower()
+    on_chain = [p for p in pairs if p.get('chainId') == CHAINS[chain]["dexscreener"]]
+    as_base = [p for p in on_chain if (p.get('baseToken') or {}).get('address', '').lower() == address]
+    return max(as_base or on_chain, key=_pair_liquidity, default=None)
+
+@traced()
+@cached("market", key=lambda address: f"pairs:{address.lower()}")
+async def get_token_pairs(address):
+    """
+    Every DexScreener pair for the token, on every chain.
+    Raises UpstreamError if DexScreener can't be reached.
+    """
+    url = f"{DEXSCREENER_API_URL}/latest/dex/tokens/{address}"
     try:
-        url = f"https://api.dexscreener.com/latest/dex/tokens/{address}"
-        headers = {"User-Agent": "Mozilla/5.0"}
-        response = requests.get(url, headers=headers).json()
-        if not response.get('pairs'): return None 
-        pair = response['pairs'][0]
-        return {
-            "price_usd": pair.get('priceUsd', '0'),
-            "liquidity_usd": pair.get('liquidity', {}).get('usd', 0),
-            "fdv": pair.get('fdv', 0),
-            "dex_id": pair.get('dexId', 'Unknown'),
-            "url": pair.get('url', '#')
-        }
-    except: return None
+        response = (await upstream_request("dexscreener", "GET", url)).json()
+    except ValueError:
+        raise UpstreamError("dexscreener returned invalid JSON")
+    return response.get('pairs') or []
 
-# --- 4. RISK SCORING ENGINE ---
-def calculate_risk_score(market_data, deployer_data, code_analysis_text):
+@traced()
+@cached("market", key=cache_key)
+async def get_market_data(address, chain=DEFAULT_CHAIN):
     """
-    Calculates a 0-100 Safety Score based on available hard data.
+    Returns market data for the token's deepest pool on `chain`, or None if
+    it has no pairs there. Raises UpstreamError if DexScreener can't be reached.
     """
-    score = 100
-    reasons = []
+    pair = pick_pair(await get_token_pairs(address), address, chain)
+    return market_from_pair(pair) if pair else None
 
-    # --- 1. FINANCIAL HEALTH (30 Points) ---
-    if not market_data:
-        score -= 30
-        reasons.append("⚠️ No Market Data (Pre-launch/Zero Liquidity)")
-    else:
-        liq = float(market_data.get('liquidity_usd', 0))
-        fdv = float(market_data.get('fdv', 0))
-        
-        if liq < 5000:
-            score -= 25
-            reasons.append("🚨 Critical: Liquidity < $5k")
-        elif liq < 20000:
-            score -= 10
-            reasons.append("⚠️ Low Liquidity (< $15k)")
-            
-        # Health Ratio check
-        if fdv > 0 and liq > 0:
-            if (liq / fdv) < 0.01:
-                score -= 15
-                reasons.append("⚠️ Thin Liquidity (High Volatility Risk)")
-
-    # --- 2. DEPLOYER REPUTATION (20 Points) ---
-    if "brand new wallet" in deployer_data:
-        score -= 20
-        reasons.append("⚠️ Deployer is a fresh wallet")
-    elif "wallet is empty" in deployer_data:
-        score -= 10
-        reasons.append("⚠️ Deployer wallet is empty")
-
-    # --- 3. CODE SECURITY (50 Points) ---
-    lower_report = code_analysis_text.lower()
-    
-    if "critical risk" in lower_report:
-        score -= 50
-        reasons.append("🚨 CRITICAL Vulnerabilities Found")
-    elif "caution" in lower_report:
-        score -= 20
-        reasons.append("⚠️ Potential risks detected")
-        
-    if "infinite mint" in lower_report or "minting enabled" in lower_report:
-        score -= 15
-        reasons.append("⚠️ Minting Capability Detected")
-        
-    if "blacklist" in lower_report:
-        score -= 10
-        reasons.append("⚠️ Blacklist Functionality Found")
+# --- 3b. BATCH LOOKUPS (for /scan/batch) ---
+# Etherscan and DexScreener accept several addresses per call. Every result is
+# written to SCAN_CACHE under the same keys as the single-address lookups.
+CREATION_BATCH = 5    # getcontractcreation: up to 5 contractaddresses
+BALANCE_BATCH = 20    # balancemulti: up to 20 addresses
+MARKET_BATCH = 30     # dexscreener tokens: up to 30 addresses
 
-    # --- 4. CALCULATE VERDICT (THE MISSING PIECE) ---
-    score = max(0, min(100, score))
-    
-    verdict = "SAFE"
-    if score < 50:
-        verdict = "CRITICAL"
-    elif score < 75:
-        verdict = "CAUTION"
-    
-    # RETURN THE CORRECT DICTIONARY
-    return {
-        "score": score,
-        "verdict": verdict,      # <--- THIS WAS MISSING
-        "breakdown": reasons
-    }
+@traced()
+async def get_contract_creators(addresses, chain=DEFAULT_CHAIN):
+    """
+    Returns {lowercased contract address: creator or None}, one call per
+    CREATION_BATCH addresses. Addresses whose call failed are left out.
+    """
+    creators, missing = {}, []
+    for address in addresses:
+        hit = SCAN_CACHE.get("creator", cache_key(address, chain))
+        if hit: creators[address.lower()] = hit
+        else: missing.append(address)
+
+    async def fetch(chunk):
+        params = {"module": "contract", "action": "getcontractcreation", "contractaddresses": ",".join(chunk)}
+        try:
+            res = await _etherscan(params, chain)
+        except (UpstreamError, UpstreamBusy) as e:
+            logging.warning(f"Creator lookup failed for {len(chunk)} contracts ({chain}): {e}")
+            return
+        found = res.get('status') == '1' and isinstance(res.get('result'), list)
+        if not found and "no data" not in str(res.get('message', '')).lower():
+            logging.warning(f"Creator lookup failed for {len(chunk)} contracts ({chain}): {res.get('result') or res.get('message')}")
+            return
+        creators.update(dict.fromkeys(address.lower() for address in chunk))  # no row: not a contract
+        for row in res['result'] if found else []:
+            creators[row['contractAddress'].lower()] = row['contractCreator']
+            SCAN_CACHE.set("creator", cache_key(row['contractAddress'], chain), row['contractCreator'])
+
+    await asyncio.gather(*(fetch(missing[i:i + CREATION_BATCH]) for i in range(0, len(missing), CREATION_BATCH)))
+    return creators
+
+@traced()
+async def get_wallet_balances(addresses, chain=DEFAULT_CHAIN):
+    """
+    Returns {lowercased address: native balance}, one balancemulti call per
+    BALANCE_BATCH addresses. Addresses whose call failed are left out.
+    """
+    balances, missing = {}, []
+    for address in dict.fromkeys(a.lower() for a in addresses):
+        hit = SCAN_CACHE.get("deployer", f"balance:{cache_key(address, chain)}")
+        if hit is not None: balances[address] = hit
+        else: missing.append(address)
+
+    async def fetch(chunk):
+        params = {"module": "account", "action": "balancemulti", "address": ",".join(chunk), "tag": "latest"}
+        try:
+            res = await _etherscan(params, chain)
+        except (UpstreamError, UpstreamBusy) as e:
+            logging.warning(f"Balance lookup failed for {len(chunk)} wallets ({chain}): {e}")
+            return
+        if res.get('status') != '1' or not isinstance(res.get('result'), list):
+            logging.warning(f"Balance lookup failed for {len(chunk)} wallets ({chain}): {res.get('result') or res.get('message')}")
+            return
+        for row in res['result']:
+            balance_eth = float(row['balance']) / 10**18
+            balances[row['account'].lower()] = balance_eth
+            SCAN_CACHE.set("deployer", f"balance:{cache_key(row['account'], chain)}", balance_eth)
+
+    await asyncio.gather(*(fetch(missing[i:i + BALANCE_BATCH]) for i in range(0, len(missing), BALANCE_BATCH)))
+    return balances
+
+@traced()
+async def get_market_data_batch(addresses, chain=DEFAULT_CHAIN):
+    """
+    Returns {lowercased token address: market data or None}, one DexScreener
+    call per MARKET_BATCH addresses. Addresses whose call failed are left out.
+    """
+    markets, missing = {}, []
+    for address in dict.fromkeys(a.lower() for a in addresses):
+        hit = SCAN_CACHE.get("market", cache_key(address, chain))
+        if hit is not None: markets[address] = hit
+        else: missing.append(address)
+
+    async def fetch(chunk):
+        by_token = {token: [] for token in chunk}
+        try:
+            url = f"{DEXSCREENER_API_URL}/latest/dex/tokens/{','.join(chunk)}"
+            response = (await upstream_request("dexscreener", "GET", url)).json()
+        except (UpstreamError, UpstreamBusy, ValueError) as e:
+            logging.warning(f"Market lookup failed for {len(chunk)} tokens ({chain}): {e}")
+            return
+        for pair in response.get('pairs') or []:
+            for side in ('baseToken', 'quoteToken'):
+                token = (pair.get(side) or {}).get('address', '').lower()
+                if token in by_token:
+                    by_token[token].append(pair)
+        for token, pairs in by_token.items():
+            pair = pick_pair(pairs, token, chain)
+            markets[token] = market_from_pair(pair) if pair else None
+            if pair: SCAN_CACHE.set("market", cache_key(token, chain), markets[token])
+
+    await asyncio.gather(*(fetch(missing[i:i + MARKET_BATCH]) for i in range(0, len(missing), MARKET_BATCH)))
+    return markets
+
+# --- 4. RISK SCORING ENGINE ---
+@traced()
+def calculate_risk_score(market_data, deployer_data, code_analysis, findings=None, bytecode=None):
+    """
+    Calculates a 0-100 Safety Score based on available hard data.
+    `code_analysis` is the parsed report IR (see report_parser.py), the raw report text,
+    or None when no AI report was written (unverified contracts, scored on `bytecode`);
+    `deployer_data` is {"balance_eth", "tx_count", "prior_tokens", "prior_critical"}
+    or the deployer report text.
+    The weights live in scoring.py.
+    """
+    report_ir = code_analysis if code_analysis is None or isinstance(code_analysis, dict) else parse_report(code_analysis)
+    features = extract_features(market_data, deployer_data, report_ir, findings, bytecode)
+    return {**score_features(features), "features": features}
 
 # --- 5. ANALYZE ---
 # ... (Keep imports and configs) ...
 
-def analyze_with_gemini_raw(contract_name, source_code, deployer_report=""):
-    
-    candidates = [
-        "gemini-flash-latest",                
-        "gemini-2.0-flash-lite-preview-02-05", 
-        "gemini-2.0-flash-lite-preview"       
-    ]
-    
-    headers = {'Content-Type': 'application/json'}
-    safe_code = source_code[:15000] # Increased limit slightly
-    
-    prompt_template = os.getenv("SYSTEM_PROMPT")
-    
-    if not prompt_template:
-        prompt_template = "Analyze the contract {contract_name}. Code: {safe_code}"
+GEMINI_CANDIDATES = [
+    "gemini-flash-latest",                
+    "gemini-2.0-flash-lite-preview-02-05", 
+    "gemini-2.0-flash-lite-preview"       
+]
+
+CHUNK_PROMPT = (
+    "You are auditing segment {index} of {total} of the smart contract {contract_name}. "
+    "List every security-relevant finding in this segment (owner privileges, minting, blacklists, "
+    "fee or tax changes, trading pauses, reentrancy, unchecked external calls) with the function "
+    "name and a severity. Reply with findings only.\n\nCode:\n{chunk}"
+)
+
+NEIGHBOR_CONTEXT = (
+    "[NEAR-DUPLICATE] This contract is {similarity:.0%} similar to {name}, which was already audited. "
+    "Its audit and the changes from its code to this contract's (unified diff) follow. Write the full "
+    "report for THIS contract: keep the prior findings the changes don't touch, revise the ones they do, "
+    "and audit every added or modified line.\n\n[PRIOR AUDIT]\n{report}\n\n[CHANGES]\n{diff}"
+)
+# Stands in for {deployer_report}: the stored audit covers the code only, so
+# one report serves every deployer of the same code at any price
+CODE_ONLY = (
+    "[DEPLOYER REPORT]\nNot part of this audit: deployer and market intel are added to the report "
+    "separately. Audit the code only and leave out the DEPLOYER INTEL section."
+)
+
+async def _generate(prompt_text, models):
+    """
+    Hedged across models (see model_dispatch.py). Returns (model, text), or
+    (None, None) if all fail.
+    """
+    data = {"contents": [{"parts": [{"text": prompt_text}]}]}
+
+    async def call(model):
+        # The API key is added by the scheduler from the GEMINI_API_KEYS pool
+        url = f"{GEMINI_API_URL}/v1beta/models/{model}:generateContent"
+        try:
+            response = await upstream_request("gemini", "POST", url, json=data)
+        except UpstreamBusy as e:
+            raise ModelFailed("busy", str(e))
+        except UpstreamError as e:
+            raise ModelFailed("unavailable", str(e))
+        if response.status_code != 200:
+            raise ModelFailed(f"http_{response.status_code}")
+        try:
+            return response.json()['candidates'][0]['content']['parts'][0]['text']
+        except (KeyError, IndexError, ValueError):
+            raise ModelFailed("empty", "no text in response")
+
+    return await MODEL_DISPATCH.generate(models, call)
+
+async def _analyze_chunk(contract_name, chunk, index, total):
+    # Map step: chunk findings are memoized by content too, so shared code is paid for once
+    cached_findings = REPORT_STORE.get(chunk, CHUNK_PROMPT, GEMINI_CANDIDATES)
+    if cached_findings is not None:
+        return cached_findings
+    prompt_text = CHUNK_PROMPT.format(index=index, total=total, contract_name=contract_name, chunk=chunk)
+    model, findings = await _generate(prompt_text, GEMINI_CANDIDATES)
+    if findings is not None:
+        REPORT_STORE.put(chunk, CHUNK_PROMPT, model, findings)
+    return findings
+
+async def _build_prompt(prompt_template, contract_name, source_code, neighbor=None):
+    if not GEMINI_API_KEY:
+        raise UpstreamError("Missing Gemini API Key. Check your .env file.")
+    if neighbor:
+        # Near-duplicate of an audited contract: its report plus the diff stand in for the code
+        prior = drop_section(neighbor["report"], "deployer")  # reports stored before CODE_ONLY have one
+        return prompt_template.format(deployer_report=CODE_ONLY, contract_name=contract_name, safe_code=NEIGHBOR_CONTEXT.format(**{**neighbor, "report": prior}))
+
+    # Parse multi-file / Standard-JSON sources and keep only the unique project code
+    chunks = chunk_units((await run_in_threadpool(ingest_source, source_code))["units"])
+
+    if len(chunks) <= 1:
+        safe_code = chunks[0] if chunks else source_code[:15000]
+    else:
+        # Map: audit every chunk in parallel. Reduce: the normal prompt over the merged findings.
+        findings = await asyncio.gather(*(_analyze_chunk(contract_name, chunk, i + 1, len(chunks)) for i, chunk in enumerate(chunks)))
+        if all(f is None for f in findings):
+            raise UpstreamError("AI Sentinel Offline.")
+        safe_code = "\n\n".join(
+            f"[SEGMENT {i + 1}/{len(chunks)} FINDINGS]\n{f if f is not None else 'Analysis unavailable for this segment.'}"
+            for i, f in enumerate(findings)
+        )
     
-    prompt_text = prompt_template.format(
-    deployer_report=deployer_report,
+    return prompt_template.format(
+    deployer_report=CODE_ONLY,
     contract_name=contract_name,
     safe_code=safe_code
     )
-    
+
+def analysis_context(deployer_report, market):
+    # Everything besides the code the Pro report covers
+    market_context = ""
+    if market:
+        market_context = f"[MARKET DATA]\n- Price: ${market['price_usd']}\n- Liquidity: ${market['liquidity_usd']}"
+    return f"{deployer_report}\n\n{market_context}"
+
+def deployer_section(context):
+    """
+    The DEPLOYER INTEL section, written from this scan's own deployer and
+    market data (analysis_context) rather than by the model, so the code
+    audit can be stored and reused without them.
+    """
+    lines = [line for line in context.splitlines() if line.strip() and not line.startswith("[")]
+    return "### 🕵️‍♂️ DEPLOYER INTEL\n" + "".join(f"{line}\n" for line in lines) + "\n"
+
+def _reuse_audit(source_code, prompt_template, neighbor):
+    # Only comments or vendored files differ from an audited contract: its
+    # audit holds as is, and is stored under this source for the next scan
+    REPORT_STORE.put(source_code, prompt_template, GEMINI_CANDIDATES[0], neighbor["report"])
+    return neighbor["report"]
+
+@traced()
+async def audit_code(contract_name, source_code):
+    """
+    The model's audit of the code alone, memoized by (normalized source,
+    prompt template, model): re-scans, clones and warmed contracts never go
+    back to the LLM, whoever deployed them and whatever the market does.
+    """
+    prompt_template = get_prompt_template()
+
+    cached_report = REPORT_STORE.get(source_code, prompt_template, GEMINI_CANDIDATES)
+    if cached_report is not None:
+        return cached_report
+    fingerprint, neighbor = await run_in_threadpool(SIMILARITY_INDEX.match, source_code, prompt_template)
+    if neighbor and not neighbor["diff"]:
+        return _reuse_audit(source_code, prompt_template, neighbor)
+    prompt_text = await _build_prompt(prompt_template, contract_name, source_code, neighbor)
+    model, report = await _generate(prompt_text, GEMINI_CANDIDATES)
+    if report is None:
+        # Raise rather than return an error string that would be scored as a clean report
+        raise UpstreamError("AI Sentinel Offline.")
+    REPORT_STORE.put(source_code, prompt_template, model, report)
+    if not neighbor:
+        SIMILARITY_INDEX.add(fingerprint, contract_name, prompt_template, report)
+    return report
+
+@traced()
+async def analyze_with_gemini_raw(contract_name, source_code, deployer_report=""):
+    """
+    The Pro report: DEPLOYER INTEL from `deployer_report` (analysis_context),
+    then the memoized code audit. A deployer section the model wrote anyway
+    is dropped, it would describe whoever deployed the code first.
+    """
+    report = await audit_code(contract_name, source_code)
+    return (deployer_section(deployer_report) if deployer_report else "") + drop_section(report, "deployer")
+
+async def _stream_model(model, prompt_text):
+    # Gemini's SSE endpoint: one "data: {json}" line per batch of tokens
+    url = f"{GEMINI_API_URL}/v1beta/models/{model}:streamGenerateContent"
     data = {"contents": [{"parts": [{"text": prompt_text}]}]}
-    for model in candidates:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={GEMINI_API_KEY}"
+    async with upstream_stream("gemini", "POST", url, params={"alt": "sse"}, json=data) as response:
+        if response.status_code != 200:
+            raise UpstreamError(f"gemini {model} answered HTTP {response.status_code}")
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            try:
+                parts = json.loads(line[5:])['candidates'][0]['content']['parts']
+            except (KeyError, IndexError, ValueError):
+                continue  # e.g. the final chunk that only carries finishReason
+            text = "".join(part.get('text', "") for part in parts)
+            if text:
+                yield text
+
+async def _audit_code_stream(contract_name, source_code):
+    # audit_code, yielded as text deltas while the model writes it
+    prompt_template = get_prompt_template()
+
+    cached_report = REPORT_STORE.get(source_code, prompt_template, GEMINI_CANDIDATES)
+    if cached_report is not None:
+        yield cached_report
+        return
+    fingerprint, neighbor = await run_in_threadpool(SIMILARITY_INDEX.match, source_code, prompt_template)
+    if neighbor and not neighbor["diff"]:
+        yield _reuse_audit(source_code, prompt_template, neighbor)
+        return
+    prompt_text = await _build_prompt(prompt_template, contract_name, source_code, neighbor)
+    # A stream can't be hedged once tokens are out, but it still starts with
+    # the model the live stats rank best and feeds the same stats
+    for model in MODEL_DISPATCH.rank(GEMINI_CANDIDATES):
+        stats = MODEL_DISPATCH.stats_for(model)
+        start = time.monotonic()
+        parts = []
         try:
-            response = requests.post(url, headers=headers, json=data)
-            if response.status_code == 200:
-                return response.json()['candidates'][0]['content']['parts'][0]['text']
-        except: continue
-    return "Error: AI Sentinel Offline."
+            async for text in _stream_model(model, prompt_text):
+                parts.append(text)
+                yield text
+        except (UpstreamError, UpstreamBusy, httpx.HTTPError) as e:
+            stats.failure("stream" if parts else "unavailable")
+            if parts:
+                raise UpstreamError(f"AI Sentinel stream interrupted ({e})")
+            logging.warning(f"Gemini {model} unavailable: {e}")
+            continue
+        if parts:
+            stats.success(time.monotonic() - start)
+            REPORT_STORE.put(source_code, prompt_template, model, "".join(parts))
+            if not neighbor:
+                SIMILARITY_INDEX.add(fingerprint, contract_name, prompt_template, "".join(parts))
+            return
+        stats.failure("empty")
+        logging.warning(f"Gemini {model} returned no text")
+    raise UpstreamError("AI Sentinel Offline.")
+
+@traced()
+async def analyze_with_gemini_stream(contract_name, source_code, deployer_report=""):
+    """
+    Same report as analyze_with_gemini_raw, yielded as text deltas while the
+    model writes it. Falls back to the next model only if nothing has been
+    yielded yet; the finished audit is memoized like the blocking path.
+    """
+    if deployer_report:
+        yield deployer_section(deployer_report)
+    section_filter = SectionFilter("deployer")
+    async for text in _audit_code_stream(contract_name, source_code):
+        if shown := section_filter.feed(text):
+            yield shown
+    if tail := section_filter.flush():
+        yield tail
+
+def findings_key(address, chain=DEFAULT_CHAIN):
+    # Includes the rule set version, so editing RULES re-scans everything
+    return f"{RULESET_VERSION}:{cache_key(address, chain)}"
+
+@traced()
+def get_findings(address, source_code, chain=DEFAULT_CHAIN):
+    """
+    run_rules() for a verified contract, cached alongside its source.
+    """
+    key = findings_key(address, chain)
+    findings = SCAN_CACHE.get("findings", key)
+    if findings is None:
+        findings = run_rules(source_code)
+        SCAN_CACHE.set("findings", key, findings)
+    return findings
 
+@traced()
 def basic_security_check(source_code):
     """
-    Performs a $0 'Ctrl+F' scan for dangerous keywords.
+    Performs a $0 static scan for dangerous patterns (see rules.py).
     Returns a list of flags.
     """
-    flags = []
-    lower_code = source_code.lower()
-    
-    # 1. Ownership Checks
-    if "onlyowner" in lower_code:
-        flags.append("👑 **Centralized Control:** Functions are restricted to the Owner.")
-    
-    # 2. Money Printing
-    if "mint" in lower_code:
-        flags.append("🖨️ **Mint Function:** Contract *might* be able to print more tokens.")
-        
-    # 3. Trading Stops
-    if "pause" in lower_code or "tradingopen" in lower_code:
-        flags.append("⏸️ **Pausable:** Trading can potentially be stopped.")
-        
-    # 4. Blacklisting
-    if "blacklist" in lower_code or "isbot" in lower_code:
-        flags.append("🚫 **Blacklist:** Specific wallets can be blocked.")
-        
-    # 5. Tax Changes
-    if "settax" in lower_code or "setfee" in lower_code:
-        flags.append("💸 **Tax Modifiable:** Buy/Sell fees can be changed.")
-
-    return flags
\ No newline at end of file
+    return flags_from_findings(run_rules(source_code))
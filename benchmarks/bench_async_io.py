@@ -0,0 +1,90 @@
+"""
+Concurrent-scan throughput: blocking requests vs the pooled async client layer.
+
+    python benchmarks/bench_async_io.py --scans 200 --latency 0.1
+
+Both modes run the /scan/free pipeline (source + market + basic_security_check)
+as concurrent coroutines against a local stub server. "before" calls the old
+blocking `requests` helpers from inside the coroutines, exactly like the
+original handlers did, so every upstream round trip stalls the event loop.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stub_upstream import StubServer, build_app
+
+def legacy_helpers(base_url):
+    import requests
+
+    def get_contract_source_code(address):
+        params = {"chainid": "1", "module": "contract", "action": "getsourcecode", "address": address, "apikey": "bench"}
+        data = requests.get(f"{base_url}/v2/api", params=params, headers={"User-Agent": "Mozilla/5.0"}).json()
+        return data['result'][0]['ContractName'], data['result'][0]['SourceCode']
+
+    def get_market_data(address):
+        response = requests.get(f"{base_url}/latest/dex/tokens/{address}", headers={"User-Agent": "Mozilla/5.0"}).json()
+        return response['pairs'][0]
+
+    return get_contract_source_code, get_market_data
+
+async def run_before(base_url, scans):
+    from auditor import basic_security_check
+    get_source, get_market = legacy_helpers(base_url)
+
+    async def scan(address):
+        name, code = get_source(address)
+        market = get_market(address)
+        return basic_security_check(code), market
+
+    return await asyncio.gather(*(scan(f"0x{i:040x}") for i in range(scans)))
+
+async def run_after(scans):
+    from auditor import get_contract_source_code, get_market_data, basic_security_check
+    from upstream import close_clients
+
+    async def scan(address):
+        name, code = await get_contract_source_code(address)
+        market = await get_market_data(address)
+        return basic_security_check(code), market
+
+    try:
+        return await asyncio.gather(*(scan(f"0x{i:040x}") for i in range(scans)))
+    finally:
+        await close_clients()
+
+def report(label, scans, elapsed):
+    print(f"{label:<8} {scans} scans in {elapsed:7.2f}s  ->  {scans / elapsed:8.1f} scans/s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scans", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds added to every stub response")
+    parser.add_argument("--skip-before", action="store_true", help="only measure the async path")
+    args = parser.parse_args()
+
+    with StubServer(build_app(latency=args.latency)) as stub:
+        # The auditor reads its endpoints at import time, so point it at the stub first
+        os.environ.update({
+            "ETHERSCAN_API_URL": f"{stub.url}/v2/api",
+            "DEXSCREENER_API_URL": stub.url,
+            "GEMINI_API_URL": stub.url,
+            "ETHERSCAN_API_KEY": "bench",
+            "GEMINI_API_KEY": "bench",
+        })
+
+        print(f"stub latency {args.latency * 1000:.0f} ms per upstream call, 2 calls per scan")
+        if not args.skip_before:
+            start = time.perf_counter()
+            asyncio.run(run_before(stub.url, args.scans))
+            report("before", args.scans, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        asyncio.run(run_after(args.scans))
+        report("after", args.scans, time.perf_counter() - start)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+End-to-end load test: the real API against recorded upstream fixtures.
+
+    python benchmarks/bench_e2e.py --endpoint free --endpoint pro --requests 200 --concurrency 20 \\
+        --latency etherscan=0.15,dexscreener=0.1,gemini=2,supabase=0.05 --error-rate etherscan=0.02
+
+The stub upstream (stub_upstream.py) replays --fixtures with the injected
+latency and errors; the API runs under uvicorn in a child process pointed at
+it, with Pro jobs run by --workers inline job workers. Each endpoint gets its
+own addresses, so every run starts with cold caches unless --distinct is
+smaller than --requests. Per endpoint it reports latency percentiles,
+throughput, response statuses and upstream calls per request.
+
+The API keeps its real rate limits: set ETHERSCAN_RATE_PER_KEY,
+GEMINI_RATE_PER_KEY etc. in the environment to measure the app instead of
+the budgets. --json saves the numbers; --baseline compares against a saved
+run and exits 1 when p95 or throughput regressed by more than --max-regression.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+import httpx
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+from stub_upstream import StubServer, build_app, load_fixtures, _free_port
+
+ENDPOINTS = ("free", "pro", "stream", "batch", "sweep")
+PROVIDERS = ("etherscan", "dexscreener", "gemini", "supabase")
+
+def percentile(sorted_values, q):
+    # Nearest rank
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))]
+
+def provider_map(text):
+    # "0.1" -> 0.1 for every provider, "etherscan=0.2,gemini=2" -> per provider
+    if "=" not in text:
+        return float(text)
+    return {name.strip(): float(value) for name, value in (item.split("=") for item in text.split(","))}
+
+# --- 1. THE API UNDER TEST ---
+class ApiProcess:
+    """
+    uvicorn api:app in a child process, so the load driver's event loop never
+    competes with the one being measured.
+    """
+    def __init__(self, stub_url, workers, workdir):
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        env = {k: v for k, v in os.environ.items() if k not in ("SCAN_CACHE_DB", "REPORT_STORE_DB", "WARMER_FEEDS")}
+        env.update({
+            "PYTHONPATH": REPO,
+            "ETHERSCAN_API_URL": f"{stub_url}/v2/api", "DEXSCREENER_API_URL": stub_url, "GEMINI_API_URL": stub_url,
+            "SUPABASE_URL": stub_url, "SUPABASE_KEY": "bench", "ETHERSCAN_API_KEY": "bench", "GEMINI_API_KEY": "bench",
+            "JOB_QUEUE_URL": f"sqlite:///{os.path.join(workdir, 'jobs.db')}", "JOB_INLINE_WORKERS": str(workers),
+        })
+        self.cmd = [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning"]
+        self.env, self.workdir = env, workdir
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.cmd, env=self.env, cwd=self.workdir)
+        deadline = time.monotonic() + 120
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"API exited during startup (code {self.process.returncode})")
+            try:
+                if httpx.get(f"{self.url}/chains", timeout=1).status_code == 200:
+                    return self
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.25)
+        self.process.kill()
+        raise RuntimeError("API did not start within 120s")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+# --- 2. ONE REQUEST PER ENDPOINT ---
+# Each returns (status label, seconds to first byte or None)
+async def call_free(client, addresses, path="/scan/free"):
+    response = await client.post(path, json={"address": addresses[0]})
+    return str(response.status_code), None
+
+async def call_sweep(client, addresses):
+    return await call_free(client, addresses, "/scan/sweep")
+
+async def call_pro(client, addresses):
+    response = await client.post("/scan/pro", json={"address": addresses[0], "user_id": str(uuid.uuid4())})
+    if response.status_code not in (200, 202):
+        return str(response.status_code), None
+    job = response.json()
+    while job["status"] in ("queued", "running"):
+        response = await client.get(job["poll"], params={"wait": 30})
+        if response.status_code != 200:
+            return str(response.status_code), None
+        job = response.json()
+    return f"job:{job['status']}", None
+
+async def call_stream(client, addresses):
+    start = time.perf_counter()
+    first, last = None, None
+    async with client.stream("POST", "/scan/pro/stream", json={"address": addresses[0], "user_id": str(uuid.uuid4())}) as response:
+        if response.status_code != 200:
+            return str(response.status_code), None
+        async for line in response.aiter_lines():
+            if line:
+                first = first or time.perf_counter() - start
+                last = json.loads(line)
+    return ("200" if last and last["event"] == "result" else "stream:error"), first
+
+async def call_batch(client, addresses):
+    start = time.perf_counter()
+    first = None
+    async with client.stream("POST", "/scan/batch", json={"addresses": addresses}) as response:
+        async for line in response.aiter_lines():
+            if line and first is None:
+                first = time.perf_counter() - start
+    return str(response.status_code), first
+
+CALLS = {"free": call_free, "pro": call_pro, "stream": call_stream, "batch": call_batch, "sweep": call_sweep}
+
+# --- 3. LOAD DRIVER ---
+async def drive(url, endpoint, index, args, stub_app):
+    call = CALLS[endpoint]
+    size = args.batch_size if endpoint == "batch" else 1
+    distinct = args.distinct or args.requests
+
+    def addresses(i):
+        # Distinct per endpoint and per request (modulo --distinct); warmup uses its own range
+        return [f"0x{index + 1:02x}{(i % distinct) * size + j:038x}" for j in range(size)]
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+        for i in range(args.warmup):
+            await call(client, [f"0xff{index:02x}{i * size + j:036x}" for j in range(size)])
+        stub_app.state.calls.clear()
+
+        latencies, ttfbs, statuses = [], [], Counter()
+        slots = asyncio.Semaphore(args.concurrency)
+
+        async def one(i):
+            async with slots:
+                start = time.perf_counter()
+                try:
+                    status, ttfb = await call(client, addresses(i))
+                except httpx.HTTPError as e:
+                    status, ttfb = type(e).__name__, None
+                latencies.append(time.perf_counter() - start)
+                statuses[status] += 1
+                if ttfb is not None:
+                    ttfbs.append(ttfb)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - start
+    return summarize(endpoint, args, elapsed, latencies, ttfbs, statuses, Counter(stub_app.state.calls))
+
+def summarize(endpoint, args, elapsed, latencies, ttfbs, statuses, calls):
+    latencies.sort()
+    ttfbs.sort()
+    ms = lambda v: None if v is None else round(v * 1000, 1)
+    upstream = Counter()
+    for key, count in calls.items():
+        upstream[key.split(":")[0]] += count
+    result = {
+        "endpoint": endpoint,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(args.requests / elapsed, 2),
+        "status": dict(statuses),
+        "latency_ms": {"p50": ms(percentile(latencies, 0.50)), "p95": ms(percentile(latencies, 0.95)),
+                       "p99": ms(percentile(latencies, 0.99)), "max": ms(latencies[-1])},
+        "upstream_per_request": {p: round(upstream[p] / args.requests, 2) for p in PROVIDERS if upstream[p]},
+        "upstream_errors": {p: calls[f"errors:{p}"] for p in PROVIDERS if calls[f"errors:{p}"]},
+        "upstream_calls": {k: v for k, v in sorted(calls.items()) if not k.startswith("errors:")},
+    }
+    if ttfbs:
+        result["first_byte_ms"] = {"p50": ms(percentile(ttfbs, 0.50)), "p95": ms(percentile(ttfbs, 0.95))}
+    return result
+
+def print_table(results):
+    print(f"\n{'endpoint':<8} {'req':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  statuses / upstream calls per request")
+    for r in results:
+        lat = r["latency_ms"]
+        print(f"{r['endpoint']:<8} {r['requests']:>5} {r['throughput_rps']:>8} {lat['p50']:>9} {lat['p95']:>9} {lat['p99']:>9}  "
+              f"{r['status']}  {r['upstream_per_request']}"
+              + (f"  injected errors {r['upstream_errors']}" if r["upstream_errors"] else "")
+              + (f"  first byte p50 {r['first_byte_ms']['p50']} ms" if "first_byte_ms" in r else ""))
+
+def compare(results, baseline, max_regression):
+    """
+    Prints the change against a saved run. Returns True if anything regressed.
+    """
+    previous = {r["endpoint"]: r for r in baseline["results"]}
+    regressed = False
+    print(f"\nvs baseline (max regression {max_regression:.0%}):")
+    for r in results:
+        old = previous.get(r["endpoint"])
+        if old is None:
+            continue
+        p95 = r["latency_ms"]["p95"] / old["latency_ms"]["p95"] - 1
+        rps = r["throughput_rps"] / old["throughput_rps"] - 1
+        bad = p95 > max_regression or rps < -max_regression
+        regressed |= bad
+        print(f"  {r['endpoint']:<8} p95 {p95:+.1%}  throughput {rps:+.1%}{'  REGRESSION' if bad else ''}")
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", action="append", choices=ENDPOINTS, help="repeatable; default: free and pro")
+    parser.add_argument("--requests", type=int, default=100, help="per endpoint")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--distinct", type=int, default=0, help="distinct addresses per endpoint (default: one per request)")
+    parser.add_argument("--batch-size", type=int, default=50, help="addresses per /scan/batch request")
+    parser.add_argument("--warmup", type=int, default=3, help="unmeasured requests per endpoint")
+    parser.add_argument("--workers", type=int, default=None, help="inline Pro job workers (default: --concurrency)")
+    parser.add_argument("--fixtures", default=os.path.join(REPO, "benchmarks", "fixtures", "sample.json"))
+    parser.add_argument("--latency", type=provider_map, default="etherscan=0.15,dexscreener=0.1,gemini=1.5,supabase=0.05",
+                        help="seconds per upstream call: one number or provider=seconds,...")
+    parser.add_argument("--jitter", type=float, default=0.2, help="+/- fraction applied to every latency")
+    parser.add_argument("--error-rate", type=provider_map, default="0", help="fraction of upstream calls that fail, like --latency")
+    parser.add_argument("--shared-source", action="store_true", help="don't make each address's source unique (reports come from the report store)")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results here")
+    parser.add_argument("--baseline", help="results from an earlier --json run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+    endpoints = args.endpoint or ["free", "pro"]
+
+    stub_app = build_app(latency=args.latency, error_rate=args.error_rate, jitter=args.jitter,
+                         fixtures=load_fixtures(args.fixtures), salt_sources=not args.shared_source, seed=args.seed)
+    with tempfile.TemporaryDirectory() as workdir, StubServer(stub_app) as stub, \
+            ApiProcess(stub.url, args.workers or args.concurrency, workdir) as api:
+        print(f"stub {stub.url} (latency {args.latency}, errors {args.error_rate}), api {api.url}")
+        results = []
+        for index, endpoint in enumerate(endpoints):
+            results.append(asyncio.run(drive(api.url, endpoint, index, args, stub_app)))
+            print(f"{endpoint}: {results[-1]['requests']} requests done")
+
+    print_table(results)
+    config = {k: v for k, v in vars(args).items() if k not in ("json", "baseline")}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": config, "results": results}, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            if compare(results, json.load(f), args.max_regression):
+                sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+PDF rendering throughput: a single render loop, the worker pool, and cache hits.
+
+    python benchmarks/bench_pdf.py --runs 50 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pdf_generator import render_audit_pdf
+from pdf_service import PDFService, PDFCache
+
+SECTION = """### 🕵️‍♂️ DEPLOYER INTEL
+Deployer: 0x00000000000000000000000000000000000000d3
+Wallet Age: 412 days
+Balance: 2.5000 ETH
+### 🧠 SMART CONTRACT INTELLIGENCE
+(Architecture)
+Type: ERC20 with fee-on-transfer
+Compiler: v0.8.20
+Ownership: Ownable, not renounced
+The contract wraps transfers in a fee hook that routes a share of every swap to the marketing wallet.
+### 🚨 THREAT DETECTION
+(Owner Privileges)
+Mint: Owner can mint new tokens
+Fees: setFees allows up to 25% buy/sell tax
+Blacklist: isBot mapping blocks transfers from flagged wallets
+(External Calls)
+The swapBack routine calls the router without a reentrancy guard; the state is updated after the call.
+### 💰 GAS OPTIMIZATION
+Storage: cache _balances[sender] in memory
+Loops: the airdrop loop reads array length on every iteration
+### AUDIT VERDICT: CAUTION
+"""
+
+def typical_payload(i=0):
+    return {
+        "name": f"StubToken{i}",
+        "address": "0x" + f"{i:040x}",
+        "report": SECTION,
+        "verdict": "CAUTION",
+        "market": {"price_usd": "0.0042", "liquidity_usd": 125000, "fdv": 4200000, "dex_id": "uniswap"},
+        "score": 62,
+        "score_reasons": ["Owner can mint", "Modifiable tax", "Blacklist present"],
+    }
+
+def long_payload(i=0):
+    # A big multi-contract audit: dozens of findings per section, ~20+ pages
+    threats = "\n".join(
+        f"(Finding {n})\nFunction: setParam{n}\nSeverity: {'High' if n % 3 == 0 else 'Medium'}\n"
+        f"The owner can change parameter {n} at any time without a timelock, which lets them alter transfer behaviour for every holder."
+        for n in range(150)
+    )
+    report = SECTION.replace("### 🚨 THREAT DETECTION\n", "### 🚨 THREAT DETECTION\n" + threats + "\n")
+    return {**typical_payload(i), "report": report}
+
+PROFILES = {"typical": typical_payload, "long": long_payload}
+
+def bench_serial(make, runs):
+    render_audit_pdf(make(-1))  # warm up
+    start = time.perf_counter()
+    for i in range(runs):
+        render_audit_pdf(make(i))
+    return runs / (time.perf_counter() - start)
+
+async def bench_service(make, runs, workers):
+    service = PDFService(workers=workers, cache=PDFCache())
+    try:
+        await service.render(make(-1))  # start the pool
+        start = time.perf_counter()
+        await asyncio.gather(*(service.render(make(i)) for i in range(runs)))
+        rendered = runs / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(service.render(make(i)) for i in range(runs)))
+        cached = runs / (time.perf_counter() - start)
+        return rendered, cached
+    finally:
+        service.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--profile", choices=[*PROFILES, "all"], default="all")
+    args = parser.parse_args()
+
+    for profile in PROFILES if args.profile == "all" else [args.profile]:
+        make = PROFILES[profile]
+        runs = args.runs if profile == "typical" else max(1, args.runs // 10)
+        size = len(render_audit_pdf(make(0)))
+        serial = bench_serial(make, runs)
+        pooled, cached = asyncio.run(bench_service(make, runs, args.workers))
+        print(f"[{profile}] {size / 1024:.0f} KB per PDF, {runs} renders")
+        print(f"  single process      : {serial:8.1f} PDFs/s")
+        print(f"  pool ({args.workers} workers)    : {pooled:8.1f} PDFs/s")
+        print(f"  cached              : {cached:8.1f} PDFs/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Micro-benchmark: the compiled rule engine vs the old keyword `in` checks.
+
+    python benchmarks/bench_rules.py --size-kb 1024 --runs 20
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rules import run_rules, flags_from_findings
+
+def legacy_basic_security_check(source_code):
+    # The pre-rules.py implementation, kept here as the baseline
+    flags = []
+    lower_code = source_code.lower()
+    if "onlyowner" in lower_code: flags.append("owner")
+    if "mint" in lower_code: flags.append("mint")
+    if "pause" in lower_code or "tradingopen" in lower_code: flags.append("pause")
+    if "blacklist" in lower_code or "isbot" in lower_code: flags.append("blacklist")
+    if "settax" in lower_code or "setfee" in lower_code: flags.append("tax")
+    return flags
+
+# Keyword-dense worst case: every block has comments, strings and several rule hits
+DENSE_TEMPLATE = """
+/**
+ * @dev Mintable, pausable token. Nothing to see in this comment: blacklist, setFee.
+ */
+contract Token{i} is ERC20, Ownable {{
+    string private constant NOTE = "call mint() to permit transfers";
+    mapping(address => bool) private _isBot;
+    uint256 public buyFee{i} = 3;
+
+    function transfer(address to, uint256 amount) public override returns (bool) {{
+        require(!_isBot[msg.sender], "blocked");
+        return super.transfer(to, amount);
+    }}
+
+    function setFees{i}(uint256 buy) external onlyOwner {{ buyFee{i} = buy; }}
+    function mint(address to, uint256 amount) external onlyOwner {{ _mint(to, amount); }}
+    function balanceAfterFee(uint256 amount) public view returns (uint256) {{ return amount - amount * buyFee{i} / 100; }}
+}}
+"""
+
+# Typical flattened token: mostly ERC20 plumbing, few rule hits
+TYPICAL_TEMPLATE = """
+// OpenZeppelin Contracts v4.4.1 (token/ERC20/ERC20.sol)
+contract ERC20Part{i} is Context, IERC20, IERC20Metadata {{
+    mapping(address => uint256) private _balances;
+    mapping(address => mapping(address => uint256)) private _allowances;
+    uint256 private _totalSupply;
+
+    function totalSupply() public view virtual override returns (uint256) {{ return _totalSupply; }}
+    function balanceOf(address account) public view virtual override returns (uint256) {{ return _balances[account]; }}
+
+    function approve(address spender, uint256 amount) public virtual override returns (bool) {{
+        _approve(_msgSender(), spender, amount);
+        return true;
+    }}
+
+    function _transfer(address sender, address recipient, uint256 amount) internal virtual {{
+        require(sender != address(0), "ERC20: transfer from the zero address");
+        uint256 senderBalance = _balances[sender];
+        require(senderBalance >= amount, "ERC20: transfer amount exceeds balance");
+        unchecked {{ _balances[sender] = senderBalance - amount; }}
+        _balances[recipient] += amount;
+        emit Transfer(sender, recipient, amount);
+    }}
+}}
+"""
+
+PROFILES = {"dense": DENSE_TEMPLATE, "typical": TYPICAL_TEMPLATE}
+
+def build_source(size_kb, template=DENSE_TEMPLATE):
+    parts, size, i = [], 0, 0
+    while size < size_kb * 1024:
+        block = template.format(i=i)
+        parts.append(block)
+        size += len(block)
+        i += 1
+    return "".join(parts)
+
+def bench(fn, source, runs):
+    fn(source)  # warm up
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn(source)
+    return (time.perf_counter() - start) / runs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-kb", type=int, default=1024)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--profile", choices=[*PROFILES, "all"], default="all")
+    args = parser.parse_args()
+
+    for profile in PROFILES if args.profile == "all" else [args.profile]:
+        source = build_source(args.size_kb, PROFILES[profile])
+        legacy = bench(legacy_basic_security_check, source, args.runs)
+        engine = bench(lambda s: flags_from_findings(run_rules(s)), source, args.runs)
+        findings = run_rules(source)
+
+        print(f"[{profile}] source: {len(source) / 1024:.0f} KB, {source.count(chr(10))} lines, {len(findings)} findings")
+        print(f"  legacy `in` checks : {legacy * 1000:8.2f} ms/scan ({1 / legacy:8.1f} scans/s)")
+        print(f"  rule engine        : {engine * 1000:8.2f} ms/scan ({1 / engine:8.1f} scans/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Bulk re-scoring throughput: scoring.score_batch over synthetic scan history
+versus scoring each row on its own.
+
+    python benchmarks/bench_scoring.py --rows 500000
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scoring import FEATURES, feature_columns, load_weights, score_batch, score_features
+
+def synthetic_columns(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    columns = {feature: rng.integers(0, 2, rows).astype(np.float64) for feature in FEATURES}
+    columns["liquidity_usd"] = np.where(columns["has_market"] == 1, rng.lognormal(9, 2, rows), np.nan)
+    columns["fdv"] = np.where(columns["has_market"] == 1, rng.lognormal(13, 2, rows), np.nan)
+    columns["liq_fdv_ratio"] = columns["liquidity_usd"] / columns["fdv"]
+    known = columns["deployer_known"] == 1
+    columns["deployer_tx_count"] = np.where(known, rng.integers(0, 500, rows), np.nan)
+    columns["deployer_balance_eth"] = np.where(known, rng.exponential(0.5, rows), np.nan)
+    return columns
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--weights", default="v1")
+    args = parser.parse_args()
+
+    weights = load_weights(args.weights)
+    columns = synthetic_columns(args.rows)
+
+    start = time.perf_counter()
+    result = score_batch(columns, weights)
+    batch = time.perf_counter() - start
+
+    # Row-at-a-time baseline on a sample, extrapolated
+    sample = min(args.rows, 5000)
+    rows = [{f: (None if np.isnan(columns[f][i]) else float(columns[f][i])) for f in FEATURES} for i in range(sample)]
+    start = time.perf_counter()
+    single = [score_features(row, weights)["score"] for row in rows]
+    per_row = (time.perf_counter() - start) / sample
+
+    assert single == result["score"][:sample].tolist(), "batch and single-row scores disagree"
+    start = time.perf_counter()
+    feature_columns(rows)
+    to_columns = (time.perf_counter() - start) / sample
+
+    print(f"{args.rows} rows, weights {weights[0]}")
+    print(f"  score_batch         : {batch:8.3f} s ({args.rows / batch:,.0f} rows/s)")
+    print(f"  row dicts -> columns: {to_columns * args.rows:8.3f} s (est.)")
+    print(f"  one row at a time   : {per_row * args.rows:8.3f} s (est. from {sample} rows)")
+
+if __name__ == "__main__":
+    main()
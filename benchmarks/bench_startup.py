@@ -0,0 +1,91 @@
+"""
+Cold start: how long a fresh process takes to import the API (or the job
+worker) and run its startup hook, and which imports the time goes to.
+
+    python benchmarks/bench_startup.py --runs 5 --max-seconds 1.0
+
+Each run is a new interpreter, timed from spawn to exit, so the numbers
+include Python's own startup and the shutdown hook. The API's background
+pre-warm (API_PREWARM), warmer, deployer refresher and inline workers are
+off: they start after the app is ready. The -X importtime profile lists the
+slowest imports. Exits 1 when a target's median boot exceeds --max-seconds
+or a module that must load lazily (LAZY_MODULES) is imported at startup.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use (or by the API's background pre-warm), never at import
+LAZY_MODULES = ("google.generativeai", "reportlab", "supabase", "requests")
+
+_REPORT = f"import json, sys; print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+TARGETS = {
+    "api": (
+        "import asyncio, api\n"
+        "async def boot():\n"
+        "    async with api.lifespan(api.app): pass\n"
+        "asyncio.run(boot())\n" + _REPORT
+    ),
+    "worker": "import worker\n" + _REPORT,
+}
+ENV = {"API_PREWARM": "0", "WARMER_FEEDS": "", "DEPLOYER_REFRESH_INTERVAL": "0", "JOB_INLINE_WORKERS": "0"}
+
+def boot(code):
+    """
+    Returns (seconds, lazy modules that got imported) for one fresh process.
+    """
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", code], cwd=REPO, env={**os.environ, **ENV},
+                         capture_output=True, text=True, check=True)
+    elapsed = time.perf_counter() - start
+    return elapsed, json.loads(out.stdout.strip().splitlines()[-1])
+
+def import_profile(module, top):
+    """
+    The `top` imports with the largest cumulative time: [(ms, self ms, name)].
+    """
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=REPO,
+                         env={**os.environ, **ENV}, capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us) / 1000, int(self_us) / 1000, name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", action="append", choices=list(TARGETS), help="default: all")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=1.0)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list per target")
+    args = parser.parse_args()
+
+    failed = []
+    for target in args.target or TARGETS:
+        boot(TARGETS[target])  # fill the OS page cache and __pycache__
+        runs = [boot(TARGETS[target]) for _ in range(args.runs)]
+        times = sorted(t for t, _ in runs)
+        lazy = sorted({m for _, loaded in runs for m in loaded})
+        median = statistics.median(times)
+        print(f"[{target}] boot median {median * 1000:.0f} ms, min {times[0] * 1000:.0f} ms, max {times[-1] * 1000:.0f} ms ({args.runs} runs)")
+        print(f"  {'cumulative':>10s} {'self':>8s}  import")
+        for cumulative, own, name in import_profile(target, args.top):
+            print(f"  {cumulative:8.1f}ms {own:6.1f}ms  {name}")
+        if median > args.max_seconds:
+            failed.append(f"{target} boots in {median:.2f}s (max {args.max_seconds:.2f}s)")
+        if lazy:
+            failed.append(f"{target} imports {', '.join(lazy)} at startup")
+
+    if failed:
+        sys.exit("Startup regressed: " + "; ".join(failed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Records real upstream responses into a fixture file for stub_upstream.py.
+
+    python benchmarks/record_fixtures.py --out benchmarks/fixtures/recorded.json \\
+        0x6982508145454ce325ddbe47a25d4ec3d2311933 bsc:0x95ad61b0a150d79219dcf64e1e6cc01f0b64c4ce --reports 2
+
+Uses the API's own keys, endpoints and rate limits (.env). --reports also asks
+Gemini for that many reports, which costs real quota. Billing responses are
+never recorded (reserving a credit would charge someone); the built-in ones
+are replayed instead.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from auditor import _etherscan, get_token_pairs, analyze_with_gemini_raw
+from chains import DEFAULT_CHAIN, chain_id, resolve_chain
+from scheduler import upstream_request
+from upstream import DEXSCREENER_API_URL, close_clients
+
+async def record_contract(address, chain):
+    source = (await _etherscan({"module": "contract", "action": "getsourcecode", "address": address}, chain))["result"][0]
+    creation = await _etherscan({"module": "contract", "action": "getcontractcreation", "contractaddresses": address}, chain)
+    creator = creation["result"][0]["contractCreator"] if creation.get("status") == "1" and creation["result"] else None
+    contract = {
+        "address": address.lower(), "chainid": str(chain_id(chain)),
+        "name": source.get("ContractName", ""), "source": source.get("SourceCode", ""),
+        "creator": creator, "pairs": await get_token_pairs(address),
+    }
+    if not contract["source"]:
+        code = await _etherscan({"module": "proxy", "action": "eth_getCode", "address": address, "tag": "latest"}, chain)
+        contract["bytecode"] = code.get("result") or "0x"
+    wallet = None
+    if creator:
+        balance = await _etherscan({"module": "account", "action": "balance", "address": creator, "tag": "latest"}, chain)
+        tx_count = await _etherscan({"module": "proxy", "action": "eth_getTransactionCount", "address": creator, "tag": "latest"}, chain)
+        wallet = {"balance": balance["result"], "tx_count": int(tx_count["result"], 16)}
+    return contract, wallet
+
+async def record(targets, reports, latest):
+    fixtures = {"contracts": [], "wallets": {}}
+    for address, chain in targets:
+        contract, wallet = await record_contract(address, chain)
+        fixtures["contracts"].append(contract)
+        if wallet:
+            fixtures["wallets"][contract["creator"].lower()] = wallet
+        print(f"{address} ({chain}): {contract['name'] or 'unverified'}, {len(contract['source'])} chars, {len(contract['pairs'])} pairs")
+
+    verified = [c for c in fixtures["contracts"] if c["source"]]
+    if reports:
+        fixtures["reports"] = [await analyze_with_gemini_raw(c["name"], c["source"]) for c in verified[:reports]]
+    if latest:
+        fixtures["latest_tokens"] = (await upstream_request("dexscreener", "GET", f"{DEXSCREENER_API_URL}/token-boosts/latest/v1")).json()
+    return fixtures
+
+def parse_target(text):
+    # "0xabc" or "bsc:0xabc"
+    chain, _, address = text.rpartition(":")
+    return address, resolve_chain(chain or DEFAULT_CHAIN)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("targets", nargs="+", type=parse_target, help="address or chain:address")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--reports", type=int, default=0, help="Gemini reports to record (costs quota)")
+    parser.add_argument("--latest", action="store_true", help="also record DexScreener's latest boosted tokens")
+    args = parser.parse_args()
+
+    async def run():
+        try:
+            return await record(args.targets, args.reports, args.latest)
+        finally:
+            await close_clients()
+    fixtures = asyncio.run(run())
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(fixtures, f, indent=1, ensure_ascii=False)
+        f.write("\n")
+    print(f"Wrote {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Local stand-in for Etherscan, DexScreener, Gemini and Supabase.
+
+Every route sleeps for a configurable latency so benchmarks can measure how
+many scans the API keeps in flight without burning real API quota. Responses
+come from a fixture set (see fixtures/ and record_fixtures.py), or from the
+small built-in one below; any address the fixtures don't know is served one
+of the recorded contracts, picked by hashing the address.
+
+    app = build_app(latency={"etherscan": 0.15, "gemini": 2.0}, error_rate={"etherscan": 0.02},
+                    fixtures=load_fixtures("benchmarks/fixtures/sample.json"))
+    app.state.calls  # Counter of upstream calls, e.g. {"etherscan:getsourcecode": 12, "errors:etherscan": 1}
+"""
+import asyncio
+import hashlib
+import json
+import random
+import socket
+import threading
+import time
+from collections import Counter
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+STUB_SOURCE = """// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.20;
+
+contract StubToken {
+    address public owner;
+    mapping(address => bool) public isBot;
+
+    modifier onlyOwner() { require(msg.sender == owner); _; }
+
+    function mint(address to, uint256 amount) external onlyOwner {}
+    function setFee(uint256 fee) external onlyOwner {}
+}
+"""
+
+STUB_REPORT = """### 🕵️‍♂️ DEPLOYER INTEL
+Deployer: 0x00000000000000000000000000000000000000d3
+### 🚨 THREAT DETECTION
+(Owner Privileges)
+Mint: Owner can mint new tokens
+Verdict: CAUTION
+"""
+
+# A shallow pool listed first, the deep one the auditor should pick, and one on BSC
+STUB_PAIRS = [
+    {"chainId": "ethereum", "priceUsd": "0.0040", "liquidity": {"usd": 9000}, "fdv": 4000000, "dexId": "sushiswap", "url": "https://dexscreener.com/ethereum/stub-shallow"},
+    {"chainId": "ethereum", "priceUsd": "0.0042", "liquidity": {"usd": 125000}, "fdv": 4200000, "dexId": "uniswap", "url": "https://dexscreener.com/ethereum/stub"},
+    {"chainId": "bsc", "priceUsd": "0.0041", "liquidity": {"usd": 40000}, "fdv": 4100000, "dexId": "pancakeswap", "url": "https://dexscreener.com/bsc/stub"},
+]
+# Latest boosted/profiled tokens feed (warmer.py); chains we don't scan must be skipped
+STUB_BOOSTS = [
+    {"chainId": "ethereum", "tokenAddress": "0x00000000000000000000000000000000000000b1", "url": "https://dexscreener.com/ethereum/b1"},
+    {"chainId": "bsc", "tokenAddress": "0x00000000000000000000000000000000000000b2", "url": "https://dexscreener.com/bsc/b2"},
+    {"chainId": "solana", "tokenAddress": "So11111111111111111111111111111111111111112", "url": "https://dexscreener.com/solana/so"},
+]
+# Etherscan chain ids where the stub contract is not verified
+UNVERIFIED_CHAINS = {"137"}
+
+def _dispatcher(selectors):
+    # Runtime code shaped like solc's: selector from calldata, then
+    # DUP1 PUSH4 <selector> EQ PUSH2 <dest> JUMPI per function, then metadata
+    code = bytes.fromhex("60003560e01c")
+    for selector in selectors:
+        code += bytes.fromhex(f"8063{selector}1461000057")
+    code += bytes.fromhex("5b00fe") + bytes.fromhex("a1") + b"stub" + bytes.fromhex("0005")
+    return "0x" + code.hex()
+
+# owner(), transfer, balanceOf, mint(address,uint256), setFee(uint256), addBots(address[]), and one unknown
+STUB_BYTECODE = _dispatcher(["8da5cb5b", "a9059cbb", "70a08231", "40c10f19", "69fe0e2d", "d34628cc", "12345678"])
+
+STUB_DEPLOYER = "0x00000000000000000000000000000000000000d3"
+
+# --- 1. FIXTURES ---
+# contracts: getsourcecode results plus the creator and DexScreener pairs of each
+#            (and eth_getCode's "bytecode", "0x" for an address with no code)
+# wallets:   balance (wei) and transaction count per deployer
+# reports:   Gemini answers, one picked per prompt
+# billing:   Supabase RPC results by function name
+DEFAULT_FIXTURES = {
+    "contracts": [{"address": None, "name": "StubToken", "source": STUB_SOURCE, "creator": STUB_DEPLOYER, "pairs": STUB_PAIRS}],
+    "wallets": {STUB_DEPLOYER: {"balance": "2500000000000000000", "tx_count": 42}},
+    "reports": [STUB_REPORT],
+    "billing": {
+        "reserve_scan_credit": [{"allowed": True, "already_scanned": False, "charged": True, "profile_found": True, "credits_left": 9, "scan_id": 1}],
+        "refund_scan_credit": None,
+    },
+    "latest_tokens": STUB_BOOSTS,
+}
+
+def load_fixtures(path=None):
+    """
+    Reads a fixture file written by record_fixtures.py. Sections it leaves out
+    fall back to the built-in ones.
+    """
+    if path is None:
+        return DEFAULT_FIXTURES
+    with open(path, encoding="utf-8") as f:
+        return {**DEFAULT_FIXTURES, **json.load(f)}
+
+def _pick(items, key):
+    return items[int(hashlib.sha256(key.encode()).hexdigest()[:8], 16) % len(items)]
+
+def salt_source(source, address):
+    """
+    Adds an empty contract named after `address`, so every address hashes to
+    its own report (the report store ignores comments and formatting).
+    """
+    salt = f"\ncontract Bench_{address.lower()[2:]} {{}}\n"
+    text = source.strip()
+    wrapped = text.startswith("{{") and text.endswith("}}")
+    if text.startswith("{"):
+        try:
+            data = json.loads(text[1:-1] if wrapped else text)
+        except ValueError:
+            return source + salt
+        files = data.get("sources", data)
+        files["Bench.sol"] = {"content": salt}
+        return "{" + json.dumps(data) + "}" if wrapped else json.dumps(data)
+    return source + salt
+
+def _as_map(value, default):
+    # 0.1 -> {provider: 0.1 for all}; {"gemini": 2} -> just that provider
+    if isinstance(value, dict):
+        return lambda provider: value.get(provider, default)
+    return lambda provider: value
+
+# --- 2. APP ---
+def build_app(latency=0.05, error_rate=0.0, jitter=0.0, fixtures=None, salt_sources=False, seed=0):
+    """
+    `latency` and `error_rate` are a number or a {provider: value} map.
+    `jitter` spreads each sleep uniformly by +/- that fraction. Injected errors
+    look like the real thing: Etherscan's HTTP 200 "Max rate limit reached",
+    429 from DexScreener, 503 from Gemini and Supabase.
+    """
+    fixtures = fixtures or DEFAULT_FIXTURES
+    contracts = {c["address"].lower(): c for c in fixtures["contracts"] if c.get("address")}
+    verified = [c for c in fixtures["contracts"] if c.get("source")] or DEFAULT_FIXTURES["contracts"]
+    wallets = {a.lower(): w for a, w in fixtures["wallets"].items()}
+    default_wallet = next(iter(wallets.values()), DEFAULT_FIXTURES["wallets"][STUB_DEPLOYER])
+    rng = random.Random(seed)
+
+    app = FastAPI()
+    app.state.latency = latency
+    app.state.error_rate = error_rate
+    app.state.calls = Counter()
+
+    async def upstream(provider, call):
+        # Counts the call, sleeps, and returns an injected error response or None
+        app.state.calls[f"{provider}:{call}"] += 1
+        delay = _as_map(app.state.latency, 0.0)(provider)
+        if jitter:
+            delay *= 1 + rng.uniform(-jitter, jitter)
+        await asyncio.sleep(max(0.0, delay))
+        if rng.random() >= _as_map(app.state.error_rate, 0.0)(provider):
+            return None
+        app.state.calls[f"errors:{provider}"] += 1
+        if provider == "etherscan":
+            return JSONResponse({"status": "0", "message": "NOTOK", "result": "Max rate limit reached"})
+        return JSONResponse({"error": "injected"}, status_code=429 if provider == "dexscreener" else 503)
+
+    def contract_for(address):
+        return contracts.get(address.lower()) or _pick(verified, address.lower())
+
+    def source_for(address):
+        contract = contract_for(address)
+        source = contract.get("source") or ""
+        return contract.get("name") or "", salt_source(source, address) if source and salt_sources else source
+
+    def creator_for(address):
+        return contract_for(address).get("creator") or STUB_DEPLOYER
+
+    def wallet(address):
+        return wallets.get(address.lower(), default_wallet)
+
+    @app.get("/v2/api")
+    async def etherscan(action: str = "", contractaddresses: str = "", address: str = "", chainid: str = "1"):
+        error = await upstream("etherscan", action)
+        if error:
+            return error
+        if action == "getsourcecode" and chainid in UNVERIFIED_CHAINS:
+            return {"status": "1", "result": [{"ContractName": "", "SourceCode": ""}]}
+        if action == "getsourcecode":
+            name, source = source_for(address)
+            return {"status": "1", "result": [{"ContractName": name, "SourceCode": source}]}
+        if action == "getcontractcreation":
+            return {"status": "1", "result": [
+                {"contractAddress": a, "contractCreator": creator_for(a)} for a in contractaddresses.split(",")
+            ]}
+        if action == "balance":
+            return {"status": "1", "result": wallet(address)["balance"]}
+        if action == "balancemulti":
+            return {"status": "1", "result": [{"account": a, "balance": wallet(a)["balance"]} for a in address.split(",")]}
+        if action == "eth_getCode":
+            contract = contract_for(address)
+            code = contract.get("bytecode") or (STUB_BYTECODE if contract.get("source") or chainid in UNVERIFIED_CHAINS else "0x")
+            return {"jsonrpc": "2.0", "id": 1, "result": code}
+        if action == "eth_getTransactionCount":
+            return {"jsonrpc": "2.0", "id": 1, "result": hex(wallet(address)["tx_count"])}
+        return {"status": "0", "result": f"Unknown action {action}"}
+
+    @app.get("/latest/dex/tokens/{addresses}")
+    async def dexscreener(addresses: str):
+        error = await upstream("dexscreener", "tokens")
+        if error:
+            return error
+        return {"pairs": [
+            {**pair, "baseToken": {"address": a}}
+            for a in addresses.split(",") for pair in contract_for(a).get("pairs", [])
+        ]}
+
+    @app.get("/token-boosts/latest/v1")
+    @app.get("/token-profiles/latest/v1")
+    async def dexscreener_latest():
+        return await upstream("dexscreener", "latest") or fixtures["latest_tokens"]
+
+    @app.post("/v1beta/models/{model_action}")
+    async def gemini(model_action: str, request: Request):
+        body = await request.body()
+        model, _, method = model_action.partition(":")
+        error = await upstream("gemini", method)
+        if error:
+            return error
+        report = _pick(fixtures["reports"], body.decode(errors="replace"))
+        if method == "streamGenerateContent":
+            return StreamingResponse(_sse_report(report, _as_map(app.state.latency, 0.0)("gemini")), media_type="text/event-stream")
+        return {"candidates": [{"content": {"parts": [{"text": report}]}}]}
+
+    @app.post("/rest/v1/rpc/{function}")
+    async def supabase_rpc(function: str, request: Request):
+        await request.body()
+        error = await upstream("supabase", function)
+        if error:
+            return error
+        return fixtures["billing"].get(function)
+
+    return app
+
+async def _sse_report(report, latency):
+    # Gemini's alt=sse format, one line of the report per event, spread over `latency`
+    lines = report.splitlines(keepends=True)
+    for line in lines:
+        chunk = {"candidates": [{"content": {"parts": [{"text": line}], "role": "model"}}]}
+        yield f"data: {json.dumps(chunk)}\r\n\r\n"
+        await asyncio.sleep(latency / max(1, len(lines)))
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class StubServer:
+    """
+    Runs the stub app on a background thread. Use as a context manager.
+    """
+    def __init__(self, app, port=None):
+        self.port = port or _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning", backlog=4096)
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
@@ -0,0 +1,79 @@
+import functools
+import os
+from dotenv import load_dotenv
+from starlette.exceptions import HTTPException  # what fastapi.HTTPException extends; keeps FastAPI out of the worker
+from starlette.concurrency import run_in_threadpool
+from cache import SCAN_CACHE
+from metrics import span
+
+load_dotenv()
+
+# SUPABASE (Must be Service Role Key to Edit Data)
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+
+@functools.cache
+def get_supabase():
+    """
+    The Supabase client, built on first use: the SDK takes most of a second
+    to import, and free-tier scans never bill. The API builds it in the
+    background at startup (see api.lifespan).
+    """
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise ValueError("Missing Supabase credentials. Check your .env file.")
+    from supabase import create_client
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
+
+# Pro scan credits, shared by the API (reserve) and the scan workers (settle / refund)
+
+def billed_address(address, chain):
+    # user_scans predates multi-chain: Ethereum rows keep the bare address,
+    # other chains are recorded as "<chain>:<address>"
+    return address if chain == "ethereum" else f"{chain}:{address}"
+
+async def reserve_credit(user_id, address, chain, has_license=False):
+    """
+    Check-and-deduct in one atomic round trip (reserve_scan_credit in
+    sql/scan_billing.sql). Returns the reservation; raises 401/402 like before.
+    Users re-scanning a contract they already paid for skip the round trip
+    once this process has seen the scan (here, or settled by an inline worker).
+    """
+    # 1. AUTH CHECK
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Please sign in first.")
+
+    # 2. CHECK HISTORY (Don't charge for re-scans)
+    history_key = f"{user_id}:{billed_address(address, chain)}"
+    if SCAN_CACHE.get("history", history_key):
+        return {"allowed": True, "already_scanned": True, "charged": False, "credits_left": None, "scan_id": None}
+
+    # 3. CHECK + DEDUCT CREDITS ATOMICALLY
+    # Supabase client is sync, so keep it off the event loop
+    params = {"p_user_id": user_id, "p_contract_address": billed_address(address, chain), "p_has_license": bool(has_license)}
+    with span("supabase.reserve_scan_credit"):
+        result = await run_in_threadpool(lambda: get_supabase().rpc("reserve_scan_credit", params).execute())
+    reservation = result.data[0]
+
+    if not reservation["allowed"]:
+        if not reservation["profile_found"]:
+            raise HTTPException(status_code=401, detail="User profile not found")
+        # 🚨 HARD STOP IF CREDITS ARE 0 OR LESS (a license key lets them pass)
+        raise HTTPException(status_code=402, detail="Out of credits.")
+    if reservation["already_scanned"]:
+        # Filled here rather than only on settle, which runs in the job
+        # worker's process (and cache, unless SCAN_CACHE_DB is shared)
+        SCAN_CACHE.set("history", history_key, True)
+    return reservation
+
+async def refund_credit(user_id, address, chain, reservation):
+    # The scan failed: give the credit back and forget the scan, so the
+    # next attempt is billed normally (re-scans were never charged). Only
+    # the user_scans row this reservation created is touched.
+    if reservation.get("scan_id") is not None:
+        params = {"p_user_id": user_id, "p_scan_id": reservation["scan_id"], "p_charged": reservation["charged"]}
+        with span("supabase.refund_scan_credit"):
+            await run_in_threadpool(lambda: get_supabase().rpc("refund_scan_credit", params).execute())
+
+def settle_credit(user_id, address, chain, reservation):
+    SCAN_CACHE.set("history", f"{user_id}:{billed_address(address, chain)}", True)
+    return {"credits_used": int(reservation["charged"]), "credits_remaining": reservation["credits_left"]}
@@ -0,0 +1,250 @@
+"""
+Offline bulk audit: Pro scans of every address in a file, without the API
+or billing, resumable after an interruption.
+
+    python bulk_audit.py tokens.txt --out audits.jsonl --parquet audits.parquet --pdf-dir pdfs/
+
+One address per line, optionally followed by a chain name or id ("0xabc..."
+or "0xabc... bsc"); lines starting with # are skipped. Up to --concurrency
+scans wait on Etherscan, DexScreener and Gemini at once in this process, so
+they share one set of rate limits; the CPU-bound steps of every scan (rules,
+source ingest and MinHash, report parsing and scoring) and PDF rendering
+run on a pool of --processes worker processes.
+
+Every finished scan is appended to --out as one JSON line (the run_pro_scan
+result plus "address"), which is also the checkpoint: run the same command
+again and addresses already there are skipped. Failed scans are written
+with an "error" and retried by the next run, except contracts that don't
+exist. The file can be re-scored offline (scoring.py rescore). --parquet
+exports it once the run is done (needs pandas and pyarrow).
+
+Set SCAN_CACHE_DB and REPORT_STORE_DB so a resumed run also reuses the
+sources and AI reports of scans that were in flight when it stopped.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import re
+import signal
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from chains import DEFAULT_CHAIN, UnknownChain, resolve_chain
+from pipeline import ContractNotFound, run_pro_scan
+from upstream import close_clients
+
+load_dotenv()
+
+# --- CONFIGURATION ---
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "16"))
+PROGRESS_EVERY = 100
+ADDRESS_RE = re.compile(r"^0x[0-9a-fA-F]{40}$")
+NOT_FOUND = "Contract not found"
+
+# --- 1. INPUT AND CHECKPOINT ---
+def read_targets(path, default_chain=DEFAULT_CHAIN):
+    """
+    Unique (address, chain) pairs in file order. Malformed lines are logged and skipped.
+    """
+    targets = {}
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            parts = line.replace(",", " ").split()
+            if not parts or parts[0].startswith("#"):
+                continue
+            try:
+                chain = resolve_chain(parts[1] if len(parts) > 1 else default_chain)
+            except UnknownChain as e:
+                logging.warning(f"{path}:{number}: {e}")
+                continue
+            if not ADDRESS_RE.match(parts[0]):
+                logging.warning(f"{path}:{number}: not an address: {parts[0]}")
+                continue
+            targets.setdefault((parts[0].lower(), chain), parts[0])
+    return [(address, chain) for (_, chain), address in targets.items()]
+
+def read_results(path):
+    """
+    Yields the rows already in the output file, skipping unreadable lines.
+    """
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        return
+
+def _key(row):
+    return row["address"].lower(), row["chain"]
+
+def is_done(row):
+    return "error" not in row or row["error"] == NOT_FOUND
+
+def _outcome(row):
+    if "error" not in row:
+        return row["risk_level"]
+    return "not_found" if row["error"] == NOT_FOUND else "failed"
+
+def _drop_partial_line(path):
+    # A run killed mid-write leaves half a line at the end; cut it off
+    try:
+        f = open(path, "rb+")
+    except FileNotFoundError:
+        return
+    with f:
+        pos = f.seek(0, os.SEEK_END)
+        while pos > 0:
+            start = max(0, pos - 65536)
+            f.seek(start)
+            newline = f.read(pos - start).rfind(b"\n")
+            if newline >= 0:
+                f.truncate(start + newline + 1)
+                return
+            pos = start
+        f.truncate(0)
+
+# --- 2. WORKER PROCESSES ---
+def _render_pdf(audit_data, path):
+    from pdf_generator import render_audit_pdf
+    with open(path, "wb") as f:
+        f.write(render_audit_pdf(audit_data))
+    return path
+
+def pdf_payload(address, scan):
+    # What the UI posts to /generate-pdf for a scan result
+    return {"name": scan["name"], "address": address, "report": scan["report"], "report_ir": scan["report_ir"],
+            "verdict": scan["risk_level"], "market": scan["market"], "score": scan["score"], "score_reasons": scan["score_reasons"]}
+
+# --- 3. BULK RUN ---
+class BulkAudit:
+    def __init__(self, out, processes=None, concurrency=BULK_CONCURRENCY, pdf_dir=None):
+        self.out = out
+        self.concurrency = concurrency
+        self.pdf_dir = pdf_dir
+        # spawn: forking a process with live threads and sockets is not safe
+        self.pool = ProcessPoolExecutor(processes or os.cpu_count(), mp_context=multiprocessing.get_context("spawn"))
+        self.stats = Counter()
+
+    async def audit(self, address, chain):
+        """
+        One Pro scan, as the row written to the output file.
+        """
+        try:
+            scan = await run_pro_scan(address, chain, pool=self.pool)
+        except ContractNotFound:
+            return {"address": address, "chain": chain, "error": NOT_FOUND}
+        except Exception as e:
+            return {"address": address, "chain": chain, "error": str(e) or type(e).__name__}
+        row = {"address": address, **scan, "audited_at": time.time()}
+        if self.pdf_dir:
+            path = os.path.join(self.pdf_dir, f"{chain}_{address.lower()}.pdf")
+            row["pdf"] = await asyncio.get_running_loop().run_in_executor(self.pool, _render_pdf, pdf_payload(address, scan), path)
+        return row
+
+    async def run(self, targets, stop=None):
+        """
+        Audits `targets` not yet in the output file. Once `stop` is set, no
+        new scans start and the running ones finish.
+        """
+        stop = stop or asyncio.Event()
+        _drop_partial_line(self.out)
+        latest = {_key(row): is_done(row) for row in read_results(self.out)}
+        done = {key for key, finished in latest.items() if finished}
+        todo = [(address, chain) for address, chain in targets if (address.lower(), chain) not in done]
+        logging.info(f"{len(targets)} addresses, {len(targets) - len(todo)} already audited, {len(todo)} to go")
+        if self.pdf_dir:
+            os.makedirs(self.pdf_dir, exist_ok=True)
+        queue = asyncio.Queue()
+        for target in todo:
+            queue.put_nowait(target)
+        start = time.monotonic()
+
+        async def work(out):
+            while not stop.is_set() and not queue.empty():
+                row = await self.audit(*queue.get_nowait())
+                out.write(json.dumps(row, default=str) + "\n")
+                out.flush()
+                self.stats[_outcome(row)] += 1
+                finished = sum(self.stats.values())
+                if finished % PROGRESS_EVERY == 0:
+                    rate = finished / (time.monotonic() - start)
+                    logging.info(f"{finished}/{len(todo)} audited ({rate:.1f}/s, ~{(len(todo) - finished) / rate / 60:.0f} min left) {dict(self.stats)}")
+
+        with open(self.out, "a") as out:
+            await asyncio.gather(*(work(out) for _ in range(self.concurrency)))
+        return dict(self.stats)
+
+    def shutdown(self):
+        self.pool.shutdown(cancel_futures=True)
+
+# --- 4. PARQUET EXPORT ---
+def export_parquet(jsonl_path, parquet_path):
+    """
+    Writes the latest row per address to Parquet: scalars as columns, every
+    feature as a feature_<name> column, other nested values as JSON strings.
+    """
+    try:
+        import pandas as pd
+        import pyarrow  # noqa: F401 (pandas' Parquet engine)
+    except ImportError:
+        raise SystemExit('--parquet needs pandas and pyarrow: pip install pandas pyarrow')
+    latest = {_key(row): row for row in read_results(jsonl_path)}
+    rows = []
+    for row in latest.values():
+        for name, value in (row.pop("features", None) or {}).items():
+            row[f"feature_{name}"] = value
+        rows.append({k: json.dumps(v, default=str) if isinstance(v, (dict, list)) else v for k, v in row.items()})
+    pd.DataFrame(rows).to_parquet(parquet_path, index=False)
+    return len(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="file of addresses, one per line (optionally followed by a chain)")
+    parser.add_argument("--out", required=True, help="JSONL results; also the checkpoint to resume from")
+    parser.add_argument("--chain", default=DEFAULT_CHAIN, help="chain for lines that don't name one")
+    parser.add_argument("--parquet", help="also export the results to this Parquet file when done")
+    parser.add_argument("--pdf-dir", help="render a PDF report per audited contract into this directory")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="worker processes for scan CPU work and PDFs")
+    parser.add_argument("--concurrency", type=int, default=BULK_CONCURRENCY, help="scans in flight")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per upstream call otherwise
+
+    try:
+        targets = read_targets(args.input, resolve_chain(args.chain))
+    except (OSError, UnknownChain) as e:
+        parser.error(str(e))
+    bulk = BulkAudit(args.out, args.processes, args.concurrency, args.pdf_dir)
+
+    async def run():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        def graceful_stop():
+            # Finish the running scans and exit; a second Ctrl+C interrupts them
+            logging.info("Stopping after the running scans...")
+            stop.set()
+            loop.remove_signal_handler(signal.SIGINT)
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, graceful_stop)
+        try:
+            return await bulk.run(targets, stop), stop.is_set()
+        finally:
+            await close_clients()
+
+    try:
+        stats, stopped = asyncio.run(run())
+    finally:
+        bulk.shutdown()
+    logging.info(f"{'Stopped' if stopped else 'Done'}: {stats}")
+    if args.parquet and not stopped:
+        logging.info(f"Wrote {export_parquet(args.out, args.parquet)} rows to {args.parquet}")
+
+if __name__ == "__main__":
+    main()
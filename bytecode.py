@@ -0,0 +1,372 @@
+"""
+Static analysis of unverified contracts from their runtime bytecode.
+
+Etherscan has no source for many of the riskiest tokens, but the compiled
+dispatcher still lists every external function by its 4-byte selector.
+analyze_bytecode() walks the code once, collects those selectors and the
+opcodes worth flagging, resolves the selectors to function signatures, and
+runs the function names through the same rule classifier as verified source
+(rules.py). No LLM call, a few milliseconds per contract.
+
+Selectors are resolved against a selector database: a flat open-addressing
+hash table that is memory-mapped, so even a multi-million-entry dump (e.g.
+4byte.directory) loads instantly and costs a slot read or two per lookup:
+
+    python bytecode.py build-db signatures.txt --out selectors.db
+    python bytecode.py lookup 0x40c10f19
+    SELECTOR_DB=selectors.db
+
+Without SELECTOR_DB the built-in SIGNATURES are used.
+"""
+import argparse
+import functools
+import mmap
+import os
+import struct
+import sys
+from dotenv import load_dotenv
+from metrics import traced
+from rules import RULES, classify_identifier, flags_from_findings
+
+load_dotenv()
+
+SELECTOR_DB = os.getenv("SELECTOR_DB")
+
+# Functions rug pulls are built from, plus the ERC-20/Ownable basics so a
+# normal token resolves too. Earlier entries win a selector collision.
+SIGNATURES = [
+    "name()", "symbol()", "decimals()", "totalSupply()", "balanceOf(address)",
+    "transfer(address,uint256)", "transferFrom(address,address,uint256)", "approve(address,uint256)",
+    "allowance(address,address)", "increaseAllowance(address,uint256)", "decreaseAllowance(address,uint256)",
+    "owner()", "getOwner()", "renounceOwnership()", "transferOwnership(address)",
+    "mint(address,uint256)", "mint(uint256)", "mintTo(address,uint256)", "mintTokens(address,uint256)",
+    "burn(uint256)", "burnFrom(address,uint256)",
+    "pause()", "unpause()", "paused()", "openTrading()", "enableTrading()", "setTradingEnabled(bool)", "tradingOpen()",
+    "blacklist(address)", "blacklist(address,bool)", "addToBlacklist(address)", "removeFromBlacklist(address)",
+    "setBlacklist(address,bool)", "isBlacklisted(address)", "blacklistAddress(address,bool)",
+    "addBot(address)", "addBots(address[])", "delBot(address)", "delBots(address[])", "setBots(address[])", "isBot(address)",
+    "setFee(uint256)", "setFees(uint256,uint256)", "setTaxFee(uint256)", "setTaxFeePercent(uint256)",
+    "setBuyFee(uint256)", "setSellFee(uint256)", "setBuyTax(uint256)", "setSellTax(uint256)",
+    "updateFees(uint256,uint256)", "setMarketingFee(uint256)",
+    "setMaxTxAmount(uint256)", "setMaxWalletSize(uint256)", "removeLimits()", "excludeFromFee(address)",
+    "setSwapAndLiquifyEnabled(bool)", "manualSwap()", "manualSend()",
+    "upgradeTo(address)", "upgradeToAndCall(address,bytes)", "implementation()",
+]
+
+# Function names the rules can't see in bytecode (`onlyOwner` is a modifier,
+# compiled away), mapped to the rule they stand for
+NAME_RULES = {"owner": "centralized_control", "getowner": "centralized_control", "transferownership": "centralized_control"}
+UPGRADE_FUNCTIONS = {"upgradeto", "upgradetoandcall"}
+
+# --- 1. KECCAK-256 ---
+# Ethereum's Keccak (original padding, not NIST SHA3-256, so not hashlib.sha3_256).
+# Pure Python is fine: it only hashes signatures while a database is built.
+_RATE = 136
+_MASK = (1 << 64) - 1
+_ROUND_CONSTANTS = [
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808A, 0x8000000080008000,
+    0x000000000000808B, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008A, 0x0000000000000088, 0x0000000080008009, 0x000000008000000A,
+    0x000000008000808B, 0x800000000000008B, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800A, 0x800000008000000A,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008,
+]
+# Rotation of lane (x, y), indexed [x][y]
+_ROTATIONS = [[0, 36, 3, 41, 18], [1, 44, 10, 45, 2], [62, 6, 43, 15, 61], [28, 55, 25, 21, 56], [27, 20, 39, 8, 14]]
+# (source lane, destination lane, rotation) for the combined rho and pi steps
+_RHO_PI = [(x + 5 * y, y + 5 * ((2 * x + 3 * y) % 5), _ROTATIONS[x][y]) for x in range(5) for y in range(5)]
+
+def _rotl(lane, n):
+    return ((lane << n) | (lane >> (64 - n))) & _MASK if n else lane
+
+def _keccak_f(state):
+    for rc in _ROUND_CONSTANTS:
+        c = [state[x] ^ state[x + 5] ^ state[x + 10] ^ state[x + 15] ^ state[x + 20] for x in range(5)]
+        d = [c[(x - 1) % 5] ^ _rotl(c[(x + 1) % 5], 1) for x in range(5)]
+        b = [0] * 25
+        for src, dst, rot in _RHO_PI:
+            b[dst] = _rotl(state[src] ^ d[src % 5], rot)
+        for y in range(0, 25, 5):
+            row = b[y:y + 5]
+            for x in range(5):
+                state[y + x] = row[x] ^ (~row[(x + 1) % 5] & row[(x + 2) % 5])
+        state[0] ^= rc
+
+def keccak256(data):
+    padded = bytearray(data) + b"\x01" + bytes(-(len(data) + 1) % _RATE)
+    padded[-1] |= 0x80
+    state = [0] * 25
+    for block in range(0, len(padded), _RATE):
+        for i in range(_RATE // 8):
+            state[i] ^= int.from_bytes(padded[block + 8 * i:block + 8 * i + 8], "little")
+        _keccak_f(state)
+    return b"".join(lane.to_bytes(8, "little") for lane in state[:4])
+
+def selector(signature):
+    """
+    "mint(address,uint256)" -> 0x40c10f19, as an int.
+    """
+    return int.from_bytes(keccak256(signature.replace(" ", "").encode())[:4], "big")
+
+# --- 2. SELECTOR DATABASE ---
+# Header, then a power-of-two array of (selector, string offset) slots at most
+# half full, then the signature strings. Offset 0 marks an empty slot.
+_MAGIC = b"W3SELDB1"
+_HEADER = struct.Struct("<8sII")  # magic, slot count, selector count
+_SLOT = struct.Struct("<II")
+_LENGTH = struct.Struct("<H")
+MAX_SIGNATURES_PER_SELECTOR = 8
+
+def build_selector_db(entries):
+    """
+    Serializes (selector, signature) pairs into a database image. The first
+    signature seen for a selector is the one lookups prefer.
+    """
+    by_selector = {}
+    for sel, signature in entries:
+        names = by_selector.setdefault(sel, [])
+        if signature not in names and len(names) < MAX_SIGNATURES_PER_SELECTOR:
+            names.append(signature)
+
+    slots = 1 << max(4, (2 * len(by_selector)).bit_length())
+    mask = slots - 1
+    table = bytearray(slots * _SLOT.size)
+    strings = bytearray()
+    strings_start = _HEADER.size + len(table)
+    for sel, names in by_selector.items():
+        i = sel & mask
+        while _SLOT.unpack_from(table, i * _SLOT.size)[1]:
+            i = (i + 1) & mask
+        _SLOT.pack_into(table, i * _SLOT.size, sel, strings_start + len(strings))
+        text = ";".join(names).encode()[:0xFFFF]
+        strings += _LENGTH.pack(len(text)) + text
+    return _HEADER.pack(_MAGIC, slots, len(by_selector)) + bytes(table) + bytes(strings)
+
+class SelectorDB:
+    """
+    Read-only view of a build_selector_db() image, in memory or memory-mapped.
+    """
+    def __init__(self, buf):
+        magic, self.slots, self.count = _HEADER.unpack_from(buf)
+        if magic != _MAGIC:
+            raise ValueError("not a selector database")
+        self._buf = buf
+        self._mask = self.slots - 1
+
+    @classmethod
+    def open(cls, path):
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def lookup(self, sel):
+        """
+        Signatures known for a selector, preferred first; () if unknown.
+        """
+        i = sel & self._mask
+        while True:
+            found, offset = _SLOT.unpack_from(self._buf, _HEADER.size + i * _SLOT.size)
+            if not offset:
+                return ()
+            if found == sel:
+                (length,) = _LENGTH.unpack_from(self._buf, offset)
+                return tuple(self._buf[offset + _LENGTH.size:offset + _LENGTH.size + length].decode().split(";"))
+            i = (i + 1) & self._mask
+
+def _builtin_entries():
+    return [(selector(signature), signature) for signature in SIGNATURES]
+
+@functools.cache
+def get_selector_db():
+    # Built-ins hash in a few milliseconds, on first use rather than at import
+    if SELECTOR_DB:
+        return SelectorDB.open(SELECTOR_DB)
+    return SelectorDB(build_selector_db(_builtin_entries()))
+
+def read_signature_file(path):
+    """
+    One signature per line, optionally after its selector ("0x40c10f19 mint(address,uint256)"
+    or "40c10f19,mint(address,uint256)"); a given selector saves hashing millions of lines.
+    """
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            head, _, tail = line.strip().replace(",", " ", 1).partition(" ")
+            if "(" in head or not tail:
+                signature, sel = line.strip(), None
+            else:
+                signature, sel = tail.strip(), head.lower().removeprefix("0x")
+            if "(" not in signature or signature.startswith("#"):
+                continue
+            try:
+                yield (int(sel, 16) if sel else selector(signature)), signature
+            except ValueError:
+                continue
+
+# --- 3. DISASSEMBLY ---
+PUSH1, PUSH4, PUSH32 = 0x60, 0x63, 0x7F
+DUP1, DUP16 = 0x80, 0x8F
+EQ, XOR = 0x14, 0x18
+FLAGGED_OPCODES = {0xF4: "DELEGATECALL", 0xF2: "CALLCODE", 0xFF: "SELFDESTRUCT"}
+# EIP-1167 minimal proxy: everything is delegated to the address in the middle
+_EIP1167_PREFIX = bytes.fromhex("363d3d373d3d3d363d73")
+_EIP1167_SUFFIX = bytes.fromhex("5af43d82803e903d91602b57fd5bf3")
+
+def _strip_metadata(code):
+    # solc appends CBOR metadata plus its 2-byte length; walked as opcodes it
+    # would produce phantom SELFDESTRUCTs and jumps
+    if len(code) >= 2:
+        length = int.from_bytes(code[-2:], "big")
+        if length + 2 <= len(code) and 0xA1 <= code[-2 - length] <= 0xA5:
+            return code[:-2 - length]
+    return code
+
+def scan_dispatcher(code):
+    """
+    One pass over runtime code. Returns (selectors in dispatch order, flagged
+    opcode names). A selector is a PUSH4 compared with EQ (solc), optionally
+    after a DUP (solc via-IR), or XOR (Vyper); PUSH4s feeding the binary-search
+    GT/LT splits of large dispatchers are not selectors.
+    """
+    code = _strip_metadata(code)
+    selectors = []
+    opcodes = set()
+    n = len(code)
+    i = 0
+    while i < n:
+        op = code[i]
+        if op == PUSH4 and i + 5 < n:
+            j = i + 5
+            if DUP1 <= code[j] <= DUP16 and j + 1 < n:
+                j += 1
+            if code[j] in (EQ, XOR):
+                selectors.append(int.from_bytes(code[i + 1:i + 5], "big"))
+        elif op in FLAGGED_OPCODES:
+            opcodes.add(FLAGGED_OPCODES[op])
+        i += op - PUSH1 + 2 if PUSH1 <= op <= PUSH32 else 1
+    return list(dict.fromkeys(selectors)), sorted(opcodes)
+
+# --- 4. ANALYSIS ---
+_RULES_BY_ID = {rule["id"]: rule for rule in RULES}
+
+def _function_rules(signature):
+    name = signature.partition("(")[0]
+    rules = list(classify_identifier(name))
+    extra = NAME_RULES.get(name.lower().lstrip("_"))
+    if extra and _RULES_BY_ID[extra] not in rules:
+        rules.append(_RULES_BY_ID[extra])
+    return rules
+
+@traced()
+def analyze_bytecode(code_hex, db=None):
+    """
+    Runtime code (hex, as eth_getCode returns it) ->
+        {"size": bytes, "selectors": [{"selector": "0x40c10f19", "signature": "mint(address,uint256)" | None}],
+         "opcodes": ["DELEGATECALL", ...], "proxy": None | {"kind": ..., "implementation": ...},
+         "findings": [{"rule", "severity", "path": None, "line": None, "match": signature, "selector"}]}
+    Findings have the shape rules.run_rules returns, so flags and scoring treat them alike.
+    """
+    db = db or get_selector_db()
+    code = bytes.fromhex(code_hex.removeprefix("0x"))
+    if code.startswith(_EIP1167_PREFIX) and code[30:].startswith(_EIP1167_SUFFIX):
+        implementation = "0x" + code[10:30].hex()
+        return {"size": len(code), "selectors": [], "opcodes": ["DELEGATECALL"],
+                "proxy": {"kind": "eip1167", "implementation": implementation}, "findings": []}
+
+    selectors, opcodes = scan_dispatcher(code)
+    resolved = []
+    findings = []
+    upgradeable = False
+    for sel in selectors:
+        signatures = db.lookup(sel)
+        signature = signatures[0] if signatures else None
+        resolved.append({"selector": f"0x{sel:08x}", "signature": signature})
+        if signature is None:
+            continue
+        upgradeable = upgradeable or signature.partition("(")[0].lower() in UPGRADE_FUNCTIONS
+        for rule in _function_rules(signature):
+            findings.append({"rule": rule["id"], "severity": rule["severity"], "path": None, "line": None,
+                             "match": signature, "selector": f"0x{sel:08x}"})
+
+    proxy = None
+    if upgradeable:
+        proxy = {"kind": "upgradeable", "implementation": None}
+    elif "DELEGATECALL" in opcodes and len(selectors) <= 4:
+        # Almost no functions of its own, delegates the rest: a proxy of some kind
+        proxy = {"kind": "delegating", "implementation": None}
+    return {"size": len(code), "selectors": resolved, "opcodes": opcodes, "proxy": proxy, "findings": findings}
+
+BYTECODE_FLAGS = {
+    "unverified": "🔒 **Unverified Source:** Judged from bytecode only; the code can't be reviewed.",
+    "proxy": "🔀 **Proxy:** The logic lives in another contract and can be swapped.",
+    "selfdestruct": "💣 **Self-Destruct:** The contract can delete itself.",
+}
+
+def bytecode_flags(analysis):
+    """
+    basic_security_check() flags for an unverified contract.
+    """
+    flags = [BYTECODE_FLAGS["unverified"]]
+    if analysis["proxy"]:
+        flags.append(BYTECODE_FLAGS["proxy"])
+    if "SELFDESTRUCT" in analysis["opcodes"]:
+        flags.append(BYTECODE_FLAGS["selfdestruct"])
+    return flags + flags_from_findings(analysis["findings"])
+
+def bytecode_report(analysis):
+    """
+    Stands in for the AI report on an unverified contract, in the same
+    section layout so the API response and the PDF render it alike.
+    """
+    named = [s["signature"] for s in analysis["selectors"] if s["signature"]]
+    lines = [
+        "### 🧠 SMART CONTRACT INTELLIGENCE",
+        "(Bytecode Analysis)",
+        "Source: Not verified on the explorer",
+        f"Code Size: {analysis['size']} bytes",
+        f"Functions: {len(analysis['selectors'])} ({len(named)} identified)",
+    ]
+    if analysis["proxy"]:
+        implementation = analysis["proxy"]["implementation"]
+        lines.append(f"Proxy: {analysis['proxy']['kind']}" + (f" to {implementation}" if implementation else ""))
+    if analysis["opcodes"]:
+        lines.append(f"Opcodes: {', '.join(analysis['opcodes'])}")
+    lines += ["### 🚨 THREAT DETECTION", "(Owner Privileges)"]
+    by_rule = {}
+    for finding in analysis["findings"]:
+        by_rule.setdefault(finding["rule"], []).append(finding["match"].partition("(")[0])
+    if by_rule:
+        lines += [f"{rule_id.replace('_', ' ').title()}: {', '.join(dict.fromkeys(names))}" for rule_id, names in by_rule.items()]
+    else:
+        lines.append("- No known privileged functions among the identified selectors.")
+    if named:
+        lines += ["(Identified Functions)", *(f"- {signature}" for signature in named)]
+    return "\n".join(lines) + "\n"
+
+# --- 5. CLI ---
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    cmd = commands.add_parser("build-db", help="write a selector database (built-in signatures always included)")
+    cmd.add_argument("paths", nargs="*", help="signature files, one per line")
+    cmd.add_argument("--out", required=True)
+    cmd = commands.add_parser("lookup", help="resolve selectors against SELECTOR_DB (or the built-ins)")
+    cmd.add_argument("selectors", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "build-db":
+        entries = _builtin_entries()
+        try:
+            for path in args.paths:
+                entries.extend(read_signature_file(path))
+        except OSError as e:
+            sys.exit(f"build-db failed: {e}")
+        image = build_selector_db(entries)
+        with open(args.out, "wb") as f:
+            f.write(image)
+        print(f"Wrote {args.out}: {SelectorDB(image).count} selectors, {len(image) / 1e6:.1f} MB")
+    else:
+        db = get_selector_db()
+        for text in args.selectors:
+            print(f"0x{int(text, 16):08x}  {', '.join(db.lookup(int(text, 16))) or '?'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+from metrics import REGISTRY
+
+load_dotenv()
+
+# --- TTL PER DATA CLASS (seconds, None = never expires) ---
+CACHE_TTLS = {
+    "source": None,  # verified source code is immutable
+    "creator": None,  # so is the contract creation record
+    "bytecode": None,  # and deployed runtime code
+    "findings": None,  # rule findings for that source, keyed by rule set version
+    "deployer": float(os.getenv("CACHE_TTL_DEPLOYER", "300")),
+    "market": float(os.getenv("CACHE_TTL_MARKET", "15")),
+    "history": float(os.getenv("CACHE_TTL_HISTORY", "60")),  # user already paid for this contract
+}
+
+# --- 1. IN-MEMORY TIER (LRU) ---
+class MemoryCache:
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self, prefix=""):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+# --- 2. ON-DISK TIER (SQLite, shared across workers) ---
+class SQLiteCache:
+    PURGE_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT expires_at, value FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        expires_at, value = row
+        if expires_at is not None and expires_at < time.time():
+            return None
+        return expires_at, json.loads(value)
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)", (key, json.dumps(value), expires_at))
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+            self._conn.commit()
+
+    def clear(self, prefix=""):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+            self._conn.commit()
+
+# --- 3. MULTI-TIER CACHE ---
+class ScanCache:
+    """
+    Memory LRU in front of an optional SQLite tier. Keys are "<namespace>:<key>"
+    and each namespace gets its TTL from CACHE_TTLS.
+    """
+    def __init__(self, max_entries=10000, db_path=None, ttls=None):
+        self.memory = MemoryCache(max_entries)
+        self.disk = SQLiteCache(db_path) if db_path else None
+        self.ttls = ttls or CACHE_TTLS
+        self.counters = {}
+
+    def _count(self, namespace, field):
+        counts = self.counters.setdefault(namespace, {"hits": 0, "misses": 0})
+        counts[field] += 1
+
+    def get(self, namespace, key):
+        full_key = f"{namespace}:{key}"
+        entry = self.memory.get(full_key)
+        if entry is None and self.disk:
+            entry = self.disk.get(full_key)
+            if entry is not None:
+                self.memory.set(full_key, entry[1], entry[0])
+        if entry is None:
+            self._count(namespace, "misses")
+            return None
+        self._count(namespace, "hits")
+        return entry[1]
+
+    def set(self, namespace, key, value):
+        ttl = self.ttls.get(namespace)
+        expires_at = time.time() + ttl if ttl is not None else None
+        full_key = f"{namespace}:{key}"
+        self.memory.set(full_key, value, expires_at)
+        if self.disk:
+            self.disk.set(full_key, value, expires_at)
+
+    def clear(self, namespace=""):
+        prefix = f"{namespace}:" if namespace else ""
+        self.memory.clear(prefix)
+        if self.disk:
+            self.disk.clear(prefix)
+
+    def stats(self):
+        namespaces = {}
+        for namespace, counts in self.counters.items():
+            total = counts["hits"] + counts["misses"]
+            namespaces[namespace] = {**counts, "hit_ratio": round(counts["hits"] / total, 3) if total else 0.0}
+        return {"entries": len(self.memory), "disk": bool(self.disk), "namespaces": namespaces}
+
+SCAN_CACHE = ScanCache(
+    max_entries=int(os.getenv("SCAN_CACHE_MAX_ENTRIES", "10000")),
+    db_path=os.getenv("SCAN_CACHE_DB"),
+)
+
+@REGISTRY.collector
+def scan_cache_metrics():
+    lookups = [({"cache": "scan", "namespace": namespace, "result": result}, counts[field])
+               for namespace, counts in SCAN_CACHE.counters.items() for field, result in (("hits", "hit"), ("misses", "miss"))]
+    return [
+        ("cache_lookups_total", "counter", "Cache lookups by result (hit/miss).", lookups),
+        ("cache_entries", "gauge", "Entries held in memory.", [({"cache": "scan"}, len(SCAN_CACHE.memory))]),
+    ]
+
+def cached(namespace, key):
+    """
+    Caches an async auditor call in SCAN_CACHE. `key` builds the cache key from
+    the call's arguments. Failed lookups (None, or a tuple of Nones) are not cached.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            cache_key = key(*args, **kwargs)
+            hit = SCAN_CACHE.get(namespace, cache_key)
+            if hit is not None:
+                return tuple(hit) if isinstance(hit, list) else hit
+            result = await fn(*args, **kwargs)
+            if result is not None and not (isinstance(result, tuple) and None in result):
+                SCAN_CACHE.set(namespace, cache_key, result)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,37 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- SUPPORTED CHAINS ---
+# id: EVM chain id (Etherscan v2 `chainid`), dexscreener: DexScreener `chainId`,
+# native: symbol balances are reported in.
+CHAINS = {
+    "ethereum": {"id": 1, "dexscreener": "ethereum", "native": "ETH"},
+    "bsc": {"id": 56, "dexscreener": "bsc", "native": "BNB"},
+    "base": {"id": 8453, "dexscreener": "base", "native": "ETH"},
+    "arbitrum": {"id": 42161, "dexscreener": "arbitrum", "native": "ETH"},
+    "polygon": {"id": 137, "dexscreener": "polygon", "native": "POL"},
+}
+DEFAULT_CHAIN = os.getenv("DEFAULT_CHAIN", "ethereum")
+
+_BY_ID = {str(cfg["id"]): name for name, cfg in CHAINS.items()}
+
+class UnknownChain(ValueError):
+    pass
+
+def resolve_chain(chain):
+    """
+    Normalizes a chain name or id ("bsc", "BSC", 56, "56") to its CHAINS key.
+    None means DEFAULT_CHAIN.
+    """
+    if chain is None:
+        return DEFAULT_CHAIN
+    name = str(chain).strip().lower()
+    name = _BY_ID.get(name, name)
+    if name not in CHAINS:
+        raise UnknownChain(f"Unsupported chain '{chain}'. Supported: {', '.join(CHAINS)}")
+    return name
+
+def chain_id(chain):
+    return CHAINS[chain]["id"]
@@ -0,0 +1,159 @@
+"""
+Deployer reputation index: what we know about every contract creator we've
+looked up, shared by all scans.
+
+    deployers:   wallet balance and tx count per (chain, address), each with
+                 the time it was fetched
+    deployments: contracts seen from each deployer, with the verdict of the
+                 last Pro scan (free scans file the contract without one)
+
+Pro scans read wallet stats from here while they're younger than
+DEPLOYER_MAX_AGE; warmer.DeployerRefresher re-fetches them in bulk in the
+background once they pass DEPLOYER_REFRESH_AGE, for deployers seen within
+DEPLOYER_ACTIVE_WINDOW. "This deployer shipped N tokens we rated CRITICAL"
+is then a local query (history()), which scoring uses as a risk signal.
+
+With DEPLOYER_INDEX_DB set the index is a SQLite file shared by the API and
+the workers; otherwise it lives in this process's memory.
+"""
+import os
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+from chains import DEFAULT_CHAIN, chain_id
+from metrics import REGISTRY
+
+load_dotenv()
+
+# --- CONFIGURATION ---
+DEPLOYER_INDEX_DB = os.getenv("DEPLOYER_INDEX_DB")
+DEPLOYER_MAX_AGE = float(os.getenv("DEPLOYER_MAX_AGE", "21600"))
+DEPLOYER_REFRESH_AGE = float(os.getenv("DEPLOYER_REFRESH_AGE", "900"))
+DEPLOYER_ACTIVE_WINDOW = float(os.getenv("DEPLOYER_ACTIVE_WINDOW", "86400"))
+# Seconds between background refresh rounds; 0 turns the refresher off
+DEPLOYER_REFRESH_INTERVAL = float(os.getenv("DEPLOYER_REFRESH_INTERVAL", "300"))
+
+CRITICAL, CAUTION = "CRITICAL", "CAUTION"
+
+class DeployerIndex:
+    def __init__(self, db_path=None):
+        self._conn = sqlite3.connect(db_path or ":memory:", check_same_thread=False, timeout=5)
+        self._lock = threading.Lock()
+        self.counters = {"fresh": 0, "stale": 0, "misses": 0}
+        if db_path:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS deployers (chain_id INTEGER NOT NULL, address TEXT NOT NULL, balance_eth REAL, balance_at REAL, tx_count INTEGER, tx_count_at REAL, last_seen REAL NOT NULL, PRIMARY KEY (chain_id, address))")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS deployers_last_seen ON deployers (chain_id, last_seen)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS deployments (chain_id INTEGER NOT NULL, contract TEXT NOT NULL, deployer TEXT NOT NULL, verdict TEXT, score INTEGER, scanned_at REAL NOT NULL, PRIMARY KEY (chain_id, contract))")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS deployments_deployer ON deployments (deployer)")
+        self._conn.commit()
+
+    def _write(self, sql, rows):
+        with self._lock:
+            self._conn.executemany(sql, rows)
+            self._conn.commit()
+
+    # --- 1. WALLET STATS ---
+    def wallet(self, address, chain=DEFAULT_CHAIN, max_age=DEPLOYER_MAX_AGE):
+        """
+        (balance_eth, tx_count) if both were fetched less than `max_age` ago,
+        else None. Marks the deployer as active for the background refresher.
+        """
+        now = time.time()
+        key = (chain_id(chain), address.lower())
+        with self._lock:
+            row = self._conn.execute("SELECT balance_eth, balance_at, tx_count, tx_count_at FROM deployers WHERE chain_id = ? AND address = ?", key).fetchone()
+            if row:
+                self._conn.execute("UPDATE deployers SET last_seen = ? WHERE chain_id = ? AND address = ?", (now, *key))
+                self._conn.commit()
+        if row is None:
+            self.counters["misses"] += 1
+            return None
+        balance, balance_at, tx_count, tx_count_at = row
+        if balance_at is None or tx_count_at is None or now - min(balance_at, tx_count_at) > max_age:
+            self.counters["stale"] += 1
+            return None
+        self.counters["fresh"] += 1
+        return balance, tx_count
+
+    def record_wallets(self, chain, rows):
+        """
+        Files [(address, balance_eth, tx_count)]. None leaves the stored value
+        (and its timestamp) as it was.
+        """
+        now = time.time()
+        self._write(
+            "INSERT INTO deployers (chain_id, address, balance_eth, balance_at, tx_count, tx_count_at, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (chain_id, address) DO UPDATE SET "
+            "balance_eth = COALESCE(excluded.balance_eth, balance_eth), balance_at = COALESCE(excluded.balance_at, balance_at), "
+            "tx_count = COALESCE(excluded.tx_count, tx_count), tx_count_at = COALESCE(excluded.tx_count_at, tx_count_at)",
+            [(chain_id(chain), address.lower(), balance, None if balance is None else now, tx_count, None if tx_count is None else now, now)
+             for address, balance, tx_count in rows],
+        )
+
+    def record_wallet(self, address, chain=DEFAULT_CHAIN, balance_eth=None, tx_count=None):
+        self.record_wallets(chain, [(address, balance_eth, tx_count)])
+
+    def stale(self, chain=DEFAULT_CHAIN, limit=100, refresh_age=DEPLOYER_REFRESH_AGE, active_window=DEPLOYER_ACTIVE_WINDOW):
+        """
+        Recently seen deployers whose stats are older than `refresh_age`, most recently seen first.
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT address FROM deployers WHERE chain_id = ? AND last_seen > ? "
+                "AND (balance_at IS NULL OR tx_count_at IS NULL OR MIN(balance_at, tx_count_at) < ?) ORDER BY last_seen DESC LIMIT ?",
+                (chain_id(chain), now - active_window, now - refresh_age, limit),
+            ).fetchall()
+        return [address for (address,) in rows]
+
+    # --- 2. DEPLOYMENTS ---
+    def record_deployments(self, chain, rows):
+        """
+        Files [(contract, deployer, verdict, score)]. A None verdict (free
+        scans) keeps the verdict of an earlier Pro scan.
+        """
+        now = time.time()
+        self._write(
+            "INSERT INTO deployments (chain_id, contract, deployer, verdict, score, scanned_at) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (chain_id, contract) DO UPDATE SET deployer = excluded.deployer, "
+            "verdict = COALESCE(excluded.verdict, verdict), score = COALESCE(excluded.score, score), scanned_at = excluded.scanned_at",
+            [(chain_id(chain), contract.lower(), deployer.lower(), verdict, score, now) for contract, deployer, verdict, score in rows],
+        )
+
+    def record_deployment(self, deployer, contract, chain=DEFAULT_CHAIN, verdict=None, score=None):
+        self.record_deployments(chain, [(contract, deployer, verdict, score)])
+
+    def history(self, deployer, contract=None, chain=DEFAULT_CHAIN):
+        """
+        {"tokens", "critical", "caution"}: other contracts we've seen from
+        `deployer` on any chain (excluding `contract` itself), by verdict.
+        """
+        with self._lock:
+            tokens, critical, caution = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(verdict = ?), 0), COALESCE(SUM(verdict = ?), 0) FROM deployments "
+                "WHERE deployer = ? AND NOT (chain_id = ? AND contract = ?)",
+                (CRITICAL, CAUTION, deployer.lower(), chain_id(chain), (contract or "").lower()),
+            ).fetchone()
+        return {"tokens": tokens, "critical": critical, "caution": caution}
+
+    def stats(self):
+        with self._lock:
+            deployers = self._conn.execute("SELECT COUNT(*) FROM deployers").fetchone()[0]
+            deployments = self._conn.execute("SELECT COUNT(*) FROM deployments").fetchone()[0]
+        lookups = sum(self.counters.values())
+        return {"deployers": deployers, "deployments": deployments, **self.counters,
+                "hit_ratio": round(self.counters["fresh"] / lookups, 3) if lookups else 0.0}
+
+DEPLOYER_INDEX = DeployerIndex(db_path=DEPLOYER_INDEX_DB)
+
+@REGISTRY.collector
+def deployer_index_metrics():
+    stats = DEPLOYER_INDEX.stats()
+    return [
+        ("deployer_lookups_total", "counter", "Deployer wallet lookups answered by the index (fresh) or sent to Etherscan.",
+         [({"result": result}, stats[field]) for field, result in (("fresh", "fresh"), ("stale", "stale"), ("misses", "miss"))]),
+        ("deployer_index_entries", "gauge", "Rows in the deployer index.",
+         [({"table": "deployers"}, stats["deployers"]), ({"table": "deployments"}, stats["deployments"])]),
+    ]
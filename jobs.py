@@ -0,0 +1,203 @@
+import abc
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- CONFIGURATION ---
+# Backend by URL scheme, see BACKENDS. sqlite:///jobs.db is relative, sqlite:////var/lib/jobs.db absolute.
+JOB_QUEUE_URL = os.getenv("JOB_QUEUE_URL", "sqlite:///jobs.db")
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# A worker holds a job this long between heartbeats; after that another worker may take it over
+JOB_LEASE = float(os.getenv("JOB_LEASE", "120"))
+JOB_RETRY_BASE = float(os.getenv("JOB_RETRY_BASE", "5"))
+# A finished job answers repeat submissions for this long before a new scan is queued
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "600"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+def job_id_for(user_id, address, chain):
+    # Same (user, address, chain) -> same job, so retried submissions don't queue twice
+    return hashlib.sha256(f"{user_id}|{address.lower()}|{chain}".encode()).hexdigest()[:32]
+
+def is_reusable(job, now=None):
+    """
+    True if a submission for this job id should get the existing job back
+    instead of queuing a new one: it's still pending, or finished recently.
+    """
+    if job is None or job["status"] == FAILED:
+        return False
+    if job["status"] == DONE:
+        return job["updated_at"] > (now or time.time()) - JOB_RESULT_TTL
+    return True
+
+def retry_delay(attempts):
+    return JOB_RETRY_BASE * 2 ** max(0, attempts - 1)
+
+# --- 1. QUEUE INTERFACE ---
+class JobQueue(abc.ABC):
+    """
+    What the API and the workers need from a queue backend. Jobs are dicts:
+    {"id", "status", "payload", "result", "error", "attempts", "created_at", "updated_at"}.
+    Workers own a job through a lease they renew with heartbeat(); a job whose
+    lease runs out goes to the next worker that calls claim().
+    """
+    @abc.abstractmethod
+    def submit(self, job_id, payload):
+        """Queues a job unless is_reusable() says the existing one stands. Returns (job, created)."""
+
+    @abc.abstractmethod
+    def get(self, job_id):
+        ...
+
+    @abc.abstractmethod
+    def claim(self, worker_id):
+        """Takes the next runnable job for `worker_id`, or returns None."""
+
+    @abc.abstractmethod
+    def heartbeat(self, job_id, worker_id):
+        """Extends the lease. False means the job was taken over by another worker."""
+
+    @abc.abstractmethod
+    def complete(self, job_id, worker_id, result):
+        """Stores the result. False if `worker_id` no longer owns the job."""
+
+    @abc.abstractmethod
+    def fail(self, job_id, worker_id, error, retry=True):
+        """Requeues with backoff while attempts remain (and `retry`), else marks it failed. Returns the new status, None if not owned."""
+
+    @abc.abstractmethod
+    def reap(self):
+        """Fails jobs whose worker vanished on their last attempt and returns them (so their credit can be refunded)."""
+
+    @abc.abstractmethod
+    def stats(self):
+        ...
+
+# --- 2. SQLITE BACKEND (single host, any number of processes) ---
+class SQLiteJobQueue(JobQueue):
+    def __init__(self, path, max_attempts=JOB_MAX_ATTEMPTS, lease=JOB_LEASE):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY, status TEXT NOT NULL, payload TEXT NOT NULL, result TEXT, error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0, worker TEXT, lease_until REAL, run_after REAL NOT NULL,
+            created_at REAL NOT NULL, updated_at REAL NOT NULL)""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_runnable ON jobs (status, run_after)")
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, rest):
+        return cls(rest[1:] if rest.startswith("/") else rest)
+
+    COLUMNS = "id, status, payload, result, error, attempts, created_at, updated_at"
+
+    def _row(self, row):
+        if row is None:
+            return None
+        job_id, status, payload, result, error, attempts, created_at, updated_at = row
+        return {"id": job_id, "status": status, "payload": json.loads(payload), "result": json.loads(result) if result else None,
+                "error": error, "attempts": attempts, "created_at": created_at, "updated_at": updated_at}
+
+    def _select(self, job_id):
+        return self._row(self._conn.execute(f"SELECT {self.COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def _transaction(self, fn):
+        # BEGIN IMMEDIATE takes the write lock up front, so two processes can't claim the same row
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn()
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def submit(self, job_id, payload):
+        def submit():
+            now = time.time()
+            existing = self._select(job_id)
+            if is_reusable(existing, now):
+                return existing, False
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, status, payload, attempts, run_after, created_at, updated_at) VALUES (?, ?, ?, 0, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(payload), now, now, now))
+            return self._select(job_id), True
+        return self._transaction(submit)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._select(job_id)
+
+    def claim(self, worker_id):
+        def claim():
+            now = time.time()
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE (status = ? AND run_after <= ?) OR (status = ? AND lease_until < ? AND attempts < ?) "
+                "ORDER BY run_after LIMIT 1", (QUEUED, now, RUNNING, now, self.max_attempts)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (RUNNING, worker_id, now + self.lease, now, row[0]))
+            return self._select(row[0])
+        return self._transaction(claim)
+
+    def heartbeat(self, job_id, worker_id):
+        with self._lock:
+            cur = self._conn.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = ?",
+                                     (time.time() + self.lease, job_id, worker_id, RUNNING))
+        return cur.rowcount == 1
+
+    def complete(self, job_id, worker_id, result):
+        with self._lock:
+            cur = self._conn.execute("UPDATE jobs SET status = ?, result = ?, error = NULL, updated_at = ? WHERE id = ? AND worker = ? AND status = ?",
+                                     (DONE, json.dumps(result), time.time(), job_id, worker_id, RUNNING))
+        return cur.rowcount == 1
+
+    def fail(self, job_id, worker_id, error, retry=True):
+        def fail():
+            row = self._conn.execute("SELECT attempts FROM jobs WHERE id = ? AND worker = ? AND status = ?", (job_id, worker_id, RUNNING)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            status = QUEUED if retry and row[0] < self.max_attempts else FAILED
+            self._conn.execute("UPDATE jobs SET status = ?, error = ?, worker = NULL, run_after = ?, updated_at = ? WHERE id = ?",
+                               (status, error, now + retry_delay(row[0]), now, job_id))
+            return status
+        return self._transaction(fail)
+
+    def reap(self):
+        def reap():
+            now = time.time()
+            rows = self._conn.execute(f"SELECT {self.COLUMNS} FROM jobs WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                                      (RUNNING, now, self.max_attempts)).fetchall()
+            for row in rows:
+                self._conn.execute("UPDATE jobs SET status = ?, error = ?, worker = NULL, updated_at = ? WHERE id = ?",
+                                   (FAILED, "Worker stopped responding", now, row[0]))
+            return [{**self._row(row), "status": FAILED} for row in rows]
+        return self._transaction(reap)
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, FAILED)}
+
+# --- 3. BACKEND SELECTION ---
+BACKENDS = {"sqlite": SQLiteJobQueue}
+
+def open_queue(url=JOB_QUEUE_URL):
+    scheme, _, rest = url.partition("://")
+    if scheme not in BACKENDS:
+        raise ValueError(f"Unknown job queue backend '{scheme}' (have: {', '.join(BACKENDS)})")
+    return BACKENDS[scheme].from_url(rest)
@@ -0,0 +1,252 @@
+"""
+In-process metrics in the Prometheus text format, plus request tracing.
+
+Hot paths only touch plain counters and fixed-bucket histograms (a bisect and
+two additions); everything the modules already count (cache hits, scheduler
+retries, queue sizes) is read by collectors when /metrics is scraped.
+
+    with span("supabase.reserve_scan_credit"): ...
+    @traced()
+    async def get_contract_source_code(...): ...
+
+A request sent with `X-Server-Timing: 1` gets a Server-Timing header with the
+time its spans took, e.g. `auditor.get_market_data;dur=212.4;desc="1x"`.
+"""
+import asyncio
+import bisect
+import contextvars
+import functools
+import inspect
+import time
+from contextlib import aclosing, contextmanager
+
+PREFIX = "web3shield_"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+# --- 1. METRIC TYPES ---
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labelnames = PREFIX + name, help, tuple(labels)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name, _labels(self.labelnames, labels), value
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value):
+        self._values[labels] = value
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = PREFIX + name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [per-bucket counts (+Inf last), sum]
+
+    def observe(self, value, *labels):
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def samples(self):
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                yield f"{self.name}_bucket", _labels(self.labelnames + ("le",), labels + (le,)), cumulative
+            yield f"{self.name}_sum", _labels(self.labelnames, labels), total
+            yield f"{self.name}_count", _labels(self.labelnames, labels), cumulative
+
+# --- 2. REGISTRY ---
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """
+        `fn()` returns [(name, kind, help, [(labels dict, value), ...]), ...],
+        read at scrape time. Usable as a decorator.
+        """
+        self.collectors.append(fn)
+        return fn
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{labels} {_number(value)}" for name, labels, value in metric.samples())
+        # Several collectors may report into one family (cache_lookups_total)
+        families = {}
+        for collect in self.collectors:
+            for name, kind, help, samples in collect():
+                families.setdefault(name, (kind, help, []))[2].extend(samples)
+        for name, (kind, help, samples) in families.items():
+            lines.append(f"# HELP {PREFIX}{name} {help}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{PREFIX}{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+def counter(name, help, labels=()):
+    return REGISTRY.register(Counter(name, help, labels))
+
+def gauge(name, help, labels=()):
+    return REGISTRY.register(Gauge(name, help, labels))
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, help, labels, buckets))
+
+SPAN_SECONDS = histogram("span_seconds", "Time spent in traced functions and blocks.", ["span"])
+SPAN_ERRORS = counter("span_errors_total", "Traced functions and blocks that raised.", ["span", "error"])
+SPANS_IN_FLIGHT = gauge("spans_in_flight", "Traced functions and blocks currently running.", ["span"])
+UPSTREAM_SECONDS = histogram("upstream_request_seconds", "Upstream round trips (one per attempt), by outcome.", ["provider", "outcome"])
+UPSTREAM_WAIT_SECONDS = histogram("upstream_queue_wait_seconds", "Time spent waiting for a rate limit token.", ["provider"])
+UPSTREAM_IN_FLIGHT = gauge("upstream_in_flight", "Upstream requests currently on the wire.", ["provider"])
+HTTP_SECONDS = histogram("http_request_seconds", "API requests until the response headers were sent.", ["method", "route", "status"])
+HTTP_IN_FLIGHT = gauge("http_requests_in_flight", "API requests currently being handled.")
+
+# --- 3. SPANS ---
+# {span: [calls, seconds]} for the request being handled, when it asked for Server-Timing
+TRACE = contextvars.ContextVar("trace", default=None)
+
+def add_trace(name, seconds):
+    trace = TRACE.get()
+    if trace is not None:
+        entry = trace.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+@contextmanager
+def span(name):
+    SPANS_IN_FLIGHT.inc(name)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        SPAN_ERRORS.inc(name, type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        SPANS_IN_FLIGHT.dec(name)
+        SPAN_SECONDS.observe(elapsed, name)
+        add_trace(name, elapsed)
+
+def traced(name=None):
+    """
+    Wraps a function, coroutine function or async generator in a span named
+    `<module>.<qualname>` unless given a name.
+    """
+    def decorator(fn):
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with span(span_name):
+                    async with aclosing(fn(*args, **kwargs)) as items:
+                        async for item in items:
+                            yield item
+        elif inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with span(span_name):
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def server_timing(trace, total):
+    parts = [f'{name};dur={seconds * 1000:.1f};desc="{calls}x"' for name, (calls, seconds) in sorted(trace.items(), key=lambda kv: -kv[1][1])]
+    return ", ".join(parts + [f"total;dur={total * 1000:.1f}"])
+
+# --- 4. ASGI MIDDLEWARE ---
+class MetricsMiddleware:
+    """
+    Request latency by route template (not raw path, so job ids don't explode
+    the label set), in-flight requests, and opt-in Server-Timing headers.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        trace = {} if any(name == b"x-server-timing" for name, _ in scope["headers"]) else None
+        token = TRACE.set(trace)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_metrics(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = time.perf_counter() - start
+                route = scope.get("route")
+                HTTP_SECONDS.observe(elapsed, scope["method"], route.path if route else "unmatched", str(status))
+                if trace is not None:
+                    headers = [*message.get("headers", []), (b"server-timing", server_timing(trace, elapsed).encode())]
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            TRACE.reset(token)
+
+# --- 5. STANDALONE EXPORTER (worker processes) ---
+async def serve_metrics(port, host="0.0.0.0"):
+    """
+    Minimal HTTP server answering every request with render(), for processes
+    that have no API of their own (worker.py --metrics-port).
+    """
+    async def handle(reader, writer):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = REGISTRY.render().encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                         b"Content-Length: " + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,193 @@
+import asyncio
+import bisect
+import logging
+import os
+import time
+from dotenv import load_dotenv
+from metrics import REGISTRY
+
+load_dotenv()
+
+# --- CONFIGURATION ---
+# Start the next candidate if the current one hasn't answered after this long.
+# Once a model has enough samples its own p95 is used instead, clamped to the bounds.
+HEDGE_AFTER = float(os.getenv("MODEL_HEDGE_AFTER", "8"))
+HEDGE_MIN = float(os.getenv("MODEL_HEDGE_MIN", "2"))
+HEDGE_MAX = float(os.getenv("MODEL_HEDGE_MAX", "20"))
+# Hard cap on a single model attempt (the HTTP timeout only bounds each read)
+MODEL_DEADLINE = float(os.getenv("MODEL_DEADLINE", "60"))
+MIN_SAMPLES = 20
+# Seconds of expected latency one unit of error rate costs when ranking models
+ERROR_PENALTY = 30.0
+# Errors are forgiven over time so a demoted model gets tried again
+ERROR_HALF_LIFE = 300.0
+EWMA_ALPHA = 0.2
+LATENCY_BUCKETS = (0.5, 1, 2, 4, 8, 16, 32, 64)
+
+# --- 1. PER-MODEL STATS ---
+class ModelStats:
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # last one is +Inf
+        self.successes = 0
+        self.errors = {}
+        self.latency_ewma = None
+        self.error_ewma = 0.0
+        self.error_updated = time.monotonic()
+
+    def _record_outcome(self, failed):
+        self.error_ewma = self.error_rate() * (1 - EWMA_ALPHA) + EWMA_ALPHA * failed
+        self.error_updated = time.monotonic()
+
+    def success(self, latency):
+        self.successes += 1
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self.latency_ewma = latency if self.latency_ewma is None else (1 - EWMA_ALPHA) * self.latency_ewma + EWMA_ALPHA * latency
+        self._record_outcome(0)
+
+    def failure(self, kind):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+        self._record_outcome(1)
+
+    def error_rate(self):
+        age = time.monotonic() - self.error_updated
+        return self.error_ewma * 0.5 ** (age / ERROR_HALF_LIFE)
+
+    def quantile(self, q):
+        """
+        Upper bound of the histogram bucket holding the q-quantile, or None
+        without enough samples.
+        """
+        if self.successes < MIN_SAMPLES:
+            return None
+        target, seen = q * self.successes, 0
+        for bound, count in zip((*LATENCY_BUCKETS, float("inf")), self.buckets):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def expected_cost(self):
+        # Unsampled models are assumed to answer by the default hedge delay
+        latency = self.latency_ewma if self.latency_ewma is not None else HEDGE_AFTER
+        return latency + ERROR_PENALTY * self.error_rate()
+
+    def hedge_after(self):
+        p95 = self.quantile(0.95)
+        return HEDGE_AFTER if p95 is None else min(HEDGE_MAX, max(HEDGE_MIN, p95))
+
+    def snapshot(self):
+        attempts = self.successes + sum(self.errors.values())
+        return {
+            "successes": self.successes,
+            "errors": dict(self.errors),
+            "error_ratio": round(sum(self.errors.values()) / attempts, 3) if attempts else 0.0,
+            "error_rate_recent": round(self.error_rate(), 3),
+            "latency_ewma_s": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            "latency_p50_s": self.quantile(0.5),
+            "latency_p95_s": self.quantile(0.95),
+            "hedge_after_s": self.hedge_after(),
+            "latency_histogram": dict(zip([*map(str, LATENCY_BUCKETS), "+Inf"], self.buckets)),
+        }
+
+class ModelFailed(Exception):
+    """A model attempt failed; `kind` labels it in the error histogram."""
+    def __init__(self, kind, message=""):
+        super().__init__(message or kind)
+        self.kind = kind
+
+# --- 2. HEDGED DISPATCH ---
+class ModelDispatcher:
+    def __init__(self):
+        self.models = {}
+        self.hedges = 0
+        self.backup_wins = 0
+
+    def stats_for(self, model):
+        if model not in self.models:
+            self.models[model] = ModelStats()
+        return self.models[model]
+
+    def rank(self, candidates):
+        """
+        Candidates ordered by expected cost from live stats. The sort is
+        stable, so with no data yet the configured order is kept.
+        """
+        return sorted(candidates, key=lambda m: self.stats_for(m).expected_cost())
+
+    async def _attempt(self, model, call):
+        stats = self.stats_for(model)
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(call(model), MODEL_DEADLINE)
+        except asyncio.TimeoutError:
+            stats.failure("timeout")
+            raise ModelFailed("timeout", f"{model} exceeded {MODEL_DEADLINE:g}s")
+        except ModelFailed as e:
+            stats.failure(e.kind)
+            raise
+        stats.success(time.monotonic() - start)
+        return result
+
+    async def generate(self, candidates, call):
+        """
+        Hedged call over `candidates`. `call(model)` returns the result or
+        raises ModelFailed. The best-ranked model starts first; whenever the
+        newest attempt is slower than its hedge delay, or an attempt fails,
+        the next candidate is launched too. The first success wins and the
+        rest are cancelled. Returns (model, result), or (None, None) if every
+        candidate failed.
+        """
+        queue = self.rank(candidates)
+        running = {}  # task -> model
+        launched = []
+
+        def launch():
+            model = queue.pop(0)
+            launched.append(model)
+            running[asyncio.ensure_future(self._attempt(model, call))] = model
+
+        try:
+            while queue or running:
+                if not running:
+                    launch()
+                timeout = self.stats_for(launched[-1]).hedge_after() if queue else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Hedge: keep the slow attempt running and race the next candidate against it
+                    self.hedges += 1
+                    launch()
+                    continue
+                for task in done:
+                    model = running.pop(task)
+                    if task.exception() is None:
+                        if model != launched[0]:
+                            self.backup_wins += 1
+                        return model, task.result()
+                    logging.warning(f"Gemini {model} failed: {task.exception()}")
+                    if queue:
+                        launch()  # don't wait out the hedge delay after a hard failure
+            return None, None
+        finally:
+            for task in running:
+                task.cancel()
+
+    def stats(self):
+        return {
+            "hedges": self.hedges,
+            "backup_wins": self.backup_wins,
+            "models": {model: stats.snapshot() for model, stats in self.models.items()},
+        }
+
+MODEL_DISPATCH = ModelDispatcher()
+
+@REGISTRY.collector
+def model_metrics():
+    attempts = []
+    for model, stats in MODEL_DISPATCH.models.items():
+        attempts.append(({"model": model, "result": "success"}, stats.successes))
+        attempts += [({"model": model, "result": kind}, count) for kind, count in stats.errors.items()]
+    return [
+        ("model_attempts_total", "counter", "Gemini model attempts by result (success or error kind).", attempts),
+        ("model_hedges_total", "counter", "Backup model requests started, and how many of them won.",
+         [({"result": "started"}, MODEL_DISPATCH.hedges), ({"result": "backup_won"}, MODEL_DISPATCH.backup_wins)]),
+    ]
@@ -7,6 +7,7 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from reportlab.graphics.shapes import Drawing, Rect, String
 from io import BytesIO
 from datetime import datetime
+from report_parser import parse_report, get_section
 
 # --- COLORS ---
 brand_dark = colors.HexColor("#0f172a")
@@ -42,6 +43,40 @@ def draw_background(canvas, doc):
     canvas.drawRightString(8*inch, 0.5*inch, f"Page {doc.page}")
     canvas.restoreState()
 
+# --- PRECOMPILED STYLES ---
+# Built once per process instead of on every render
+_styles = getSampleStyleSheet()
+S_H1 = ParagraphStyle('H1', parent=_styles['Heading1'], fontSize=24, spaceAfter=20, textColor=brand_dark)
+S_H2 = ParagraphStyle('H2', parent=_styles['Heading2'], fontSize=14, spaceBefore=25, spaceAfter=10, textColor=brand_blue)
+S_BODY = ParagraphStyle('Body', parent=_styles['Normal'], fontSize=10, leading=14, textColor=colors.HexColor("#334155"))
+S_KEY = ParagraphStyle('Key', parent=_styles['Normal'], fontSize=9, textColor=colors.HexColor("#64748b"), uppercase=True)
+S_VAL = ParagraphStyle('Val', parent=_styles['Normal'], fontSize=10, textColor=brand_dark, fontName="Helvetica-Bold")
+S_SCORE_BIG = ParagraphStyle('Score', parent=_styles['Normal'], fontSize=42, textColor=brand_dark, fontName="Helvetica-Bold", alignment=TA_CENTER)
+S_VERDICT = ParagraphStyle('V', parent=S_H1, alignment=TA_CENTER, textColor=colors.white)
+S_SCORE_LABEL = ParagraphStyle('SL', parent=S_KEY, alignment=TA_CENTER)
+S_SCORE = {color: ParagraphStyle('S', parent=S_SCORE_BIG, textColor=color) for color in (risk_safe, risk_warn, risk_crit)}
+
+VERDICT_TABLE_STYLES = {
+    color: TableStyle([('BACKGROUND', (0,0), (-1,-1), color), ('TOPPADDING', (0,0), (-1,-1), 15), ('BOTTOMPADDING', (0,0), (-1,-1), 15), ('ROUNDEDCORNERS', [6,6,6,6])])
+    for color in (risk_safe, risk_warn, risk_crit)
+}
+SCORE_TABLE_STYLE = TableStyle([
+    ('VALIGN', (0,0), (-1,-1), 'TOP'),
+    ('LINEBEFORE', (1,0), (1,0), 1, colors.HexColor("#e2e8f0")), # Vertical divider
+    ('LEFTPADDING', (1,0), (1,0), 20),
+    ('RIGHTPADDING', (0,0), (0,0), 20),
+])
+MARKET_TABLE_STYLE = TableStyle([
+    ('GRID', (0,0), (-1,-1), 0.5, colors.HexColor("#e2e8f0")), 
+    ('TOPPADDING', (0,0), (-1,-1), 8), 
+    ('BOTTOMPADDING', (0,0), (-1,-1), 8), 
+    ('BACKGROUND', (0,0), (-1,3), colors.HexColor("#f0fdf4"))
+])
+KV_TABLE_STYLE = TableStyle([('GRID', (0,0), (-1,-1), 0.5, colors.HexColor("#e2e8f0")), ('VALIGN', (0,0), (-1,-1), 'TOP'), ('TOPPADDING', (0,0), (-1,-1), 6), ('BOTTOMPADDING', (0,0), (-1,-1), 6)])
+KV_COL_WIDTHS = [2.5*inch, 5*inch]
+
+SECTION_TITLES = [("deployer", "DEPLOYER INTELLIGENCE"), ("contract", "CODE ARCHITECTURE"), ("threats", "VULNERABILITY ASSESSMENT"), ("gas", "GAS EFFICIENCY")]
+
 def create_risk_meter(risk_level):
     d = Drawing(400, 40)
     d.add(Rect(0, 10, 100, 10, fillColor=colors.HexColor("#dcfce7"), strokeWidth=0))
@@ -56,18 +91,17 @@ def create_risk_meter(risk_level):
     d.add(Rect(x_pos-5, 25, 10, 5, fillColor=color, strokeWidth=0))
     return d
 
-def create_audit_pdf(audit_data):
+def _kv_table(rows):
+    return Table(rows, colWidths=KV_COL_WIDTHS, style=KV_TABLE_STYLE)
+
+def render_audit_pdf(audit_data):
+    """
+    Renders the report and returns the PDF bytes. Plain data in and out, so
+    it can run in a worker process (see pdf_service.py).
+    """
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=50, leftMargin=50, topMargin=100, bottomMargin=100)
     story = []
-    styles = getSampleStyleSheet()
-
-    s_h1 = ParagraphStyle('H1', parent=styles['Heading1'], fontSize=24, spaceAfter=20, textColor=brand_dark)
-    s_h2 = ParagraphStyle('H2', parent=styles['Heading2'], fontSize=14, spaceBefore=25, spaceAfter=10, textColor=brand_blue)
-    s_body = ParagraphStyle('Body', parent=styles['Normal'], fontSize=10, leading=14, textColor=colors.HexColor("#334155"))
-    s_key = ParagraphStyle('Key', parent=styles['Normal'], fontSize=9, textColor=colors.HexColor("#64748b"), uppercase=True)
-    s_val = ParagraphStyle('Val', parent=styles['Normal'], fontSize=10, textColor=brand_dark, fontName="Helvetica-Bold")
-    s_score_big = ParagraphStyle('Score', parent=styles['Normal'], fontSize=42, textColor=brand_dark, fontName="Helvetica-Bold", alignment=TA_CENTER)
     
     verdict_raw = audit_data.get('verdict', 'UNKNOWN').upper()
     risk_code = "WARN"
@@ -77,12 +111,12 @@ def create_audit_pdf(audit_data):
     elif "CRITICAL" in verdict_raw or "FAIL" in verdict_raw: risk_code, verdict_color, verdict_text = "CRIT", risk_crit, "CRITICAL RISK DETECTED"
 
     # 1. HEADER
-    story.append(Paragraph(f"AUDIT REPORT: {audit_data.get('name', 'Smart Contract')}", s_h1))
-    t_v = Table([[Paragraph(verdict_text, ParagraphStyle('V', parent=s_h1, alignment=TA_CENTER, textColor=colors.white))]], colWidths=[7.5*inch])
-    t_v.setStyle(TableStyle([('BACKGROUND', (0,0), (-1,-1), verdict_color), ('TOPPADDING', (0,0), (-1,-1), 15), ('BOTTOMPADDING', (0,0), (-1,-1), 15), ('ROUNDEDCORNERS', [6,6,6,6])]))
+    story.append(Paragraph(f"AUDIT REPORT: {audit_data.get('name', 'Smart Contract')}", S_H1))
+    t_v = Table([[Paragraph(verdict_text, S_VERDICT)]], colWidths=[7.5*inch])
+    t_v.setStyle(VERDICT_TABLE_STYLES[verdict_color])
     story.append(t_v)
     story.append(Spacer(1, 15))
-    story.append(create_risk_meter(risk_code))
+    story.append(create_risk_meter(risk_code))  # flowables get wrapped/split in place, so never share one between renders
     story.append(Spacer(1, 20))
 
     # 2. SCORECARD (CLEAN LAYOUT)
@@ -94,30 +128,25 @@ def create_audit_pdf(audit_data):
     
     # Left Column: The Big Number
     left_cell = [
-        Paragraph("SECURITY SCORE", ParagraphStyle('SL', parent=s_key, alignment=TA_CENTER)),
+        Paragraph("SECURITY SCORE", S_SCORE_LABEL),
         Spacer(1, 6),
-        Paragraph(f"{score}/100", ParagraphStyle('S', parent=s_score_big, textColor=score_color))
+        Paragraph(f"{score}/100", S_SCORE[score_color])
     ]
     
     # Right Column: The Reasons List
-    right_cell = [Paragraph("RISK FACTORS DETECTED:", s_key)]
+    right_cell = [Paragraph("RISK FACTORS DETECTED:", S_KEY)]
     if reasons:
         for r in reasons:
             # Bullet point with color
             right_cell.append(Spacer(1, 4))
-            right_cell.append(Paragraph(f"<font color='{risk_crit.hexval()}'>•</font> {r}", s_val))
+            right_cell.append(Paragraph(f"<font color='{risk_crit.hexval()}'>•</font> {r}", S_VAL))
     else:
         right_cell.append(Spacer(1, 4))
-        right_cell.append(Paragraph("✅ No major automated red flags detected.", s_body))
+        right_cell.append(Paragraph("✅ No major automated red flags detected.", S_BODY))
 
     # Table Structure
     t_score = Table([[left_cell, right_cell]], colWidths=[2.5*inch, 5*inch])
-    t_score.setStyle(TableStyle([
-        ('VALIGN', (0,0), (-1,-1), 'TOP'),
-        ('LINEBEFORE', (1,0), (1,0), 1, colors.HexColor("#e2e8f0")), # Vertical divider
-        ('LEFTPADDING', (1,0), (1,0), 20),
-        ('RIGHTPADDING', (0,0), (0,0), 20),
-    ]))
+    t_score.setStyle(SCORE_TABLE_STYLE)
     story.append(t_score)
     story.append(Spacer(1, 20))
 
@@ -125,61 +154,41 @@ def create_audit_pdf(audit_data):
     market = audit_data.get('market')
     if market and isinstance(market, dict):
         market_section = []
-        market_section.append(Paragraph("LIVE MARKET INTELLIGENCE", s_h2))
+        market_section.append(Paragraph("LIVE MARKET INTELLIGENCE", S_H2))
         liq = f"${market.get('liquidity_usd', 0):,.2f}"
         if market.get('liquidity_usd', 0) < 5000: liq += " (CRITICAL LOW)"
         market_grid = [
-            [Paragraph("LIQUIDITY (USD)", s_key), Paragraph(liq, s_val)],
-            [Paragraph("MARKET CAP (FDV)", s_key), Paragraph(f"${market.get('fdv', 0):,.2f}", s_val)],
-            [Paragraph("CURRENT PRICE", s_key), Paragraph(f"${float(market.get('price_usd', 0)):.8f}", s_val)],
-            [Paragraph("DEX SOURCE", s_key), Paragraph(market.get('dex_id', 'Unknown').upper(), s_val)]
+            [Paragraph("LIQUIDITY (USD)", S_KEY), Paragraph(liq, S_VAL)],
+            [Paragraph("MARKET CAP (FDV)", S_KEY), Paragraph(f"${market.get('fdv', 0):,.2f}", S_VAL)],
+            [Paragraph("CURRENT PRICE", S_KEY), Paragraph(f"${float(market.get('price_usd', 0)):.8f}", S_VAL)],
+            [Paragraph("DEX SOURCE", S_KEY), Paragraph(market.get('dex_id', 'Unknown').upper(), S_VAL)]
         ]
         t_mkt = Table(market_grid, colWidths=[2.5*inch, 5*inch])
-        t_mkt.setStyle(TableStyle([
-            ('GRID', (0,0), (-1,-1), 0.5, colors.HexColor("#e2e8f0")), 
-            ('TOPPADDING', (0,0), (-1,-1), 8), 
-            ('BOTTOMPADDING', (0,0), (-1,-1), 8), 
-            ('BACKGROUND', (0,0), (-1,3), colors.HexColor("#f0fdf4"))
-        ]))
+        t_mkt.setStyle(MARKET_TABLE_STYLE)
         market_section.append(t_mkt)
         story.append(KeepTogether(market_section))
 
     # 4. REPORT BODY
-    raw_text = audit_data.get('report', '')
-    sections_map = [("🕵️‍♂️ DEPLOYER INTEL", "DEPLOYER INTELLIGENCE"), ("🧠 SMART CONTRACT INTELLIGENCE", "CODE ARCHITECTURE"), ("🚨 THREAT DETECTION", "VULNERABILITY ASSESSMENT"), ("💰 GAS OPTIMIZATION", "GAS EFFICIENCY")]
-
-    for marker, title in sections_map:
-        if marker in raw_text:
-            parts = raw_text.split(marker)
-            if len(parts) > 1:
-                content = parts[1].split("###")[0].strip()
-                story.append(Paragraph(title, s_h2))
-                lines = content.split('\n')
-                table_rows = []
-                for line in lines:
-                    clean = line.replace('*', '').strip()
-                    if not clean or clean.replace('-', '').replace('—', '').strip() == '': continue
-                    
-                    if clean.startswith("(") and clean.endswith(")"):
-                        # Flush table if exists
-                        if table_rows:
-                            story.append(Table(table_rows, colWidths=[2.5*inch, 5*inch], style=TableStyle([('GRID', (0,0), (-1,-1), 0.5, colors.HexColor("#e2e8f0")), ('VALIGN', (0,0), (-1,-1), 'TOP'), ('TOPPADDING', (0,0), (-1,-1), 6), ('BOTTOMPADDING', (0,0), (-1,-1), 6)])))
-                            table_rows = []
-                        story.append(Spacer(1, 8))
-                        story.append(Paragraph(clean.replace("(", "").replace(")", ""), s_val))
-                    elif ":" in clean and len(clean) < 120:
-                        k, v = clean.split(":", 1)
-                        table_rows.append([Paragraph(k.strip(), s_key), Paragraph(v.strip(), s_body)])
-                    else:
-                        # Flush table if exists
-                        if table_rows:
-                            story.append(Table(table_rows, colWidths=[2.5*inch, 5*inch], style=TableStyle([('GRID', (0,0), (-1,-1), 0.5, colors.HexColor("#e2e8f0")), ('VALIGN', (0,0), (-1,-1), 'TOP'), ('TOPPADDING', (0,0), (-1,-1), 6), ('BOTTOMPADDING', (0,0), (-1,-1), 6)])))
-                            table_rows = []
-                        story.append(Paragraph(f"• {clean}", s_body))
-                        story.append(Spacer(1, 4))
-                if table_rows: 
-                    story.append(Table(table_rows, colWidths=[2.5*inch, 5*inch], style=TableStyle([('GRID', (0,0), (-1,-1), 0.5, colors.HexColor("#e2e8f0")), ('VALIGN', (0,0), (-1,-1), 'TOP'), ('TOPPADDING', (0,0), (-1,-1), 6), ('BOTTOMPADDING', (0,0), (-1,-1), 6)])))
+    report_ir = audit_data.get('report_ir') or parse_report(audit_data.get('report', ''))
+
+    for section_id, title in SECTION_TITLES:
+        section = get_section(report_ir, section_id)
+        if section is None:
+            continue
+        story.append(Paragraph(title, S_H2))
+        for block in section["blocks"]:
+            if block["type"] == "table":
+                story.append(_kv_table([[Paragraph(k, S_KEY), Paragraph(v, S_BODY)] for k, v in block["rows"]]))
+            elif block["type"] == "heading":
+                story.append(Spacer(1, 8))
+                story.append(Paragraph(block["text"], S_VAL))
+            else:
+                story.append(Paragraph(f"• {block['text']}", S_BODY))
+                story.append(Spacer(1, 4))
 
     doc.build(story, onFirstPage=draw_background, onLaterPages=draw_background)
-    buffer.seek(0)
-    return buffer
\ No newline at end of file
+    return buffer.getvalue()
+
+def create_audit_pdf(audit_data):
+    # File-like wrapper kept for callers that stream the buffer
+    return BytesIO(render_audit_pdf(audit_data))
@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+from metrics import REGISTRY, traced
+
+load_dotenv()
+
+# --- CONFIGURATION ---
+# 0 workers renders on the thread pool instead (no extra processes)
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Renders queued or running at once; the rest wait instead of piling onto the pool
+PDF_MAX_PENDING = int(os.getenv("PDF_MAX_PENDING", str(max(1, PDF_WORKERS) * 4)))
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Rendered PDFs carry a "Generated" timestamp, so don't serve them forever
+PDF_CACHE_TTL = float(os.getenv("PDF_CACHE_TTL", "3600"))
+
+def payload_key(audit_data):
+    # Canonical JSON, so key order and whitespace don't change the hash
+    canonical = json.dumps(audit_data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+# --- 1. RENDERED PDF CACHE (LRU, bounded by bytes) ---
+class PDFCache:
+    def __init__(self, max_bytes=PDF_CACHE_MAX_BYTES, ttl=PDF_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (expires_at, pdf bytes)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, pdf):
+        if len(pdf) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.time() + self.ttl, pdf)
+            self.size += len(pdf)
+            while self.size > self.max_bytes:
+                self._drop(next(iter(self._data)))
+
+    def _drop(self, key):
+        _, pdf = self._data.pop(key)
+        self.size -= len(pdf)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"entries": len(self._data), "bytes": self.size, "hits": self.hits, "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else 0.0}
+
+# --- 2. RENDER SERVICE ---
+def render_audit_pdf(audit_data):
+    # reportlab is imported by the first render (or warm-up), not at startup
+    from pdf_generator import render_audit_pdf
+    return render_audit_pdf(audit_data)
+
+def _warm_up():
+    # Pays for font loading and the first layout in each worker, not on a request
+    render_audit_pdf({"name": "warm-up", "verdict": "SAFE", "report": ""})
+
+class PDFService:
+    """
+    Renders PDFs off the event loop in a bounded process pool, caching the
+    bytes by payload hash. Identical concurrent requests share one render.
+    """
+    def __init__(self, workers=PDF_WORKERS, max_pending=PDF_MAX_PENDING, cache=None):
+        self.workers = workers
+        self.cache = cache or PDFCache()
+        self._pending = asyncio.Semaphore(max_pending)
+        self._pool = None
+        self._inflight = {}
+        self.rendered = 0
+
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn: forking a server with live threads and sockets is not safe
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=_warm_up)
+        return self._pool
+
+    async def _render(self, audit_data):
+        async with self._pending:
+            if self.workers <= 0:
+                pdf = await run_in_threadpool(render_audit_pdf, audit_data)
+            else:
+                pdf = await asyncio.get_running_loop().run_in_executor(self._get_pool(), render_audit_pdf, audit_data)
+        self.rendered += 1
+        return pdf
+
+    @traced("pdf.render")
+    async def render(self, audit_data):
+        key = payload_key(audit_data)
+        pdf = self.cache.get(key)
+        if pdf is not None:
+            return pdf
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._render(audit_data))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        pdf = await asyncio.shield(task)
+        self.cache.set(key, pdf)
+        return pdf
+
+    def _forget(self, key, task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every waiter went away
+
+    def prewarm(self):
+        # Loads reportlab ahead of the first request when rendering on the
+        # thread pool. Pool workers warm themselves up as the first render
+        # starts them (spawning them at startup breaks unguarded __main__ scripts).
+        if self.workers <= 0:
+            _warm_up()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self):
+        return {"workers": self.workers, "rendered": self.rendered, "in_flight": len(self._inflight), "cache": self.cache.stats()}
+
+PDF_SERVICE = PDFService()
+
+@REGISTRY.collector
+def pdf_metrics():
+    stats = PDF_SERVICE.stats()
+    cache = stats["cache"]
+    lookups = [({"cache": "pdf", "namespace": "pdf", "result": "hit"}, cache["hits"]), ({"cache": "pdf", "namespace": "pdf", "result": "miss"}, cache["misses"])]
+    return [
+        ("cache_lookups_total", "counter", "Cache lookups by result (hit/miss).", lookups),
+        ("cache_entries", "gauge", "Entries held in memory.", [({"cache": "pdf"}, cache["entries"])]),
+        ("pdf_rendered_total", "counter", "PDFs rendered by the worker pool.", [({}, stats["rendered"])]),
+        ("pdf_renders_in_flight", "gauge", "Distinct PDFs being rendered.", [({}, stats["in_flight"])]),
+    ]
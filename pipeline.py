@@ -0,0 +1,422 @@
+import asyncio
+import os
+import time
+from graphlib import TopologicalSorter
+from auditor import (
+    get_contract_source_code, get_contract_creator, get_deployer_wallet,
+    format_deployer_report, get_market_data, get_token_pairs, pick_pair, market_from_pair,
+    analyze_with_gemini_raw, analyze_with_gemini_stream, analysis_context, calculate_risk_score, get_findings,
+    get_contract_creators, get_wallet_balances, get_market_data_batch, get_contract_bytecode, findings_key,
+    CREATION_BATCH, MARKET_BATCH
+)
+from cache import SCAN_CACHE
+from bytecode import analyze_bytecode, bytecode_flags, bytecode_report
+from chains import CHAINS, DEFAULT_CHAIN
+from deployer_index import DEPLOYER_INDEX
+from rules import flags_from_findings, run_rules
+from report_parser import parse_report
+from scheduler import UpstreamError, UpstreamBusy
+from similarity import SIMILARITY_INDEX, fingerprint_source
+from metrics import span
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "20"))
+UNVERIFIED_NAME = "Unverified Contract"
+
+class ContractNotFound(Exception):
+    pass
+
+# --- 1. STAGE RUNNER ---
+async def run_stages(stages):
+    """
+    Runs {name: (deps, coroutine_fn)} as a dependency graph.
+    Each stage starts as soon as its deps finish and gets their results as
+    keyword args, so wall-clock time is the longest chain, not the sum.
+    Returns (results, timings_ms).
+    """
+    graph = {name: deps for name, (deps, _) in stages.items()}
+    for name, deps in graph.items():
+        missing = [d for d in deps if d not in stages]
+        if missing:
+            raise ValueError(f"Stage '{name}' depends on unknown stage(s): {missing}")
+    TopologicalSorter(graph).prepare()  # raises CycleError instead of deadlocking
+
+    tasks = {}
+    timings = {}
+
+    async def run(name):
+        deps, fn = stages[name]
+        inputs = {dep: await tasks[dep] for dep in deps}
+        start = time.perf_counter()
+        try:
+            with span(f"stage.{name}"):
+                return await fn(**inputs)
+        finally:
+            timings[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    for name in stages:
+        tasks[name] = asyncio.ensure_future(run(name))
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+    return {name: task.result() for name, task in tasks.items()}, timings
+
+async def _or_none(coro):
+    # For lookups the response can do without (free-tier market data)
+    try:
+        return await coro
+    except (UpstreamError, UpstreamBusy):
+        return None
+
+# --- 2. REQUEST COALESCING ---
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one in-flight task: the first
+    caller starts the work, followers await the same result (or exception).
+    The task is shielded, so a leader that disconnects doesn't cancel it
+    for everyone else.
+    """
+    def __init__(self):
+        self._inflight = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key, fn):
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.followers += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every waiter went away
+
+    def stats(self):
+        return {"in_flight": len(self._inflight), "leaders": self.leaders, "followers": self.followers}
+
+# --- 3. SCAN PIPELINES ---
+async def _source(address, chain):
+    """
+    (name, source, None) for a verified contract, (None, None, bytecode
+    analysis) for an unverified one. Raises ContractNotFound if there is no
+    code at the address at all.
+    """
+    name, code = await get_contract_source_code(address, chain)
+    if code:
+        return name, code, None
+    bytecode = await get_contract_bytecode(address, chain)
+    if not bytecode: raise ContractNotFound(address)
+    return None, None, analyze_bytecode(bytecode)
+
+def _code_result(address, name, code, bytecode, chain):
+    # The source-derived fields every free result shares
+    if bytecode:
+        return {
+            "name": UNVERIFIED_NAME,
+            "size": bytecode["size"],
+            "verified": False,
+            "basic_flags": bytecode_flags(bytecode),
+            "findings": bytecode["findings"],
+            "bytecode": {key: bytecode[key] for key in ("selectors", "opcodes", "proxy")},
+        }
+    findings = get_findings(address, code, chain)
+    return {"name": name, "size": len(code), "verified": True, "basic_flags": flags_from_findings(findings), "findings": findings}
+
+async def run_free_scan(address, chain=DEFAULT_CHAIN):
+    async def source():
+        return await _source(address, chain)
+
+    async def market():
+        return await _or_none(get_market_data(address, chain))
+
+    results, _ = await run_stages({
+        "source": ((), source),
+        "market": ((), market),
+    })
+    name, code, bytecode = results["source"]
+    return _free_result(address, name, code, results["market"], chain, bytecode)
+
+def _free_result(address, name, code, market, chain, bytecode=None):
+    facts = _code_result(address, name, code, bytecode, chain)
+    return {"name": facts.pop("name"), "chain": chain, "market": market, **facts, "status": "Active"}
+
+async def run_chain_sweep(address, chains=None):
+    """
+    Free scan of one address on every supported chain at once. DexScreener
+    returns every chain's pairs in one response, so the sweep costs one
+    market call plus one source lookup per chain (with the same bytecode
+    fallback as a free scan for unverified contracts). Returns one entry per
+    chain, with "error" where there is no code at the address (or the chain
+    is unreachable).
+    """
+    chains = chains or list(CHAINS)
+
+    async def source(chain):
+        try:
+            return await _source(address, chain)
+        except ContractNotFound:
+            return {"chain": chain, "error": "Contract not found"}
+        except (UpstreamError, UpstreamBusy) as e:
+            return {"chain": chain, "error": str(e)}
+
+    pairs, *sources = await asyncio.gather(_or_none(get_token_pairs(address)), *(source(chain) for chain in chains))
+    results = []
+    for chain, found in zip(chains, sources):
+        if isinstance(found, dict):
+            results.append(found)
+        else:
+            name, code, bytecode = found
+            pair = pick_pair(pairs, address, chain) if pairs else None
+            results.append(_free_result(address, name, code, market_from_pair(pair) if pair else None, chain, bytecode))
+    return results
+
+def prepare_source(code):
+    """
+    The CPU-bound work on verified source a Pro scan does before the AI call:
+    rule findings and the near-duplicate fingerprint (source ingest and
+    MinHash). No I/O or shared state, so it can run in a worker process.
+    """
+    return run_rules(code), fingerprint_source(code)
+
+def _pro_stages(address, chain=DEFAULT_CHAIN, emit=None, pool=None):
+    """
+    Pro scan as a stage graph (an unverified contract gets a bytecode
+    analysis from the source stage and a report written from it, no AI):
+
+        source ─┬─> findings
+                └───────────────────────────┐
+        market ─────────────────────────────┼─> analysis
+        creator ─┬─> wallet ───┬─> deployer ┘
+                 └─> history ──┘
+
+    `wallet` (balance and tx count) comes from the deployer index while it's
+    fresh; `history` (the deployer's earlier verdicts) always does.
+
+    With `emit`, every stage also reports its partial result as an event as
+    soon as it finishes, and the report is streamed token by token. With
+    `pool`, the source stage runs prepare_source there and caches the result
+    for the findings and analysis stages.
+    """
+    async def source():
+        name, code, bytecode = await _source(address, chain)
+        if pool and code:
+            findings, fingerprint = await asyncio.get_running_loop().run_in_executor(pool, prepare_source, code)
+            SCAN_CACHE.set("findings", findings_key(address, chain), findings)
+            SIMILARITY_INDEX.prime(code, fingerprint)
+        if emit: emit({"event": "source", "name": name or UNVERIFIED_NAME, "size": len(code) if code else bytecode["size"], "verified": bool(code)})
+        return name, code, bytecode
+
+    async def findings(source):
+        name, code, bytecode = source
+        facts = _code_result(address, name, code, bytecode, chain)
+        if emit: emit({"event": "flags", "basic_flags": facts["basic_flags"], "findings": facts["findings"]})
+        return facts["findings"]
+
+    async def market():
+        market = await get_market_data(address, chain)
+        if emit: emit({"event": "market", "market": market})
+        return market
+
+    # Upstream failures propagate so a paid scan is never scored on missing
+    # data; the API answers 503 and no credit is taken.
+    async def creator():
+        return await get_contract_creator(address, chain)
+
+    async def wallet(creator):
+        return await get_deployer_wallet(creator, chain) if creator else None
+
+    async def history(creator):
+        return DEPLOYER_INDEX.history(creator, address, chain) if creator else None
+
+    async def deployer(creator, wallet, history):
+        if creator is None or wallet is None:
+            report = "Deployer info unavailable."
+        else:
+            report = format_deployer_report(creator, *wallet, chain, history)
+        if emit: emit({"event": "deployer", "deployer": report})
+        return report
+
+    async def analysis(source, deployer, market):
+        name, code, bytecode = source
+        if bytecode:
+            # Nothing for the model to read; the bytecode findings are the report
+            report = bytecode_report(bytecode)
+            if emit: emit({"event": "report", "text": report})
+            return report
+        full_context = analysis_context(deployer, market)
+        if not emit:
+            return await analyze_with_gemini_raw(name, code, deployer_report=full_context)
+        parts = []
+        async for text in analyze_with_gemini_stream(name, code, deployer_report=full_context):
+            parts.append(text)
+            emit({"event": "report", "text": text})
+        return "".join(parts)
+
+    return {
+        "source": ((), source),
+        "findings": (("source",), findings),
+        "market": ((), market),
+        "creator": ((), creator),
+        "wallet": (("creator",), wallet),
+        "history": (("creator",), history),
+        "deployer": (("creator", "wallet", "history"), deployer),
+        "analysis": (("source", "deployer", "market"), analysis),
+    }
+
+def _pro_result(address, results, timings, chain=DEFAULT_CHAIN):
+    # Parsing and scoring only, no side effects: can run in a worker process
+    name, code, bytecode = results["source"]
+    market_raw = results["market"]
+    audit_report = results["analysis"]
+    # Parsed once here; scoring, the API response and the PDF all reuse it
+    report_ir = parse_report(audit_report)
+    balance, tx_count = results["wallet"] or (None, None)
+    history = results["history"] or {}
+    deployer = {"balance_eth": balance, "tx_count": tx_count,
+                "prior_tokens": history.get("tokens"), "prior_critical": history.get("critical")}
+    # A bytecode report is a summary of the findings, not evidence to score twice
+    risk_data = calculate_risk_score(market_raw, deployer, None if bytecode else report_ir, results["findings"], bytecode)
+    return {
+        "name": name or UNVERIFIED_NAME,
+        "chain": chain,
+        "size": len(code) if code else bytecode["size"],
+        "verified": not bytecode,
+        "status": "Active",
+        "risk_level": risk_data["verdict"],
+        "score": risk_data["score"],
+        "score_reasons": risk_data["breakdown"],
+        "score_version": risk_data["version"],
+        "features": risk_data["features"],
+        "report": audit_report,
+        "report_ir": report_ir,
+        "market": market_raw,
+        "timings": timings,
+    }
+
+def _record_verdict(address, creator, result, chain):
+    if creator:
+        # The verdict the deployer's next token is judged by
+        DEPLOYER_INDEX.record_deployment(creator, address, chain, result["risk_level"], result["score"])
+    return result
+
+async def run_pro_scan(address, chain=DEFAULT_CHAIN, pool=None):
+    """
+    With `pool` (a process pool), the CPU-bound steps run there: rules,
+    ingest and MinHash before the AI call, parsing and scoring after it.
+    """
+    start = time.perf_counter()
+    results, timings = await run_stages(_pro_stages(address, chain, pool=pool))
+    timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+    if pool:
+        result = await asyncio.get_running_loop().run_in_executor(pool, _pro_result, address, results, timings, chain)
+    else:
+        result = _pro_result(address, results, timings, chain)
+    return _record_verdict(address, results["creator"], result, chain)
+
+async def stream_pro_scan(address, chain=DEFAULT_CHAIN):
+    """
+    Pro scan as a stream of events: source, flags, market, deployer, then
+    report deltas while Gemini writes, and finally "result" with the same
+    payload run_pro_scan returns. Stage errors are raised after the events
+    that came before them.
+    """
+    events = asyncio.Queue()
+    start = time.perf_counter()
+    graph = asyncio.ensure_future(run_stages(_pro_stages(address, chain, emit=events.put_nowait)))
+    graph.add_done_callback(lambda _: events.put_nowait(None))
+    try:
+        while (event := await events.get()) is not None:
+            yield event
+        results, timings = graph.result()
+        timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+        yield {"event": "result", **_record_verdict(address, results["creator"], _pro_result(address, results, timings, chain), chain)}
+    finally:
+        # Client went away mid-scan: stop the upstream work too
+        graph.cancel()
+
+async def run_batch_scan(addresses, chain=DEFAULT_CHAIN):
+    """
+    Free-tier scan of many addresses. Yields one result per address as soon
+    as it's ready (completion order, not input order).
+
+    Market data is fetched per group of MARKET_BATCH addresses, creators and
+    their balances per chunk of CREATION_BATCH, with the multi-address
+    endpoints; only the source lookup is per address. A row waits for its own
+    chunk, not the whole batch. Creators and balances are filed in the
+    deployer index (no verdict: free scans aren't scored). A row whose market
+    or deployer lookup failed lists it under "degraded".
+    """
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def lookup_markets(group):
+        async with semaphore:
+            return await get_market_data_batch(group, chain)
+
+    # Two chunks' lookups in flight keep the next chunk ready without
+    # queuing ahead of the current chunk's sources at Etherscan
+    lookups = asyncio.Semaphore(2)
+
+    async def lookup_deployers(chunk):
+        async with lookups:
+            creators = await get_contract_creators(chunk, chain)
+            found = {contract: deployer for contract, deployer in creators.items() if deployer}
+            balances = await get_wallet_balances(list(set(found.values())), chain)
+        DEPLOYER_INDEX.record_wallets(chain, [(deployer, balance, None) for deployer, balance in balances.items()])
+        DEPLOYER_INDEX.record_deployments(chain, [(contract, deployer, None, None) for contract, deployer in found.items()])
+        return creators, balances
+
+    async def scan_one(address):
+        try:
+            creators, balances = await deployer_tasks[address]
+            async with semaphore:
+                name, code, bytecode = await _source(address, chain)
+            markets = await market_tasks[address]
+        except ContractNotFound:
+            return {"address": address, "error": "Contract not found"}
+        except Exception as e:
+            return {"address": address, "error": str(e)}
+
+        creator = creators.get(address.lower())
+        degraded = [part for part, ok in (
+            ("market", address.lower() in markets),
+            ("deployer", address.lower() in creators and (not creator or creator.lower() in balances)),
+        ) if not ok]
+        facts = _code_result(address, name, code, bytecode, chain)
+        return {
+            "address": address,
+            "chain": chain,
+            "name": facts.pop("name"),
+            "market": markets.get(address.lower()),
+            "deployer": {"address": creator, "balance_eth": balances.get(creator.lower())} if creator else None,
+            **facts,
+            "status": "Active",
+            **({"degraded": degraded} if degraded else {}),
+        }
+
+    market_tasks, deployer_tasks, tasks = {}, {}, []
+    for i in range(0, len(addresses), CREATION_BATCH):
+        chunk = addresses[i:i + CREATION_BATCH]
+        for j in range(i, i + len(chunk)):
+            if j % MARKET_BATCH == 0:
+                group = addresses[j:j + MARKET_BATCH]
+                market_tasks.update(dict.fromkeys(group, asyncio.ensure_future(lookup_markets(group))))
+        deployer_tasks.update(dict.fromkeys(chunk, asyncio.ensure_future(lookup_deployers(chunk))))
+        tasks.extend(asyncio.ensure_future(scan_one(address)) for address in chunk)
+
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Client went away (or we're done): don't leave orphaned upstream calls behind
+        for task in [*tasks, *market_tasks.values(), *deployer_tasks.values()]:
+            task.cancel()
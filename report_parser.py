@@ -0,0 +1,162 @@
+import re
+
+IR_VERSION = 1
+
+# Sections the prompt asks Gemini for: (id, emoji marker, label). Headings are
+# matched on the label, so a different emoji variant still lands in the right place.
+SECTIONS = [
+    ("deployer", "🕵️‍♂️ DEPLOYER INTEL", "DEPLOYER INTEL"),
+    ("contract", "🧠 SMART CONTRACT INTELLIGENCE", "SMART CONTRACT INTELLIGENCE"),
+    ("threats", "🚨 THREAT DETECTION", "THREAT DETECTION"),
+    ("gas", "💰 GAS OPTIMIZATION", "GAS OPTIMIZATION"),
+]
+
+# Phrases calculate_risk_score looks for, collected during the same pass
+SIGNALS = {
+    "critical_risk": "critical risk",
+    "caution": "caution",
+    "infinite_mint": "infinite mint",
+    "minting_enabled": "minting enabled",
+    "blacklist": "blacklist",
+}
+
+_VERDICT_RE = re.compile(r"AUDIT VERDICT:?(.*)", re.IGNORECASE)
+_BULLET_RE = re.compile(r"^(?:[-•]|\d+\.)\s+")
+
+def _section_for(heading):
+    upper = heading.upper()
+    for section_id, marker, label in SECTIONS:
+        if label in upper:
+            return section_id, marker
+    return None, None
+
+def _heading(line):
+    # Section headings are "### ..." lines, or the emoji marker anywhere:
+    # (section id, marker), (None, None) for any other heading, None for content
+    section_id, marker = _section_for(line) if line.startswith("#") else (None, None)
+    if section_id is None:
+        for candidate_id, candidate_marker, _ in SECTIONS:
+            if candidate_marker in line:
+                return candidate_id, candidate_marker
+    if section_id is not None or line.startswith("#"):
+        return section_id, marker
+    return None
+
+def parse_report(text):
+    """
+    Turns a Gemini markdown report into the IR, reading it once:
+
+        {"version": 1, "verdict": "CAUTION" | None,
+         "sections": [{"id": "threats", "heading": ..., "blocks": [
+             {"type": "heading", "text": "Owner Privileges"},
+             {"type": "table", "rows": [["Mint", "Owner can mint"], ...]},
+             {"type": "bullet", "text": "..."}]}],
+         "signals": {"critical_risk": False, ...}}
+
+    Lines are classified the way the PDF always rendered them: "(...)" is a
+    sub-heading, short "key: value" lines form a table, anything else is a
+    bullet. A section that appears twice is merged instead of dropped.
+    """
+    sections = {}
+    order = []
+    signals = dict.fromkeys(SIGNALS, False)
+    verdict = None
+    want_verdict = False
+    current = None  # blocks list of the section being filled, None outside known sections
+    table = None  # rows of the table block being filled
+
+    for raw_line in (text or "").splitlines():
+        lower = raw_line.lower()
+        for name, phrase in SIGNALS.items():
+            if not signals[name] and phrase in lower:
+                signals[name] = True
+
+        line = raw_line.strip()
+        verdict_match = _VERDICT_RE.search(line)
+        if verdict_match and verdict is None:
+            verdict = verdict_match.group(1).replace("*", "").replace("#", "").strip().upper() or None
+            want_verdict = verdict is None
+            current, table = None, None
+            continue
+        if want_verdict and line:
+            verdict = line.replace("*", "").strip().upper()
+            want_verdict = False
+
+        heading = _heading(line)
+        if heading is not None:
+            section_id, marker = heading
+            table = None
+            if section_id is None:
+                current = None  # some other heading: its lines belong to no section
+                continue
+            if section_id not in sections:
+                sections[section_id] = {"id": section_id, "heading": line.lstrip("#").replace("*", "").strip(), "blocks": []}
+                order.append(section_id)
+            current = sections[section_id]["blocks"]
+            # Text after the marker on the heading line is content too
+            line = line.split(marker, 1)[1].strip() if marker in line else ""
+            if not line:
+                continue
+
+        if current is None:
+            continue
+        clean = _BULLET_RE.sub("", line.replace("*", "").strip())
+        if not clean or clean.replace("-", "").replace("—", "").strip() == "":
+            continue
+        if clean.startswith("(") and clean.endswith(")"):
+            table = None
+            current.append({"type": "heading", "text": clean.replace("(", "").replace(")", "")})
+        elif ":" in clean and len(clean) < 120:
+            key, value = clean.split(":", 1)
+            if table is None:
+                table = []
+                current.append({"type": "table", "rows": table})
+            table.append([key.strip(), value.strip()])
+        else:
+            table = None
+            current.append({"type": "bullet", "text": clean})
+
+    return {
+        "version": IR_VERSION,
+        "verdict": verdict,
+        "sections": [sections[section_id] for section_id in order],
+        "signals": signals,
+    }
+
+def get_section(report_ir, section_id):
+    for section in report_ir.get("sections", []):
+        if section["id"] == section_id:
+            return section
+    return None
+
+class SectionFilter:
+    """
+    Drops one section from a report as it streams past: feed() it text
+    deltas and get back what can be shown so far, then flush() at the end.
+    Lines are held until complete and classified the way parse_report reads
+    them, so the section ends at the next heading or at the verdict.
+    """
+    def __init__(self, section_id):
+        self.section_id = section_id
+        self._dropping = False
+        self._partial = ""
+
+    def _keep(self, line):
+        line = line.strip()
+        if _VERDICT_RE.search(line):
+            self._dropping = False
+        elif (heading := _heading(line)) is not None:
+            self._dropping = heading[0] == self.section_id
+        return not self._dropping
+
+    def feed(self, text):
+        *lines, self._partial = (self._partial + text).split("\n")
+        return "".join(f"{line}\n" for line in lines if self._keep(line))
+
+    def flush(self):
+        line, self._partial = self._partial, ""
+        return line if line and self._keep(line) else ""
+
+def drop_section(text, section_id):
+    section_filter = SectionFilter(section_id)
+    return section_filter.feed(text or "") + section_filter.flush()
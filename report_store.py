@@ -0,0 +1,143 @@
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+from cache import MemoryCache
+from metrics import REGISTRY
+
+load_dotenv()
+
+DEFAULT_PROMPT_TEMPLATE = "Analyze the contract {contract_name}. Code: {safe_code}"
+
+# Strings are matched first so "//" inside a string literal isn't treated as a comment
+_COMMENT_RE = re.compile(r'("(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\')|//[^\n]*|/\*.*?\*/', re.DOTALL)
+
+def get_prompt_template():
+    return os.getenv("SYSTEM_PROMPT") or DEFAULT_PROMPT_TEMPLATE
+
+def normalize_source(source_code):
+    """
+    Drops comments, trailing whitespace and blank lines, so clones that only
+    differ in license headers or formatting hash the same.
+    """
+    code = _COMMENT_RE.sub(lambda m: m.group(1) or "", source_code.replace("\r\n", "\n"))
+    return "\n".join(line.rstrip() for line in code.split("\n") if line.strip())
+
+def prompt_version(prompt_template):
+    return hashlib.sha256(prompt_template.encode()).hexdigest()[:16]
+
+def report_keys(source_code, prompt_template, models):
+    # Code only: deployer and market data change by the minute and are added
+    # to the report per scan (see auditor.analyze_with_gemini_raw). The source
+    # is normalized once for every candidate model.
+    normalized = normalize_source(source_code)
+    keys = []
+    for model in models:
+        digest = hashlib.sha256()
+        for part in (normalized, prompt_template, model):
+            digest.update(part.encode())
+            digest.update(b"\x00")
+        keys.append(digest.hexdigest())
+    return keys
+
+def report_key(source_code, prompt_template, model):
+    return report_keys(source_code, prompt_template, [model])[0]
+
+class ReportStore:
+    """
+    Gemini reports keyed by hash(normalized source, prompt template, model).
+    Memory LRU in front of an optional SQLite table.
+    """
+    def __init__(self, db_path=None, max_entries=2000):
+        self.memory = MemoryCache(max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._lock = threading.Lock()
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS reports (key TEXT PRIMARY KEY, prompt_version TEXT NOT NULL, model TEXT NOT NULL, report TEXT NOT NULL, created_at REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS reports_prompt_version ON reports (prompt_version)")
+            self._conn.commit()
+
+    def get(self, source_code, prompt_template, models):
+        """
+        Returns the cached report for the first candidate model that has one, else None.
+        """
+        for key in report_keys(source_code, prompt_template, models):
+            entry = self.memory.get(key)
+            if entry is None and self._conn:
+                with self._lock:
+                    row = self._conn.execute("SELECT report FROM reports WHERE key = ?", (key,)).fetchone()
+                if row:
+                    self.memory.set(key, row[0], None)
+                    entry = (None, row[0])
+            if entry is not None:
+                self.hits += 1
+                return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, source_code, prompt_template, model, report):
+        key = report_key(source_code, prompt_template, model)
+        self.memory.set(key, report, None)
+        if self._conn:
+            with self._lock:
+                self._conn.execute("INSERT OR REPLACE INTO reports (key, prompt_version, model, report, created_at) VALUES (?, ?, ?, ?, ?)",
+                                   (key, prompt_version(prompt_template), model, report, time.time()))
+                self._conn.commit()
+
+    def purge_stale(self, prompt_template):
+        """
+        Drops every report made with a different prompt template.
+        Stale reports are already unreachable (the template is part of the key),
+        this just reclaims the space. Returns the number of rows removed.
+        """
+        self.memory.clear()
+        if not self._conn:
+            return 0
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM reports WHERE prompt_version != ?", (prompt_version(prompt_template),))
+            self._conn.commit()
+        return cur.rowcount
+
+    def clear(self):
+        self.memory.clear()
+        if self._conn:
+            with self._lock:
+                self._conn.execute("DELETE FROM reports")
+                self._conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"entries": len(self.memory), "hits": self.hits, "misses": self.misses, "hit_ratio": round(self.hits / total, 3) if total else 0.0}
+
+REPORT_STORE = ReportStore(db_path=os.getenv("REPORT_STORE_DB"))
+
+@REGISTRY.collector
+def report_store_metrics():
+    lookups = [({"cache": "reports", "namespace": "gemini", "result": "hit"}, REPORT_STORE.hits),
+               ({"cache": "reports", "namespace": "gemini", "result": "miss"}, REPORT_STORE.misses)]
+    return [
+        ("cache_lookups_total", "counter", "Cache lookups by result (hit/miss).", lookups),
+        ("cache_entries", "gauge", "Entries held in memory.", [({"cache": "reports"}, len(REPORT_STORE.memory))]),
+    ]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the Gemini report store (REPORT_STORE_DB).")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--purge-stale", action="store_true", help="drop reports made with a different SYSTEM_PROMPT")
+    group.add_argument("--clear", action="store_true", help="drop every stored report")
+    args = parser.parse_args()
+
+    if args.clear:
+        REPORT_STORE.clear()
+        print("🧹 Report store cleared.")
+    else:
+        removed = REPORT_STORE.purge_stale(get_prompt_template())
+        print(f"🧹 Removed {removed} stale report(s).")
@@ -0,0 +1,134 @@
+import bisect
+import hashlib
+import json
+import re
+from source_ingest import parse_source_files, is_vendored
+
+# --- 1. RULE SET ---
+# Each rule matches whole identifiers (lowercased, leading underscores dropped)
+# outside comments and string literals. `keywords` feed the shared scanner,
+# `pattern` decides whether the identifier around a keyword really counts.
+RULES = [
+    {
+        "id": "centralized_control",
+        "severity": "low",
+        "keywords": ["onlyowner"],
+        "pattern": r"onlyowner",
+        "flag": "👑 **Centralized Control:** Functions are restricted to the Owner.",
+    },
+    {
+        "id": "mint",
+        "severity": "high",
+        "keywords": ["mint"],
+        "pattern": r"mint(?:to|for|tokens?|rewards?)?",
+        "flag": "🖨️ **Mint Function:** Contract *might* be able to print more tokens.",
+    },
+    {
+        "id": "pausable",
+        "severity": "high",
+        "keywords": ["pause", "trading"],
+        "pattern": r"(?:un)?pause[ds]?|when(?:not)?paused|tradingopen|tradingenabled|(?:open|enable)trading",
+        "flag": "⏸️ **Pausable:** Trading can potentially be stopped.",
+    },
+    {
+        "id": "blacklist",
+        "severity": "high",
+        "keywords": ["blacklist", "blocklist", "bot"],
+        "pattern": r"\w*(?:blacklist|blocklist)\w*|isbot\w*|(?:add|del|remove|set)?bots?",
+        "flag": "🚫 **Blacklist:** Specific wallets can be blocked.",
+    },
+    {
+        "id": "tax_modifiable",
+        "severity": "medium",
+        "keywords": ["tax", "fee"],
+        "pattern": r"(?:set|update|change)\w*(?:tax|fee)\w*",
+        "flag": "💸 **Tax Modifiable:** Buy/Sell fees can be changed.",
+    },
+]
+
+# --- 2. COMPILE ---
+# Comments and string literals are consumed by the scanner so keywords inside them never match
+_SKIP = r'//[^\n]*|/\*[^*]*\*+(?:[^/*][^*]*\*+)*/|"[^"\\\n]*(?:\\.[^"\\\n]*)*"|\'[^\'\\\n]*(?:\\.[^\'\\\n]*)*\''
+
+def compile_rules(rules, flags=0):
+    """
+    Builds one scanner regex that skips comments/strings and finds every rule
+    keyword in the same pass, so a source is read once. Every alternative
+    starts with a literal, which lets the regex engine jump between candidates.
+    """
+    keywords = sorted({k for rule in rules for k in rule["keywords"]}, key=len, reverse=True)
+    scanner = re.compile(_SKIP + "|" + "|".join(map(re.escape, keywords)), flags)
+    classifiers = [(rule, re.compile(rule["pattern"])) for rule in rules]
+    return scanner, classifiers
+
+# ASCII sources (nearly all of them) are scanned lowercased, which is much
+# faster than IGNORECASE; anything else falls back to the IGNORECASE scanner.
+_SCANNER, _CLASSIFIERS = compile_rules(RULES)
+_SCANNER_IC, _ = compile_rules(RULES, re.IGNORECASE)
+_IDENT_TAIL = re.compile(r"[\w$]*")
+_IDENT_CHARS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_$")
+_IDENT_CACHE = {}
+
+def classify_identifier(identifier):
+    """
+    Rules a single identifier triggers (also used for function names recovered from bytecode).
+    """
+    rules = _IDENT_CACHE.get(identifier)
+    if rules is None:
+        name = identifier.lower().lstrip("_")
+        rules = tuple(rule for rule, pattern in _CLASSIFIERS if pattern.fullmatch(name))
+        if len(_IDENT_CACHE) < 100000:
+            _IDENT_CACHE[identifier] = rules
+    return rules
+
+# --- 3. SCAN ---
+def scan_code(code, path=None):
+    """
+    Single pass over one file. Returns findings with 1-based line numbers.
+    """
+    if code.isascii():
+        text, scanner = code.lower(), _SCANNER
+    else:
+        text, scanner = code, _SCANNER_IC
+
+    findings = []
+    seen = set()
+    newlines = None
+    ident_end = -1
+    for match in scanner.finditer(text):
+        start, end = match.span()
+        if text[start] in "/\"'" or start < ident_end:
+            continue  # comment/string, or a second keyword inside the same identifier
+        # Widen the keyword to its whole identifier (addToBlacklist, _isBot, setBuyFee)
+        while start and text[start - 1] in _IDENT_CHARS:
+            start -= 1
+        ident_end = end = _IDENT_TAIL.match(text, end).end()
+        rules = classify_identifier(text[start:end])
+        if not rules:
+            continue
+        if newlines is None:
+            newlines = [m.start() for m in re.finditer("\n", text)]
+        line = bisect.bisect_right(newlines, start) + 1
+        for rule in rules:
+            if (rule["id"], line) not in seen:
+                seen.add((rule["id"], line))
+                findings.append({"rule": rule["id"], "severity": rule["severity"], "path": path, "line": line, "match": code[start:end]})
+    return findings
+
+def run_rules(source_code):
+    """
+    Runs the rule set over every non-vendored file in an Etherscan source blob.
+    """
+    files = parse_source_files(source_code)
+    project = [(path, content) for path, content in files if not is_vendored(path)] or files
+    findings = []
+    for path, content in project:
+        findings.extend(scan_code(content, path if len(files) > 1 else None))
+    return findings
+
+# Cached findings (auditor.get_findings) are keyed by this, so editing RULES re-scans everything
+RULESET_VERSION = hashlib.sha256(json.dumps(RULES, sort_keys=True).encode()).hexdigest()[:12]
+
+def flags_from_findings(findings):
+    hit = {f["rule"] for f in findings}
+    return [rule["flag"] for rule in RULES if rule["id"] in hit]
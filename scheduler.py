@@ -0,0 +1,305 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+import httpx
+from dotenv import load_dotenv
+from upstream import get_client
+from metrics import REGISTRY, UPSTREAM_IN_FLIGHT, UPSTREAM_SECONDS, UPSTREAM_WAIT_SECONDS, add_trace
+from chains import CHAINS, resolve_chain
+
+load_dotenv()
+
+# --- PRIORITY LANES ---
+# Lower runs first. Handlers set PRIORITY once; every upstream call made while
+# serving that request (including from child tasks) inherits it.
+PRIORITY_PRO = 0
+PRIORITY_FREE = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY = contextvars.ContextVar("upstream_priority", default=PRIORITY_FREE)
+
+class UpstreamBusy(Exception):
+    """The provider's queue is full: shed load instead of piling up."""
+
+class UpstreamError(Exception):
+    """The provider kept failing after every retry."""
+
+def _keys(multi_env, single_env):
+    keys = [k.strip() for k in os.getenv(multi_env, "").split(",") if k.strip()]
+    return keys or ([os.getenv(single_env)] if os.getenv(single_env) else [None])
+
+# --- PROVIDER BUDGETS ---
+# rate is requests/second per API key; the bucket scales with the key pool.
+PROVIDERS = {
+    "etherscan": {
+        "keys": _keys("ETHERSCAN_API_KEYS", "ETHERSCAN_API_KEY"),
+        "key_param": "apikey",
+        "rate": float(os.getenv("ETHERSCAN_RATE_PER_KEY", "5")),
+        "retries": int(os.getenv("ETHERSCAN_RETRIES", "3")),
+    },
+    "dexscreener": {
+        "keys": [None],
+        "key_param": None,
+        "rate": float(os.getenv("DEXSCREENER_RATE", "5")),
+        "retries": int(os.getenv("DEXSCREENER_RETRIES", "2")),
+    },
+    "gemini": {
+        "keys": _keys("GEMINI_API_KEYS", "GEMINI_API_KEY"),
+        "key_param": "key",
+        "rate": float(os.getenv("GEMINI_RATE_PER_KEY", "5")),
+        "retries": int(os.getenv("GEMINI_RETRIES", "1")),
+    },
+}
+# Etherscan v2 serves every chain from one host with one set of keys. Each chain
+# gets its own scheduler (connection pool, bucket, stats) so a flood of BSC
+# scans can't starve Ethereum; ETHERSCAN_RATE_PER_KEY_<CHAIN> narrows a chain's
+# share and ETHERSCAN_API_KEYS_<CHAIN> gives it keys of its own.
+PER_CHAIN = {"etherscan"}
+MAX_QUEUE = int(os.getenv("UPSTREAM_MAX_QUEUE", "1000"))
+BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.25"))
+BACKOFF_CAP = float(os.getenv("UPSTREAM_BACKOFF_CAP", "4"))
+
+# --- 1. TOKEN BUCKET WITH PRIORITY QUEUE ---
+class TokenBucket:
+    def __init__(self, rate, burst=None, max_queue=MAX_QUEUE):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.max_queue = max_queue
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._timer = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def queued(self):
+        return len(self._waiters)
+
+    def spare(self):
+        """
+        Fraction of the burst that's free right now, 0 when anyone is waiting.
+        """
+        self._refill()
+        return 0.0 if self._waiters else self.tokens / self.burst
+
+    async def acquire(self, priority=PRIORITY_FREE):
+        self._refill()
+        if not self._waiters and self.tokens >= 1:
+            self.tokens -= 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise UpstreamBusy(f"{len(self._waiters)} requests already queued")
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._schedule()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.tokens += 1  # granted just as we were cancelled: hand it back
+            raise
+
+    def release(self):
+        """
+        Hands back a token taken by acquire() that went unused.
+        """
+        self._refill()
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    def _schedule(self):
+        if self._timer is None and self._waiters:
+            delay = max(0.0, (1 - self.tokens) / self.rate)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._release)
+
+    def _release(self):
+        self._timer = None
+        self._refill()
+        while self._waiters and self.tokens >= 1:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue  # waiter was cancelled
+            self.tokens -= 1
+            future.set_result(None)
+        self._schedule()
+
+# --- 2. API KEY POOL ---
+class KeyPool:
+    def __init__(self, keys):
+        self.keys = keys
+        self._next = itertools.cycle(range(len(keys)))
+        self._cooling = {}
+
+    def take(self):
+        """
+        Next key in round-robin order, skipping keys that were rate limited.
+        """
+        now = time.monotonic()
+        for _ in range(len(self.keys)):
+            key = self.keys[next(self._next)]
+            if self._cooling.get(key, 0) <= now:
+                return key
+        return min(self.keys, key=lambda k: self._cooling.get(k, 0))
+
+    def cool_down(self, key, seconds):
+        self._cooling[key] = time.monotonic() + seconds
+
+# --- 3. SCHEDULER ---
+def _retry_delay(attempt, retry_after=None):
+    if retry_after:
+        try:
+            return min(BACKOFF_CAP, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))  # full jitter
+
+def _is_throttled(provider, response):
+    if response.status_code == 429 or response.status_code >= 500:
+        return True
+    if not response.is_stream_consumed:
+        return False  # streamed body: only the status line is available
+    # Etherscan reports rate limits as HTTP 200 with status "0"
+    return provider == "etherscan" and b"rate limit" in response.content[:300].lower()
+
+class Scheduler:
+    def __init__(self, provider, keys, key_param, rate, retries, shared=None):
+        self.provider = provider
+        self.kind = provider.split(":")[0]
+        self.key_param = key_param
+        self.retries = retries
+        self.keys = KeyPool(keys)
+        self.bucket = TokenBucket(rate * len(keys))
+        self.shared = shared  # provider-wide bucket when the keys are shared with other chains
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "failures": 0, "shed": 0}
+
+    async def request(self, method, url, params=None, **kwargs):
+        """
+        Rate-limited request with retries. Returns the httpx.Response for
+        anything that isn't a throttle / 5xx / transport error; raises
+        UpstreamError once retries run out and UpstreamBusy under backpressure.
+        """
+        return await self._send(method, url, params, False, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method, url, params=None, **kwargs):
+        """
+        Same as request(), but the body is left unread for aiter_text() and
+        friends. Retries only happen before the body starts streaming.
+        """
+        response = await self._send(method, url, params, True, **kwargs)
+        try:
+            yield response
+        finally:
+            await response.aclose()
+
+    async def _send(self, method, url, params, stream, **kwargs):
+        params = dict(params or {})
+        client = get_client(self.provider)
+        last_error = None
+        for attempt in range(self.retries + 1):
+            queued_at = time.perf_counter()
+            try:
+                await self.bucket.acquire(PRIORITY.get())
+                if self.shared:
+                    try:
+                        await self.shared.acquire(PRIORITY.get())
+                    except (UpstreamBusy, asyncio.CancelledError):
+                        self.bucket.release()  # shed or cancelled: the chain's token went unused
+                        raise
+            except UpstreamBusy:
+                self.stats["shed"] += 1
+                raise
+            key = self.keys.take()
+            if self.key_param and key:
+                params[self.key_param] = key
+            self.stats["requests"] += 1
+            retry_after = None
+            sent_at = time.perf_counter()
+            UPSTREAM_WAIT_SECONDS.observe(sent_at - queued_at, self.provider)
+            UPSTREAM_IN_FLIGHT.inc(self.provider)
+            outcome = "cancelled"
+            try:
+                response = await client.send(client.build_request(method, url, params=params, **kwargs), stream=stream)
+            except httpx.HTTPError as e:
+                last_error = f"{type(e).__name__}: {e}"
+                outcome = "error"
+            else:
+                outcome = "throttled" if _is_throttled(self.kind, response) else "ok"
+            finally:
+                elapsed = time.perf_counter() - sent_at
+                UPSTREAM_IN_FLIGHT.dec(self.provider)
+                UPSTREAM_SECONDS.observe(elapsed, self.provider, outcome)
+                add_trace(f"upstream.{self.kind}", elapsed)
+            if outcome == "ok":
+                return response
+            if outcome == "throttled":
+                await response.aclose()
+                self.stats["throttled"] += 1
+                last_error = f"HTTP {response.status_code}"
+                retry_after = response.headers.get("Retry-After")
+                if key and len(self.keys.keys) > 1:
+                    self.keys.cool_down(key, max(1.0, _retry_delay(attempt, retry_after)))
+            if attempt < self.retries:
+                self.stats["retries"] += 1
+                await asyncio.sleep(_retry_delay(attempt, retry_after))
+        self.stats["failures"] += 1
+        raise UpstreamError(f"{self.provider} unavailable ({last_error})")
+
+SHARED_BUCKETS = {}
+
+def _build_schedulers():
+    schedulers = {}
+    for name, cfg in PROVIDERS.items():
+        if name not in PER_CHAIN:
+            schedulers[name] = Scheduler(name, **cfg)
+            continue
+        shared = SHARED_BUCKETS[name] = TokenBucket(cfg["rate"] * len(cfg["keys"]))
+        for chain in CHAINS:
+            suffix = f"{name.upper()}_{{}}_{chain.upper()}"
+            own_keys = _keys(suffix.format("API_KEYS"), suffix.format("API_KEY"))
+            rate = float(os.getenv(suffix.format("RATE_PER_KEY"), cfg["rate"]))
+            if own_keys != [None]:
+                schedulers[f"{name}:{chain}"] = Scheduler(f"{name}:{chain}", own_keys, cfg["key_param"], rate, cfg["retries"])
+            else:
+                schedulers[f"{name}:{chain}"] = Scheduler(f"{name}:{chain}", cfg["keys"], cfg["key_param"], rate, cfg["retries"], shared=shared)
+    return schedulers
+
+SCHEDULERS = _build_schedulers()
+
+def get_scheduler(provider, chain=None):
+    if provider in PER_CHAIN:
+        return SCHEDULERS[f"{provider}:{resolve_chain(chain)}"]
+    return SCHEDULERS[provider]
+
+async def upstream_request(provider, method, url, chain=None, **kwargs):
+    return await get_scheduler(provider, chain).request(method, url, **kwargs)
+
+def upstream_stream(provider, method, url, chain=None, **kwargs):
+    # async with upstream_stream(...) as response: async for line in response.aiter_lines()
+    return get_scheduler(provider, chain).stream(method, url, **kwargs)
+
+def scheduler_stats():
+    stats = {
+        name: {**s.stats, "queued": s.bucket.queued(), "keys": len(s.keys.keys), "rate_per_sec": s.bucket.rate}
+        for name, s in SCHEDULERS.items()
+    }
+    for name, bucket in SHARED_BUCKETS.items():
+        stats[f"{name}:shared"] = {"queued": bucket.queued(), "rate_per_sec": bucket.rate}
+    return stats
+
+@REGISTRY.collector
+def scheduler_metrics():
+    events = [({"provider": name, "event": event}, count) for name, s in SCHEDULERS.items() for event, count in s.stats.items()]
+    queued = [({"provider": name}, s.bucket.queued()) for name, s in SCHEDULERS.items()]
+    queued += [({"provider": f"{name}:shared"}, bucket.queued()) for name, bucket in SHARED_BUCKETS.items()]
+    return [
+        ("upstream_events_total", "counter", "Scheduler events: requests, retries, throttled, failures, shed.", events),
+        ("upstream_queued", "gauge", "Requests waiting for a rate limit token.", queued),
+    ]
@@ -0,0 +1,254 @@
+"""
+Risk scoring engine: structured features in, 0-100 safety score out.
+
+Scores come from versioned weight tables rather than code, and whole batches
+are scored as NumPy arrays, so the scan history can be re-scored after a
+weight change without calling Etherscan or Gemini again:
+
+    python scoring.py rescore scans.jsonl --weights v4.json --out rescored.jsonl
+"""
+import argparse
+import json
+import operator
+import os
+import re
+import sys
+import time
+import numpy as np
+from rules import RULES
+
+# --- 1. FEATURES ---
+# Every feature is a float or None for "unknown". Unknowns become NaN when
+# scored, and every comparison with NaN is False, so a rule on a missing
+# value never fires.
+RULE_FEATURES = [f"rule_{rule['id']}" for rule in RULES]
+REPORT_FEATURES = ["report_critical_risk", "report_caution", "report_mint", "report_blacklist"]
+# Set when an unverified contract was analyzed from its bytecode (bytecode.py)
+BYTECODE_FEATURES = ["source_verified", "bytecode_proxy", "bytecode_selfdestruct"]
+FEATURES = [
+    "has_market", "liquidity_usd", "fdv", "liq_fdv_ratio",
+    "deployer_known", "deployer_tx_count", "deployer_balance_eth",
+    # Other tokens from the same deployer in deployer_index.py
+    "deployer_prior_tokens", "deployer_prior_critical",
+    *RULE_FEATURES, *REPORT_FEATURES, *BYTECODE_FEATURES,
+]
+
+_DEPLOYER_TX_RE = re.compile(r"Total Transactions: (\d+)")
+_DEPLOYER_BALANCE_RE = re.compile(r"Current Balance: ([\d.]+) [A-Z]+")
+_DEPLOYER_HISTORY_RE = re.compile(r"Earlier Tokens: (\d+) \((\d+) rated CRITICAL\)")
+
+def _deployer_features(deployer):
+    # Structured {"balance_eth", "tx_count", "prior_tokens", "prior_critical"},
+    # or the text format_deployer_report writes
+    if isinstance(deployer, dict):
+        tx_count, balance = deployer.get("tx_count"), deployer.get("balance_eth")
+        prior_tokens, prior_critical = deployer.get("prior_tokens"), deployer.get("prior_critical")
+    else:
+        tx_match = _DEPLOYER_TX_RE.search(deployer or "")
+        balance_match = _DEPLOYER_BALANCE_RE.search(deployer or "")
+        history_match = _DEPLOYER_HISTORY_RE.search(deployer or "")
+        tx_count = int(tx_match.group(1)) if tx_match else None
+        balance = float(balance_match.group(1)) if balance_match else None
+        prior_tokens, prior_critical = (int(history_match.group(1)), int(history_match.group(2))) if history_match else (None, None)
+    known = tx_count is not None and balance is not None
+    return {
+        "deployer_known": float(known),
+        "deployer_tx_count": float(tx_count) if known else None,
+        "deployer_balance_eth": float(balance) if known else None,
+        "deployer_prior_tokens": float(prior_tokens) if prior_tokens is not None else None,
+        "deployer_prior_critical": float(prior_critical) if prior_critical is not None else None,
+    }
+
+def extract_features(market_data, deployer, report_ir, findings=None, bytecode=None):
+    """
+    Flattens one scan into {feature: float}. `report_ir` comes from
+    report_parser.parse_report, `findings` from rules.run_rules (None when the
+    rule engine did not run, which leaves the rule features unknown).
+    An unverified contract has `bytecode` (bytecode.analyze_bytecode) instead
+    of a report, and its report features stay unknown.
+    """
+    features = dict.fromkeys(FEATURES)
+    features["has_market"] = float(bool(market_data))
+    if market_data:
+        liq = float(market_data.get('liquidity_usd') or 0)
+        fdv = float(market_data.get('fdv') or 0)
+        features["liquidity_usd"] = liq
+        features["fdv"] = fdv
+        if fdv > 0 and liq > 0:
+            features["liq_fdv_ratio"] = liq / fdv
+    features.update(_deployer_features(deployer))
+    if findings is not None:
+        hit = {f["rule"] for f in findings}
+        for rule in RULES:
+            features[f"rule_{rule['id']}"] = float(rule["id"] in hit)
+    if report_ir is not None:
+        signals = report_ir["signals"]
+        features["report_critical_risk"] = float(signals["critical_risk"])
+        features["report_caution"] = float(signals["caution"])
+        features["report_mint"] = float(signals["infinite_mint"] or signals["minting_enabled"])
+        features["report_blacklist"] = float(signals["blacklist"])
+    features["source_verified"] = float(bytecode is None)
+    if bytecode is not None:
+        features["bytecode_proxy"] = float(bool(bytecode["proxy"]))
+        features["bytecode_selfdestruct"] = float("SELFDESTRUCT" in bytecode["opcodes"])
+    return features
+
+# --- 2. WEIGHT TABLES ---
+# A rule fires when all of its conditions hold. Within a group only the first
+# firing rule counts (an if/elif chain). Verdicts: first threshold the score is
+# below, else the default. v1 reproduces the original hand-written scorer and
+# stays as published, so older scores can be reproduced. v2 adds the rules for
+# unverified contracts, v3 the deployer's track record.
+WEIGHT_TABLES = {
+    "v1": {
+        "rules": [
+            {"group": "market", "when": [["has_market", "==", 0]], "penalty": 30, "reason": "⚠️ No Market Data (Pre-launch/Zero Liquidity)"},
+            {"group": "liquidity", "when": [["liquidity_usd", "<", 5000]], "penalty": 25, "reason": "🚨 Critical: Liquidity < $5k"},
+            {"group": "liquidity", "when": [["liquidity_usd", "<", 20000]], "penalty": 10, "reason": "⚠️ Low Liquidity (< $15k)"},
+            {"group": "ratio", "when": [["liq_fdv_ratio", "<", 0.01]], "penalty": 15, "reason": "⚠️ Thin Liquidity (High Volatility Risk)"},
+            {"group": "deployer", "when": [["deployer_tx_count", "<", 5]], "penalty": 20, "reason": "⚠️ Deployer is a fresh wallet"},
+            {"group": "deployer", "when": [["deployer_balance_eth", "<", 0.01]], "penalty": 10, "reason": "⚠️ Deployer wallet is empty"},
+            {"group": "code", "when": [["report_critical_risk", "==", 1]], "penalty": 50, "reason": "🚨 CRITICAL Vulnerabilities Found"},
+            {"group": "code", "when": [["report_caution", "==", 1]], "penalty": 20, "reason": "⚠️ Potential risks detected"},
+            {"group": "mint", "when": [["report_mint", "==", 1]], "penalty": 15, "reason": "⚠️ Minting Capability Detected"},
+            {"group": "blacklist", "when": [["report_blacklist", "==", 1]], "penalty": 10, "reason": "⚠️ Blacklist Functionality Found"},
+        ],
+        "verdicts": [[50, "CRITICAL"], [75, "CAUTION"]],
+        "default_verdict": "SAFE",
+    },
+}
+WEIGHT_TABLES["v2"] = {
+    **WEIGHT_TABLES["v1"],
+    "rules": [
+        *WEIGHT_TABLES["v1"]["rules"],
+        # Unverified contracts have no report, only bytecode findings
+        {"group": "verified", "when": [["source_verified", "==", 0]], "penalty": 20, "reason": "⚠️ Source code not verified"},
+        {"group": "proxy", "when": [["bytecode_proxy", "==", 1]], "penalty": 15, "reason": "⚠️ Proxy: logic can be swapped"},
+        {"group": "selfdestruct", "when": [["bytecode_selfdestruct", "==", 1]], "penalty": 25, "reason": "🚨 Contract can self-destruct"},
+        {"group": "mint", "when": [["source_verified", "==", 0], ["rule_mint", "==", 1]], "penalty": 15, "reason": "⚠️ Minting Capability Detected"},
+        {"group": "blacklist", "when": [["source_verified", "==", 0], ["rule_blacklist", "==", 1]], "penalty": 10, "reason": "⚠️ Blacklist Functionality Found"},
+        {"group": "pausable", "when": [["source_verified", "==", 0], ["rule_pausable", "==", 1]], "penalty": 10, "reason": "⚠️ Trading can be paused"},
+        {"group": "tax", "when": [["source_verified", "==", 0], ["rule_tax_modifiable", "==", 1]], "penalty": 10, "reason": "⚠️ Fees can be changed"},
+    ],
+}
+WEIGHT_TABLES["v3"] = {
+    **WEIGHT_TABLES["v2"],
+    "rules": [
+        *WEIGHT_TABLES["v2"]["rules"],
+        {"group": "deployer_history", "when": [["deployer_prior_critical", ">=", 3]], "penalty": 50, "reason": "🚨 Serial scammer: deployer has 3+ earlier CRITICAL tokens"},
+        {"group": "deployer_history", "when": [["deployer_prior_critical", ">=", 1]], "penalty": 25, "reason": "⚠️ Deployer has an earlier CRITICAL token"},
+    ],
+}
+DEFAULT_WEIGHTS = os.getenv("SCORING_WEIGHTS", "v3")
+
+_OPS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge, "==": operator.eq, "!=": operator.ne}
+
+def load_weights(name_or_path=None):
+    """
+    Returns (version, table) for a built-in version name or a JSON file
+    holding a table (with an optional "version" field).
+    """
+    name_or_path = name_or_path or DEFAULT_WEIGHTS
+    if name_or_path in WEIGHT_TABLES:
+        return name_or_path, WEIGHT_TABLES[name_or_path]
+    with open(name_or_path) as f:
+        table = json.load(f)
+    for rule in table["rules"]:
+        for feature, op, _ in rule["when"]:
+            if feature not in FEATURES or op not in _OPS:
+                raise ValueError(f"Unknown condition in {name_or_path}: {feature} {op}")
+    return table.get("version", os.path.splitext(os.path.basename(name_or_path))[0]), table
+
+# --- 3. SCORING ---
+def feature_columns(rows):
+    """
+    [{feature: value}, ...] -> {feature: float64 array}. Missing or None values become NaN.
+    """
+    # float64 turns None into NaN during the conversion
+    matrix = np.array([[row.get(feature) for feature in FEATURES] for row in rows], dtype=np.float64).reshape(len(rows), len(FEATURES))
+    return {feature: matrix[:, i] for i, feature in enumerate(FEATURES)}
+
+def score_batch(columns, weights=None):
+    """
+    Scores every row of `columns` at once. Returns {"score": int array,
+    "verdict": str array, "hits": bool matrix (rules x rows)}.
+    """
+    _, table = weights if isinstance(weights, tuple) else load_weights(weights)
+    n = len(next(iter(columns.values())))
+    penalty = np.zeros(n)
+    hits = np.zeros((len(table["rules"]), n), dtype=bool)
+    group_taken = {}
+    with np.errstate(invalid="ignore"):
+        for i, rule in enumerate(table["rules"]):
+            fired = np.ones(n, dtype=bool)
+            for feature, op, value in rule["when"]:
+                fired &= _OPS[op](columns[feature], value)
+            taken = group_taken.setdefault(rule["group"], np.zeros(n, dtype=bool))
+            fired &= ~taken
+            taken |= fired
+            hits[i] = fired
+            penalty += fired * rule["penalty"]
+    score = np.clip(100 - penalty, 0, 100).astype(np.int64)
+
+    verdict = np.full(n, table["default_verdict"], dtype=object)
+    for threshold, label in reversed(table["verdicts"]):
+        verdict[score < threshold] = label
+    return {"score": score, "verdict": verdict, "hits": hits}
+
+def score_features(features, weights=None):
+    """
+    Scores one scan, with the reasons behind the score.
+    """
+    version, table = weights if isinstance(weights, tuple) else load_weights(weights)
+    result = score_batch(feature_columns([features]), (version, table))
+    return {
+        "score": int(result["score"][0]),
+        "verdict": result["verdict"][0],
+        "breakdown": [rule["reason"] for rule, hit in zip(table["rules"], result["hits"][:, 0]) if hit],
+        "version": version,
+    }
+
+# --- 4. RE-SCORING CLI ---
+def _read_rows(path):
+    # JSONL of scan results ({"features": {...}}) or bare feature rows
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                yield row.get("features", row)
+
+def rescore(path, weights=None, out=None):
+    version, table = load_weights(weights)
+    start = time.perf_counter()
+    rows = list(_read_rows(path))
+    if not rows:
+        return version, 0, {}
+    loaded = time.perf_counter()
+    result = score_batch(feature_columns(rows), (version, table))
+    scored = time.perf_counter()
+    if out:
+        with open(out, "w") as f:
+            for score, verdict in zip(result["score"].tolist(), result["verdict"]):
+                f.write(json.dumps({"score": score, "verdict": verdict, "score_version": version}) + "\n")
+    labels, counts = np.unique(result["verdict"].astype(str), return_counts=True)
+    print(f"{len(rows)} rows with weights {version}: load {loaded - start:.2f}s, score {scored - loaded:.3f}s")
+    return version, len(rows), dict(zip(labels.tolist(), counts.tolist()))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    cmd = commands.add_parser("rescore", help="re-score a JSONL export of scan results")
+    cmd.add_argument("path")
+    cmd.add_argument("--weights", default=DEFAULT_WEIGHTS, help="built-in version or JSON weight table")
+    cmd.add_argument("--out", help="write one {score, verdict, score_version} line per input row")
+    args = parser.parse_args()
+
+    try:
+        _, _, verdicts = rescore(args.path, args.weights, args.out)
+    except (OSError, ValueError, KeyError) as e:
+        sys.exit(f"rescore failed: {e}")
+    for label, count in sorted(verdicts.items()):
+        print(f"  {label:8s} {count}")
+
+if __name__ == "__main__":
+    main()
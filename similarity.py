@@ -0,0 +1,237 @@
+"""
+Near-duplicate index of audited contracts.
+
+Most memecoins are light edits of a few hundred templates. Every contract
+Gemini audits in full is fingerprinted (MinHash over token shingles of its
+project code: comments, vendored files and helper libraries dropped, see
+source_ingest.py) and filed in an LSH index. A new contract that shares a
+bucket with an audited one and is similar enough gets audited from the diff
+against it plus its report, instead of its whole source (see
+auditor.analyze_with_gemini_raw).
+
+Only full audits are indexed, so reports never drift through chains of
+diffs. With SIMILARITY_DB set the index lives in SQLite, survives restarts,
+and every process picks up what the others add.
+"""
+import difflib
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import mmh3
+import numpy as np
+from dotenv import load_dotenv
+from cache import MemoryCache
+from metrics import REGISTRY
+from report_store import prompt_version
+from source_ingest import ingest_source
+
+load_dotenv()
+
+SIMILARITY_DB = os.getenv("SIMILARITY_DB")
+# Estimated Jaccard similarity of the shingle sets
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.8"))
+# A diff longer than this fraction of the code saves too little; audit from scratch
+MAX_DIFF_RATIO = float(os.getenv("SIMILARITY_MAX_DIFF_RATIO", "0.4"))
+MAX_DIFF_CHARS = 15000
+
+NUM_PERM = 128
+# 16 bands of 8 rows: pairs above ~0.7 similarity almost always share a bucket
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_TOKENS = 5
+# Fingerprints handed over by prime() and not yet matched
+PRIMED_MAX = 128
+
+# Shingles hashed per block: bounds the (block, NUM_PERM) uint64 scratch to 2 MB
+MINHASH_BLOCK = 2048
+
+# Fixed seed: signatures have to match across processes and restarts (drawn
+# as uint64 as they always were, stored as the uint32 they fit in)
+_MERSENNE = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 1 << 32, NUM_PERM, dtype=np.uint64).astype(np.uint32)
+_B = _rng.randint(0, 1 << 32, NUM_PERM, dtype=np.uint64).astype(np.uint32)
+_TOKEN_RE = re.compile(r"[A-Za-z_$][\w$]*|\d+|\S")
+
+# --- 1. FINGERPRINTS ---
+def project_text(source_code):
+    """
+    The code fingerprints and diffs are taken over: the project units of the
+    source, comment-free and without vendored code.
+    """
+    return "\n".join(f"// File: {unit['path']}\n{unit['code']}" for unit in ingest_source(source_code)["units"])
+
+def minhash(text):
+    """
+    MinHash signature (NUM_PERM uint32) of the set of SHINGLE_TOKENS-token shingles.
+    """
+    tokens = _TOKEN_RE.findall(text)
+    shingles = {" ".join(tokens[i:i + SHINGLE_TOKENS]) for i in range(max(1, len(tokens) - SHINGLE_TOKENS + 1))}
+    hashes = np.fromiter((mmh3.hash(s, signed=False) for s in shingles), dtype=np.uint32, count=len(shingles))
+    # (a * x + b) mod p per permutation. a, x and b are all 32-bit, so the
+    # widened a * x + b stays below 2^64 and never wraps before the mod
+    a, b = _A.astype(np.uint64), _B.astype(np.uint64)
+    signature = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+    for start in range(0, len(hashes), MINHASH_BLOCK):
+        block = hashes[start:start + MINHASH_BLOCK, None].astype(np.uint64)
+        np.minimum(signature, ((block * a + b) % _MERSENNE).min(axis=0), out=signature)
+    return signature.astype(np.uint32)
+
+def fingerprint_source(source_code):
+    """
+    (project text, signature): what match() compares and add() files. Pure
+    CPU, so a worker process can compute it (see SimilarityIndex.prime).
+    """
+    text = project_text(source_code)
+    return text, minhash(text)
+
+def similarity(a, b):
+    return int(np.count_nonzero(a == b)) / NUM_PERM
+
+def source_diff(old_text, new_text):
+    return "\n".join(difflib.unified_diff(old_text.splitlines(), new_text.splitlines(), "audited", "scanned", n=2, lineterm=""))
+
+# --- 2. INDEX ---
+class SimilarityIndex:
+    """
+    Signatures and LSH buckets in memory; the audited code and reports in
+    SQLite when there is a database, in memory otherwise.
+    """
+    def __init__(self, db_path=None, threshold=SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self._signatures = {}  # key -> (prompt version, signature)
+        self._buckets = [{} for _ in range(BANDS)]  # band -> {band bytes: [keys]}
+        self._docs = {}  # key -> (name, text, report), without a database
+        self._primed = MemoryCache(PRIMED_MAX)  # source -> fingerprint
+        self._last_id = 0
+        self._conn = None
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "too_different": 0, "chars_saved": 0}
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS audited (id INTEGER PRIMARY KEY, key TEXT UNIQUE NOT NULL, prompt_version TEXT NOT NULL, name TEXT, signature BLOB NOT NULL, text TEXT NOT NULL, report TEXT NOT NULL, created_at REAL NOT NULL)")
+            self._conn.commit()
+            self._sync()
+
+    def _file(self, key, version, signature):
+        if key in self._signatures:
+            return
+        self._signatures[key] = (version, signature)
+        for band in range(BANDS):
+            self._buckets[band].setdefault(signature[band * ROWS:(band + 1) * ROWS].tobytes(), []).append(key)
+
+    def _sync(self):
+        # Audits other processes added since the last look
+        # (under the lock: match() runs in worker threads)
+        with self._lock:
+            rows = self._conn.execute("SELECT id, key, prompt_version, signature FROM audited WHERE id > ? ORDER BY id", (self._last_id,)).fetchall()
+            for row_id, key, version, signature in rows:
+                self._file(key, version, np.frombuffer(signature, dtype=np.uint32))
+                self._last_id = row_id
+
+    def nearest(self, signature, prompt_template):
+        """
+        (key, similarity) of the most similar contract audited with the same
+        prompt, if it reaches the threshold; else None.
+        """
+        if self._conn:
+            self._sync()
+        version = prompt_version(prompt_template)
+        candidates = set()
+        for band in range(BANDS):
+            candidates.update(self._buckets[band].get(signature[band * ROWS:(band + 1) * ROWS].tobytes(), ()))
+        best = None
+        for key in candidates:
+            other_version, other = self._signatures[key]
+            score = similarity(signature, other)
+            if other_version == version and score >= self.threshold and (best is None or score > best[1]):
+                best = (key, score)
+        return best
+
+    def _doc(self, key):
+        if not self._conn:
+            return self._docs.get(key)
+        with self._lock:
+            return self._conn.execute("SELECT name, text, report FROM audited WHERE key = ?", (key,)).fetchone()
+
+    def match(self, source_code, prompt_template):
+        """
+        Returns (fingerprint, neighbor). `neighbor` is {"name", "similarity",
+        "report", "diff"} for a close enough audited contract whose diff is
+        worth sending, else None. Pass `fingerprint` to add() once audited.
+        Ingest, MinHash and diff are CPU-bound: call it from a worker thread
+        (or process), never on the event loop.
+        """
+        primed = self._primed.get(source_code)
+        fingerprint = primed[1] if primed else fingerprint_source(source_code)
+        text = fingerprint[0]
+        found = self.nearest(fingerprint[1], prompt_template)
+        doc = self._doc(found[0]) if found else None
+        if doc is None:
+            self.counters["misses"] += 1
+            return fingerprint, None
+        name, old_text, report = doc
+        diff = source_diff(old_text, text)
+        if len(diff) > min(MAX_DIFF_RATIO * len(text), MAX_DIFF_CHARS):
+            self.counters["too_different"] += 1
+            return fingerprint, None
+        self.counters["hits"] += 1
+        self.counters["chars_saved"] += max(0, len(text) - len(diff))
+        return fingerprint, {"name": name, "similarity": found[1], "report": report, "diff": diff}
+
+    def prime(self, source_code, fingerprint):
+        # A fingerprint_source() computed elsewhere (bulk_audit's worker
+        # processes): match() on this source then skips ingest and MinHash
+        self._primed.set(source_code, fingerprint, None)
+
+    def add(self, fingerprint, name, prompt_template, report):
+        text, signature = fingerprint
+        version = prompt_version(prompt_template)
+        key = hashlib.sha256(f"{version}\x00{text}".encode()).hexdigest()
+        if self._conn:
+            with self._lock:
+                self._conn.execute("INSERT OR IGNORE INTO audited (key, prompt_version, name, signature, text, report, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   (key, version, name, signature.tobytes(), text, report, time.time()))
+                self._conn.commit()
+            self._sync()
+        else:
+            with self._lock:
+                self._docs.setdefault(key, (name, text, report))
+                self._file(key, version, signature)
+
+    def purge_stale(self, prompt_template):
+        """
+        Drops audits made with a different prompt template (never matched
+        again). Returns the number of rows removed.
+        """
+        version = prompt_version(prompt_template)
+        stale = {key for key, (v, _) in self._signatures.items() if v != version}
+        self._signatures = {key: entry for key, entry in self._signatures.items() if key not in stale}
+        self._buckets = [{b: [k for k in keys if k not in stale] for b, keys in buckets.items()} for buckets in self._buckets]
+        self._docs = {key: doc for key, doc in self._docs.items() if key not in stale}
+        if not self._conn:
+            return len(stale)
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM audited WHERE prompt_version != ?", (version,))
+            self._conn.commit()
+        return cur.rowcount
+
+    def stats(self):
+        lookups = self.counters["hits"] + self.counters["misses"] + self.counters["too_different"]
+        return {"entries": len(self._signatures), **self.counters, "hit_ratio": round(self.counters["hits"] / lookups, 3) if lookups else 0.0}
+
+SIMILARITY_INDEX = SimilarityIndex(db_path=SIMILARITY_DB)
+
+@REGISTRY.collector
+def similarity_metrics():
+    stats = SIMILARITY_INDEX.stats()
+    return [
+        ("similarity_lookups_total", "counter", "Near-duplicate lookups before a Gemini audit, by result.",
+         [({"result": result}, stats[field]) for field, result in (("hits", "hit"), ("misses", "miss"), ("too_different", "too_different"))]),
+        ("similarity_chars_saved_total", "counter", "Source characters replaced by a diff in Gemini prompts.", [({}, stats["chars_saved"])]),
+        ("similarity_index_entries", "gauge", "Audited contracts in the near-duplicate index.", [({}, stats["entries"])]),
+    ]
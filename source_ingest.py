@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import re
+from report_store import normalize_source
+
+# ~4 characters per token is close enough for Solidity
+CHARS_PER_TOKEN = 4
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "4000"))
+
+# Library code we never need to send to the LLM
+VENDORED_PATHS = ("@openzeppelin/", "node_modules/", "lib/openzeppelin", "lib/forge-std/", "forge-std/", "@uniswap/", "@chainlink/", "solmate/", "solady/", "hardhat/")
+# Stateless helpers that flattened memecoin sources paste in verbatim
+VENDORED_LIBRARIES = {"SafeMath", "Address", "Context", "Strings", "Math", "SafeERC20", "SignedMath"}
+
+_UNIT_RE = re.compile(r"^[ \t]*(abstract[ \t]+contract|contract|library|interface)[ \t]+(\w+)", re.MULTILINE)
+_HEADER_RE = re.compile(r"^\s*(pragma|import)\b[^;]*;\s*$", re.MULTILINE)
+
+# --- 1. PARSE ---
+def parse_source_files(source_code):
+    """
+    Etherscan's SourceCode is a flattened file, a JSON object of
+    {path: {"content": ...}}, or Standard-JSON wrapped in double braces.
+    Returns a list of (path, content).
+    """
+    text = source_code.strip()
+    if text.startswith("{{") and text.endswith("}}"):
+        text = text[1:-1]
+    if text.startswith("{"):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            sources = data.get("sources", data)
+            files = [(path, entry.get("content", "")) for path, entry in sources.items() if isinstance(entry, dict)]
+            if files:
+                return files
+    return [("Contract.sol", source_code)]
+
+def is_vendored(path):
+    return any(marker in path for marker in VENDORED_PATHS)
+
+# --- 2. SPLIT + DEDUPE ---
+def ingest_source(source_code):
+    """
+    Parses the source, drops vendored files and helper libraries, strips
+    comments and splits what's left into contract/library/interface units,
+    deduped by content hash.
+    Returns {"units": [...], "files": n, "vendored": [paths], "duplicates": n}.
+    """
+    files = parse_source_files(source_code)
+    project = [(path, content) for path, content in files if not is_vendored(path)]
+    # A contract that is nothing but vendored code still needs auditing
+    vendored = [path for path, _ in files if is_vendored(path)] if project else []
+    if not project:
+        project = files
+
+    units, seen, duplicates = [], set(), 0
+    for path, content in project:
+        code = _HEADER_RE.sub("", normalize_source(content)).strip()
+        matches = list(_UNIT_RE.finditer(code))
+        pieces = []
+        if not matches:
+            pieces.append(("file", path.rsplit("/", 1)[-1], code))
+        else:
+            if code[:matches[0].start()].strip():
+                pieces.append(("file", path.rsplit("/", 1)[-1], code[:matches[0].start()]))
+            for i, match in enumerate(matches):
+                end = matches[i + 1].start() if i + 1 < len(matches) else len(code)
+                pieces.append((match.group(1).split()[-1], match.group(2), code[match.start():end]))
+
+        for kind, name, body in pieces:
+            body = body.strip()
+            if not body or (kind == "library" and name in VENDORED_LIBRARIES):
+                continue
+            digest = hashlib.sha256(body.encode()).hexdigest()
+            if digest in seen:
+                duplicates += 1
+                continue
+            seen.add(digest)
+            units.append({"path": path, "kind": kind, "name": name, "code": body})
+
+    return {"units": units, "files": len(files), "vendored": vendored, "duplicates": duplicates}
+
+# --- 3. CHUNK ---
+def chunk_units(units, max_tokens=CHUNK_TOKENS):
+    """
+    Packs units into chunks of at most max_tokens, splitting oversized units
+    on line boundaries. Returns a list of strings.
+    """
+    budget = max_tokens * CHARS_PER_TOKEN
+    chunks, current = [], ""
+    for unit in units:
+        block = f"// File: {unit['path']}\n{unit['code']}\n"
+        parts = [block]
+        if len(block) > budget:
+            parts, part = [], ""
+            for line in block.splitlines(keepends=True):
+                if part and len(part) + len(line) > budget:
+                    parts.append(part)
+                    part = ""
+                part += line[:budget]
+            parts.append(part)
+        for part in parts:
+            if current and len(current) + len(part) > budget:
+                chunks.append(current)
+                current = ""
+            current += part
+    if current:
+        chunks.append(current)
+    return chunks
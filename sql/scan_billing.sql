@@ -0,0 +1,110 @@
+-- Pro scan billing as one round trip.
+--
+-- reserve_scan_credit runs the whole check-and-deduct in a single
+-- transaction: it locks the user's profile row (so concurrent scans by the
+-- same user queue up instead of racing on credits_remaining), checks the
+-- scan history, takes a credit and records the scan. It returns the id of
+-- the user_scans row it created (scan_id), null when it created none.
+-- refund_scan_credit undoes a reservation when the scan itself fails: it
+-- removes that row and returns the credit, unless a re-scan was let through
+-- for free on the strength of the row in the meantime (user_scans.reused).
+-- Then the row, and the credit that paid for it, stay.
+--
+-- Apply in the Supabase SQL editor, or: psql "$DATABASE_URL" -f sql/scan_billing.sql
+
+alter table user_scans add column if not exists reused boolean not null default false;
+
+-- The result columns changed (scan_id), which create or replace can't do
+drop function if exists reserve_scan_credit(uuid, text, boolean);
+drop function if exists refund_scan_credit(uuid, text, boolean);
+
+create or replace function reserve_scan_credit(p_user_id uuid, p_contract_address text, p_has_license boolean default false)
+returns table (allowed boolean, already_scanned boolean, charged boolean, profile_found boolean, credits_left integer, scan_id bigint)
+language plpgsql
+set search_path = public
+as $$
+declare
+    v_credits integer;
+    v_found boolean;
+    v_scan_id bigint;
+begin
+    select p.credits_remaining into v_credits
+    from profiles p
+    where p.id = p_user_id
+    for update;
+    v_found := found;
+
+    -- Re-scans are free. The row now vouches for this scan too, so a refund
+    -- of the reservation that created it must leave it in place
+    update user_scans s set reused = true
+    where s.user_id = p_user_id and s.contract_address = p_contract_address;
+    if found then
+        return query select true, true, false, v_found, v_credits, null::bigint;
+        return;
+    end if;
+
+    if not v_found then
+        return query select false, false, false, false, null::integer, null::bigint;
+        return;
+    end if;
+
+    -- Out of credits: only a license key gets through, and it isn't charged
+    if v_credits <= 0 then
+        if not p_has_license then
+            return query select false, false, false, true, v_credits, null::bigint;
+            return;
+        end if;
+        insert into user_scans (user_id, contract_address) values (p_user_id, p_contract_address)
+        returning id into v_scan_id;
+        return query select true, false, false, true, v_credits, v_scan_id;
+        return;
+    end if;
+
+    update profiles p
+    set credits_remaining = p.credits_remaining - 1
+    where p.id = p_user_id
+    returning p.credits_remaining into v_credits;
+
+    insert into user_scans (user_id, contract_address) values (p_user_id, p_contract_address)
+    returning id into v_scan_id;
+    return query select true, false, true, true, v_credits, v_scan_id;
+end;
+$$;
+
+create or replace function refund_scan_credit(p_user_id uuid, p_scan_id bigint, p_charged boolean)
+returns integer
+language plpgsql
+set search_path = public
+as $$
+declare
+    v_credits integer;
+begin
+    select p.credits_remaining into v_credits
+    from profiles p
+    where p.id = p_user_id
+    for update;
+
+    delete from user_scans s
+    where s.id = p_scan_id and s.user_id = p_user_id and not s.reused;
+
+    if found and p_charged then
+        update profiles p
+        set credits_remaining = p.credits_remaining + 1
+        where p.id = p_user_id
+        returning p.credits_remaining into v_credits;
+    end if;
+    return v_credits;
+end;
+$$;
+
+-- Billing is server-side only: keep the functions away from the anon/authenticated roles
+revoke all on function reserve_scan_credit(uuid, text, boolean) from public;
+revoke all on function refund_scan_credit(uuid, bigint, boolean) from public;
+do $$
+begin
+    if exists (select 1 from pg_roles where rolname = 'service_role') then
+        grant execute on function reserve_scan_credit(uuid, text, boolean) to service_role;
+        grant execute on function refund_scan_credit(uuid, bigint, boolean) to service_role;
+    end if;
+end;
+$$;
@@ -0,0 +1,57 @@
+"""
+A warmed token is scanned without a model call: the warmer stores the code
+audit under the same key the Pro scan looks it up by.
+
+    python -m pytest tests
+"""
+import asyncio
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+
+from stub_upstream import StubServer, build_app
+
+@pytest.fixture(scope="module")
+def stub():
+    app = build_app(latency=0.0)
+    with StubServer(app) as server:
+        # Read at import, so set before the first project module loads
+        os.environ.update({
+            "ETHERSCAN_API_URL": f"{server.url}/v2/api", "DEXSCREENER_API_URL": server.url, "GEMINI_API_URL": server.url,
+            "ETHERSCAN_API_KEY": "test", "GEMINI_API_KEY": "test",
+            "SCAN_CACHE_DB": "", "REPORT_STORE_DB": "", "SIMILARITY_DB": "", "DEPLOYER_INDEX_DB": "",
+        })
+        yield app
+
+def model_calls(app):
+    return sum(count for call, count in app.state.calls.items() if call.startswith("gemini:"))
+
+def test_warm_then_scan_makes_no_model_call(stub):
+    import pipeline
+    from upstream import close_clients
+    from warmer import CacheWarmer
+
+    async def main():
+        try:
+            warmer = CacheWarmer([])
+            assert await warmer.warm("0x" + "1" * 40, "ethereum")
+            assert await warmer.warm("0x" + "2" * 40, "bsc")
+            warmed = model_calls(stub)
+            assert warmed == 1  # the two tokens share their code
+
+            result = await pipeline.run_pro_scan("0x" + "1" * 40, "ethereum")
+            events = [event async for event in pipeline.stream_pro_scan("0x" + "2" * 40, "bsc")]
+            assert model_calls(stub) == warmed
+            return result, events[-1]
+        finally:
+            await close_clients()
+
+    result, streamed = asyncio.run(main())
+    # The deployer and market intel are this scan's, not the warm's
+    for scan in (result, streamed):
+        assert scan["report"].startswith("### 🕵️‍♂️ DEPLOYER INTEL\n- Address: 0x")
+        assert f"- Liquidity: ${scan['market']['liquidity_usd']}" in scan["report"]
+        assert [section["id"] for section in scan["report_ir"]["sections"]] == ["deployer", "threats"]
@@ -0,0 +1,64 @@
+import os
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- UPSTREAM ENDPOINTS ---
+# Overridable so benchmarks and local dev can point the auditor at stub servers.
+ETHERSCAN_API_URL = os.getenv("ETHERSCAN_API_URL", "https://api.etherscan.io/v2/api")
+DEXSCREENER_API_URL = os.getenv("DEXSCREENER_API_URL", "https://api.dexscreener.com")
+GEMINI_API_URL = os.getenv("GEMINI_API_URL", "https://generativelanguage.googleapis.com")
+
+# 🚨 CRITICAL: Etherscan blocks default client user agents, so we look like a browser
+BROWSER_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+}
+
+# --- CONNECTION POOLS ---
+# One pooled keep-alive client per provider, so every provider gets its own
+# per-host connection cap and a slow host can't starve the others. Per-chain
+# providers ("etherscan:bsc") get a client each, sized like the base provider.
+POOLS = {
+    "etherscan": {
+        "max_connections": int(os.getenv("ETHERSCAN_MAX_CONNECTIONS", "50")),
+        "timeout": float(os.getenv("ETHERSCAN_TIMEOUT", "10")),
+        "headers": BROWSER_HEADERS,
+    },
+    "dexscreener": {
+        "max_connections": int(os.getenv("DEXSCREENER_MAX_CONNECTIONS", "50")),
+        "timeout": float(os.getenv("DEXSCREENER_TIMEOUT", "10")),
+        "headers": {"User-Agent": "Mozilla/5.0"},
+    },
+    "gemini": {
+        "max_connections": int(os.getenv("GEMINI_MAX_CONNECTIONS", "100")),
+        "timeout": float(os.getenv("GEMINI_TIMEOUT", "90")),
+        "headers": {"Content-Type": "application/json"},
+    },
+}
+
+_clients = {}
+
+def get_client(provider):
+    """
+    Returns the shared AsyncClient for a provider, creating it on first use.
+    """
+    client = _clients.get(provider)
+    if client is None or client.is_closed:
+        cfg = POOLS[provider.split(":")[0]]
+        client = httpx.AsyncClient(
+            headers=cfg["headers"],
+            timeout=httpx.Timeout(cfg["timeout"], connect=5.0),
+            limits=httpx.Limits(
+                max_connections=cfg["max_connections"],
+                max_keepalive_connections=cfg["max_connections"],
+                keepalive_expiry=30.0,
+            ),
+        )
+        _clients[provider] = client
+    return client
+
+async def close_clients():
+    for client in list(_clients.values()):
+        await client.aclose()
+    _clients.clear()
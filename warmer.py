@@ -0,0 +1,315 @@
+"""
+Scans tokens before anyone asks for them, using only spare upstream quota.
+
+    python warmer.py --feed dexscreener --feed file:candidates.txt
+
+Feeds yield (address, chain) candidates: tokens DexScreener lists as newly
+boosted or profiled (they tend to trend minutes after launch), or lines
+appended to a file ("0xabc..." or "0xabc... bsc"). For each one the warmer
+fetches the source, runs the rules, and generates the AI report, so the
+real Pro scan finds all three cached.
+
+Run it inside the API (WARMER_FEEDS=dexscreener,file:/path) to share its
+memory cache and see its upstream traffic. As a separate process it only
+helps with SCAN_CACHE_DB and REPORT_STORE_DB set, and only sees its own
+token buckets, so give it a smaller ETHERSCAN_RATE_PER_KEY / GEMINI_RATE_PER_KEY.
+
+DeployerRefresher keeps the deployer index (deployer_index.py) fresh the same
+way; the API runs it, and so does this CLI when DEPLOYER_INDEX_DB is shared.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import time
+from dotenv import load_dotenv
+from auditor import (
+    get_contract_source_code, get_findings, get_contract_creator, get_deployer_wallet, get_wallet_balances,
+    get_transaction_count, audit_code,
+)
+from chains import CHAINS, DEFAULT_CHAIN, UnknownChain, resolve_chain
+from deployer_index import DEPLOYER_INDEX, DEPLOYER_INDEX_DB, DEPLOYER_REFRESH_INTERVAL
+from scheduler import PRIORITY, PRIORITY_BACKGROUND, UpstreamBusy, UpstreamError, get_scheduler, upstream_request
+from upstream import DEXSCREENER_API_URL, close_clients
+
+load_dotenv()
+
+# --- CONFIGURATION ---
+WARMER_FEEDS = os.getenv("WARMER_FEEDS", "")
+WARMER_CONCURRENCY = int(os.getenv("WARMER_CONCURRENCY", "2"))
+# Only call a provider while at least this fraction of its burst is unused
+WARMER_MIN_SPARE = float(os.getenv("WARMER_MIN_SPARE", "0.5"))
+WARMER_MAX_QUEUE = int(os.getenv("WARMER_MAX_QUEUE", "500"))
+# Seconds before a candidate offered again is warmed again (deployer data expires)
+WARMER_REVISIT = float(os.getenv("WARMER_REVISIT", "3600"))
+WARMER_POLL = float(os.getenv("WARMER_POLL", "60"))
+# Stale deployers refreshed per chain per round
+DEPLOYER_REFRESH_BATCH = int(os.getenv("DEPLOYER_REFRESH_BATCH", "100"))
+SPARE_POLL = 0.5
+
+DEXSCREENER_CHAINS = {cfg["dexscreener"]: name for name, cfg in CHAINS.items()}
+
+# --- 1. FEEDS ---
+class DexScreenerFeed:
+    """
+    Latest boosted and profiled tokens on the chains we scan. Etherscan has no
+    "recently verified" endpoint, so this is the new-deployment signal too.
+    """
+    PATHS = ("token-boosts/latest/v1", "token-profiles/latest/v1")
+
+    def __init__(self, interval=WARMER_POLL):
+        self.interval = interval
+
+    async def candidates(self):
+        while True:
+            for path in self.PATHS:
+                try:
+                    tokens = (await upstream_request("dexscreener", "GET", f"{DEXSCREENER_API_URL}/{path}")).json()
+                except (UpstreamError, UpstreamBusy, ValueError) as e:
+                    logging.warning(f"Warmer feed {path} failed: {e}")
+                    continue
+                for token in tokens if isinstance(tokens, list) else []:
+                    chain = DEXSCREENER_CHAINS.get(token.get("chainId"))
+                    if chain and token.get("tokenAddress"):
+                        yield token["tokenAddress"], chain
+            await asyncio.sleep(self.interval)
+
+class FileFeed:
+    """
+    Follows a file like `tail -f`: one address per line, optionally followed
+    by a chain name or id. Lines already in the file when it starts count too.
+    """
+    def __init__(self, path, interval=1.0):
+        self.path = path
+        self.interval = interval
+
+    async def candidates(self):
+        offset = 0
+        while True:
+            try:
+                with open(self.path) as f:
+                    f.seek(offset)
+                    lines = f.readlines()
+                    offset = f.tell()
+            except FileNotFoundError:
+                lines = []
+            for line in lines:
+                parts = line.replace(",", " ").split()
+                if not parts or parts[0].startswith("#"):
+                    continue
+                try:
+                    yield parts[0], resolve_chain(parts[1] if len(parts) > 1 else DEFAULT_CHAIN)
+                except UnknownChain as e:
+                    logging.warning(f"Warmer skipped {parts[0]}: {e}")
+            await asyncio.sleep(self.interval)
+
+def feeds_from_spec(spec):
+    # "dexscreener,file:/path/a.txt,file:b.txt"
+    feeds = []
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        if item == "dexscreener":
+            feeds.append(DexScreenerFeed())
+        elif item.startswith("file:"):
+            feeds.append(FileFeed(item[len("file:"):]))
+        else:
+            raise ValueError(f"Unknown warmer feed '{item}' (have: dexscreener, file:<path>)")
+    return feeds
+
+# --- 2. WARMER ---
+def _spare(scheduler):
+    spare = scheduler.bucket.spare()
+    if scheduler.shared:
+        spare = min(spare, scheduler.shared.spare())
+    return spare
+
+async def wait_for_spare(min_spare, stats, *schedulers):
+    # Checked before every step; the background priority lane then keeps
+    # whatever slips through behind any user request that shows up.
+    while min(_spare(s) for s in schedulers) < min_spare:
+        stats["waits"] += 1
+        await asyncio.sleep(SPARE_POLL)
+
+class CacheWarmer:
+    def __init__(self, feeds, concurrency=WARMER_CONCURRENCY, min_spare=WARMER_MIN_SPARE,
+                 max_queue=WARMER_MAX_QUEUE, revisit=WARMER_REVISIT):
+        self.feeds = feeds
+        self.concurrency = concurrency
+        self.min_spare = min_spare
+        self.revisit = revisit
+        self._queue = asyncio.Queue(max_queue)
+        self._seen = {}  # (address, chain) -> when it was last queued
+        self.stats = {"offered": 0, "queued": 0, "repeats": 0, "dropped": 0, "warmed": 0, "unverified": 0, "failed": 0, "waits": 0}
+
+    def offer(self, address, chain):
+        """
+        Queues a candidate unless it was queued recently. Drops it when the
+        queue is full: feeds keep coming, a backlog of stale tokens doesn't help.
+        """
+        self.stats["offered"] += 1
+        key = (address.lower(), chain)
+        now = time.monotonic()
+        if self._seen.get(key, -self.revisit) > now - self.revisit:
+            self.stats["repeats"] += 1
+            return False
+        try:
+            self._queue.put_nowait(key)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            return False
+        self._seen[key] = now
+        if len(self._seen) > 10 * self._queue.maxsize:
+            self._seen = {k: t for k, t in self._seen.items() if t > now - self.revisit}
+        self.stats["queued"] += 1
+        return True
+
+    async def _wait_for_spare(self, *schedulers):
+        await wait_for_spare(self.min_spare, self.stats, *schedulers)
+
+    async def warm(self, address, chain):
+        """
+        Runs the cacheable half of a Pro scan: source, rule findings, the
+        deployer and its wallet, and the code audit under the key the scan
+        looks it up by (auditor.audit_code). Market data expires in seconds,
+        so that's left to the scan.
+        """
+        etherscan = get_scheduler("etherscan", chain)
+        await self._wait_for_spare(etherscan)
+        name, code = await get_contract_source_code(address, chain)
+        if not code:
+            return False  # not verified (yet)
+        get_findings(address, code, chain)
+
+        await self._wait_for_spare(etherscan)
+        creator = await get_contract_creator(address, chain)
+        if creator:
+            await self._wait_for_spare(etherscan)
+            await get_deployer_wallet(creator, chain)
+
+        await self._wait_for_spare(get_scheduler("gemini"))
+        await audit_code(name, code)
+        return True
+
+    async def _work(self):
+        while True:
+            address, chain = await self._queue.get()
+            try:
+                warmed = await self.warm(address, chain)
+            except Exception as e:
+                self.stats["failed"] += 1
+                logging.warning(f"Warmer failed on {address} ({chain}): {e}")
+            else:
+                self.stats["warmed" if warmed else "unverified"] += 1
+            finally:
+                self._queue.task_done()
+
+    async def _follow(self, feed):
+        async for address, chain in feed.candidates():
+            self.offer(address, chain)
+
+    async def run(self, stop=None):
+        """
+        Follows every feed and warms candidates until `stop` is set.
+        """
+        PRIORITY.set(PRIORITY_BACKGROUND)  # inherited by every task started below
+        stop = stop or asyncio.Event()
+        tasks = [asyncio.ensure_future(self._follow(feed)) for feed in self.feeds]
+        tasks += [asyncio.ensure_future(self._work()) for _ in range(self.concurrency)]
+        try:
+            await stop.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def snapshot(self):
+        return {**self.stats, "backlog": self._queue.qsize()}
+
+# --- 3. DEPLOYER REFRESH ---
+class DeployerRefresher:
+    """
+    Re-fetches wallet stats of recently seen deployers before they go stale,
+    so Pro scans read them from the deployer index. Balances come 20 per
+    balancemulti call; Etherscan has no multi-address tx count, so those cost
+    one call each. Every call waits for spare quota.
+    """
+    def __init__(self, chains=None, interval=DEPLOYER_REFRESH_INTERVAL, batch=DEPLOYER_REFRESH_BATCH, min_spare=WARMER_MIN_SPARE):
+        self.chains = chains or list(CHAINS)
+        self.interval = interval
+        self.batch = batch
+        self.min_spare = min_spare
+        self.stats = {"rounds": 0, "refreshed": 0, "failed": 0, "waits": 0}
+
+    async def refresh(self, chain):
+        """
+        One round on `chain`. Returns the number of deployers refreshed.
+        """
+        addresses = DEPLOYER_INDEX.stale(chain, limit=self.batch)
+        if not addresses:
+            return 0
+        etherscan = get_scheduler("etherscan", chain)
+        await wait_for_spare(self.min_spare, self.stats, etherscan)
+        balances = await get_wallet_balances(addresses, chain)
+        tx_counts = {}
+        for address in addresses:
+            await wait_for_spare(self.min_spare, self.stats, etherscan)
+            try:
+                tx_counts[address] = await get_transaction_count(address, chain)
+            except (UpstreamError, UpstreamBusy) as e:
+                logging.warning(f"Deployer refresh failed on {address} ({chain}): {e}")
+        # Whatever half came back is filed; the rest stays stale for next round
+        DEPLOYER_INDEX.record_wallets(chain, [(a, balances.get(a), tx_counts.get(a)) for a in addresses])
+        refreshed = sum(1 for a in addresses if a in balances and a in tx_counts)
+        self.stats["refreshed"] += refreshed
+        self.stats["failed"] += len(addresses) - refreshed
+        return refreshed
+
+    async def run(self, stop=None):
+        """
+        Refreshes every chain each `interval` seconds until `stop` is set.
+        """
+        PRIORITY.set(PRIORITY_BACKGROUND)
+        stop = stop or asyncio.Event()
+        while not stop.is_set():
+            for chain in self.chains:
+                try:
+                    await self.refresh(chain)
+                except Exception as e:
+                    logging.warning(f"Deployer refresh on {chain} failed: {e}")
+            self.stats["rounds"] += 1
+            try:
+                await asyncio.wait_for(stop.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def snapshot(self):
+        return dict(self.stats)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--feed", action="append", default=[], help="dexscreener or file:<path> (repeatable); default WARMER_FEEDS")
+    parser.add_argument("--concurrency", type=int, default=WARMER_CONCURRENCY)
+    args = parser.parse_args()
+    feeds = feeds_from_spec(",".join(args.feed) or WARMER_FEEDS)
+    if not feeds:
+        parser.error("no feeds (use --feed or WARMER_FEEDS)")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+
+    async def run():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        warmer = CacheWarmer(feeds, concurrency=args.concurrency)
+        # A private in-memory index has nothing to refresh
+        refresher = asyncio.ensure_future(DeployerRefresher().run(stop)) if DEPLOYER_INDEX_DB and DEPLOYER_REFRESH_INTERVAL > 0 else None
+        try:
+            await warmer.run(stop)
+            if refresher: await refresher
+        finally:
+            await close_clients()
+            logging.info(f"Warmer stopped: {warmer.snapshot()}")
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
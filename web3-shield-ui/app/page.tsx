@@ -9,9 +9,13 @@ import { useRouter } from 'next/navigation'; // Import this
 
   // ... rest of your code
 
+// Chains the API scans (see chains.py)
+const CHAIN_OPTIONS: [string, string][] = [["ethereum", "Ethereum"], ["bsc", "BNB Chain"], ["base", "Base"], ["arbitrum", "Arbitrum"], ["polygon", "Polygon"]];
+
 // --- 1. MAIN PAGE COMPONENT ---
 export default function Home() {
   const [address, setAddress] = useState("");
+  const [chain, setChain] = useState("ethereum");
   const [mode, setMode] = useState<"free" | "pro">("free");
   const [loading, setLoading] = useState(false);
   const [result, setResult] = useState<any>(null);
@@ -75,7 +79,8 @@ const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://127.0.0.1:8000";  con
     }
 
     const cleanAddress = address.trim();
-    const endpoint = mode === "free" ? "/scan/free" : "/scan/pro";
+    // Deep Audits stream: source, flags, market and deployer first, then the report as it is written
+    const endpoint = mode === "free" ? "/scan/free" : "/scan/pro/stream";
     
     try {
       const res = await fetch(`${API_URL}${endpoint}`, {
@@ -83,6 +88,7 @@ const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://127.0.0.1:8000";  con
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ 
           address: cleanAddress, 
+          chain,
           user_id: user?.id, 
           license_key: mode === "pro" && (credits === 0) ? licenseKey : undefined 
         }),
@@ -94,10 +100,16 @@ const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://127.0.0.1:8000";  con
         return;
       }
 
-      const data = await res.json();
-      if (!res.ok) throw new Error(data.detail || "Scan failed");
-      
-      setResult(data);
+      if (!res.ok) {
+        const data = await res.json();
+        throw new Error(data.detail || "Scan failed");
+      }
+
+      if (mode === "free") {
+        setResult(await res.json());
+      } else {
+        await readScanStream(res);
+      }
       if (user) fetchCredits(user.id);
       
     } catch (err: any) {
@@ -107,6 +119,30 @@ const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://127.0.0.1:8000";  con
     }
   };
 
+  // Merges NDJSON events from /scan/pro/stream into `result` as they arrive
+  const readScanStream = async (res: Response) => {
+    const reader = res.body!.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split("\n");
+      buffer = lines.pop() || "";
+      for (const line of lines) {
+        if (!line.trim()) continue;
+        const { event, ...data } = JSON.parse(line);
+        if (event === "error") throw new Error(data.detail || "Scan failed");
+        if (event === "report") {
+          setResult((prev: any) => ({ ...prev, report: (prev?.report || "") + data.text }));
+        } else {
+          setResult((prev: any) => ({ ...prev, ...data }));
+        }
+      }
+    }
+  };
+
   return (
     <div className="min-h-screen bg-[#0B0F19] text-slate-300 font-sans selection:bg-cyan-500/30">
       
@@ -178,7 +214,10 @@ const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://127.0.0.1:8000";  con
               <div className="absolute -inset-0.5 bg-gradient-to-r from-cyan-500 to-blue-600 rounded-xl opacity-30 group-hover:opacity-100 transition duration-500 blur"></div>
               <div className="relative flex items-center bg-slate-950 rounded-xl px-4 py-4 border border-slate-800">
                 <Search className="text-slate-500 mr-3" />
-                <input type="text" placeholder="Paste Ethereum Contract Address (0x...)" className="w-full bg-transparent outline-none text-white placeholder-slate-600 font-mono" value={address} onChange={(e) => setAddress(e.target.value)} />
+                <input type="text" placeholder="Paste Contract Address (0x...)" className="w-full bg-transparent outline-none text-white placeholder-slate-600 font-mono" value={address} onChange={(e) => setAddress(e.target.value)} />
+                <select value={chain} onChange={(e) => setChain(e.target.value)} className="ml-3 bg-slate-900 text-slate-300 text-sm rounded-lg px-2 py-1 border border-slate-800 outline-none">
+                  {CHAIN_OPTIONS.map(([id, label]) => <option key={id} value={id}>{label}</option>)}
+                </select>
               </div>
             </div>
 
@@ -283,7 +322,7 @@ function AuditReportDisplayWrapper({ result, mode, API_URL, address, user, setSh
         </div>
 
         {result.report ? (
-            <AuditReportDisplay rawReport={result.report} apiUrl={API_URL} address={address} verdictStatus={result.report.includes("SAFE") ? "SECURE" : "CAUTION"} contractName={result.name || "Unknown Contract"} marketData={result.market} score={result.score} scoreReasons={result.score_reasons} />
+            <AuditReportDisplay rawReport={result.report} reportIr={result.report_ir} apiUrl={API_URL} address={address} verdictStatus={result.report.includes("SAFE") ? "SECURE" : "CAUTION"} contractName={result.name || "Unknown Contract"} marketData={result.market} score={result.score} scoreReasons={result.score_reasons} />
         ) : (
             <div className="animate-in fade-in slide-in-from-bottom-4 duration-700">
                 {result.market && (
@@ -301,10 +340,10 @@ function AuditReportDisplayWrapper({ result, mode, API_URL, address, user, setSh
                             ))
                         ) : (<div className="text-slate-500 italic">No obvious suspicious keywords found in a basic scan.</div>)}
                     </div>
-                    <div className="relative p-6 bg-gradient-to-r from-amber-600 to-orange-600 rounded-2xl flex flex-col md:flex-row items-center justify-between gap-6 shadow-2xl shadow-orange-900/20">
+                    {mode === "free" && <div className="relative p-6 bg-gradient-to-r from-amber-600 to-orange-600 rounded-2xl flex flex-col md:flex-row items-center justify-between gap-6 shadow-2xl shadow-orange-900/20">
                         <div className="text-white"><h4 className="text-xl font-black mb-2">Is this contract actually safe?</h4><p className="text-amber-100/90 text-sm max-w-md leading-relaxed">Our Quick Scan found keywords, but it can't tell if they are malicious. Unlock the <strong>AI Deep Audit</strong> to analyze the logic.</p></div>
                         <button onClick={() => { setMode("pro"); if (!user) setShowLogin(true); }} className="px-8 py-4 bg-white text-orange-600 font-extrabold rounded-xl hover:bg-orange-50 transition-colors shadow-lg flex items-center gap-2 group whitespace-nowrap">Use Free Pro Scan <Sparkles size={18} className="text-orange-500" /></button>
-                    </div>
+                    </div>}
                 </div>
             </div>
         )}
@@ -313,7 +352,7 @@ function AuditReportDisplayWrapper({ result, mode, API_URL, address, user, setSh
 }
 
 // --- 3. HELPER COMPONENTS ---
-function AuditReportDisplay({ rawReport, apiUrl, address, verdictStatus, contractName, marketData, score, scoreReasons }: any) {
+function AuditReportDisplay({ rawReport, reportIr, apiUrl, address, verdictStatus, contractName, marketData, score, scoreReasons }: any) {
   const [activeTab, setActiveTab] = useState<"intel" | "security" | "gas" | "market">("intel");
   const [downloading, setDownloading] = useState(false);
 
@@ -342,7 +381,7 @@ function AuditReportDisplay({ rawReport, apiUrl, address, verdictStatus, contrac
     try {
       const response = await fetch(`${apiUrl}/generate-pdf`, {
         method: "POST", headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ name: contractName, address, report: rawReport, verdict: verdictStatus, market: marketData, score, score_reasons: scoreReasons }),
+        body: JSON.stringify({ name: contractName, address, report: rawReport, report_ir: reportIr, verdict: verdictStatus, market: marketData, score, score_reasons: scoreReasons }),
       });
       const blob = await response.blob();
       const url = window.URL.createObjectURL(blob);
@@ -0,0 +1,143 @@
+"""
+Runs queued Pro scans (see jobs.py) outside the API process.
+
+    python worker.py --processes 4 --concurrency 8 --metrics-port 9101
+
+Every process claims jobs from JOB_QUEUE_URL and runs up to `--concurrency`
+scans at once. A worker that dies mid-scan loses nothing: its lease runs out
+and another worker picks the job up. With --metrics-port, process i serves
+Prometheus metrics on port + i.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+import uuid
+from billing import refund_credit, settle_credit
+from jobs import FAILED, JOB_LEASE, open_queue
+from metrics import REGISTRY, serve_metrics
+from pipeline import ContractNotFound, SingleFlight, run_pro_scan
+from scheduler import PRIORITY, PRIORITY_PRO
+from upstream import close_clients
+
+POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+REAP_INTERVAL = 10
+
+# Jobs for the same (address, chain) from different users share one scan
+WORKER_SCANS = SingleFlight()
+
+async def _refund(job):
+    payload = job["payload"]
+    try:
+        await refund_credit(payload["user_id"], payload["address"], payload["chain"], payload["reservation"])
+    except Exception as e:
+        logging.warning(f"Refund failed for job {job['id']}: {e}")
+
+async def _heartbeat(queue, job_id, worker_id):
+    while True:
+        await asyncio.sleep(JOB_LEASE / 3)
+        if not queue.heartbeat(job_id, worker_id):
+            return
+
+async def run_job(queue, job, worker_id):
+    payload = job["payload"]
+    address, chain = payload["address"], payload["chain"]
+    PRIORITY.set(PRIORITY_PRO)
+    heartbeat = asyncio.ensure_future(_heartbeat(queue, job["id"], worker_id))
+    try:
+        scan = await WORKER_SCANS.do((address.lower(), chain, "pro"), lambda: run_pro_scan(address, chain))
+    except ContractNotFound:
+        status = queue.fail(job["id"], worker_id, "Contract not found", retry=False)
+    except Exception as e:
+        # Upstream outages and everything else: retried with backoff until attempts run out
+        status = queue.fail(job["id"], worker_id, str(e) or type(e).__name__)
+    else:
+        result = {**scan, **settle_credit(payload["user_id"], address, chain, payload["reservation"])}
+        queue.complete(job["id"], worker_id, result)
+        status = None
+    finally:
+        heartbeat.cancel()
+    if status == FAILED:
+        await _refund(job)
+
+async def run_worker(queue, concurrency, worker_id=None, stop=None):
+    """
+    Claims and runs jobs until `stop` is set, then waits for the running ones.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    stop = stop or asyncio.Event()
+    slots = asyncio.Semaphore(concurrency)
+    running = set()
+    next_reap = 0
+    while not stop.is_set():
+        if time.monotonic() >= next_reap:
+            for job in queue.reap():
+                await _refund(job)
+            next_reap = time.monotonic() + REAP_INTERVAL
+        await slots.acquire()
+        job = queue.claim(worker_id)
+        if job is None:
+            slots.release()
+            try:
+                await asyncio.wait_for(stop.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        task = asyncio.ensure_future(run_job(queue, job, worker_id))
+        running.add(task)
+        task.add_done_callback(lambda t: (running.discard(t), slots.release()))
+    if running:
+        await asyncio.gather(*running, return_exceptions=True)
+
+def _serve(concurrency, metrics_port=None):
+    queue = open_queue()
+
+    @REGISTRY.collector
+    def worker_metrics():
+        scans = WORKER_SCANS.stats()
+        return [
+            ("scans_in_flight", "gauge", "Distinct scans running in this process (coalesced requests count once).", [({}, scans["in_flight"])]),
+            ("jobs", "gauge", "Pro scan jobs by status.", [({"status": status}, count) for status, count in queue.stats().items()]),
+        ]
+
+    async def main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        server = await serve_metrics(metrics_port) if metrics_port else None
+        try:
+            await run_worker(queue, concurrency, stop=stop)
+        finally:
+            if server:
+                server.close()
+            await close_clients()
+    asyncio.run(main())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("JOB_WORKER_CONCURRENCY", "8")), help="scans per process")
+    parser.add_argument("--metrics-port", type=int, default=None, help="first Prometheus port, one per process")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        _serve(args.concurrency, args.metrics_port)
+        return
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=_serve, args=(args.concurrency, args.metrics_port and args.metrics_port + i))
+                 for i in range(args.processes)]
+    for process in processes:
+        process.start()
+    # Ctrl+C reaches every process in the group; each finishes its running scans
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *_: [p.terminate() for p in processes])
+    for process in processes:
+        process.join()
+
+if __name__ == "__main__":
+    main()